@@ -0,0 +1,246 @@
+"""
+CareOClock Predictive Engine - Asyncio Serving Mode
+Description: Serves the predictive_service API from an asyncio event loop
+             (aiohttp) instead of one blocked worker thread per request. MongoDB
+             reads run on a bounded I/O thread pool and the scoring stages on a
+             separate CPU pool, so a single process keeps hundreds of requests
+             in flight while their history queries are outstanding. Routes,
+             validation and response bodies are shared with the Flask app.
+
+Run standalone:  python async_service.py
+Under gunicorn:  gunicorn async_service:app --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:5001
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from aiohttp import web
+
+import predictive_service
+from predictive_service import (health_status, reload_model_request, top_risk_request, validate_predict_payload,
+                                batch_items, batch_response, record_request, ERRORS)
+from metrics import REGISTRY, CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+# Concurrent MongoDB reads; keep at or below the client's maxPoolSize
+ASYNC_IO_THREADS = int(os.environ.get('ASYNC_IO_THREADS', 32))
+# Threads running the analysis stages (NumPy/pandas release the GIL in places)
+ASYNC_CPU_THREADS = int(os.environ.get('ASYNC_CPU_THREADS', os.cpu_count() or 4))
+
+SERVICE = web.AppKey('service', object)
+IO_POOL = web.AppKey('io_pool', ThreadPoolExecutor)
+CPU_POOL = web.AppKey('cpu_pool', ThreadPoolExecutor)
+
+# Flask's jsonify sorts keys; keep the bodies byte-for-byte comparable
+_dumps = functools.partial(json.dumps, sort_keys=True)
+
+
+def json_response(body, status=200):
+    return web.json_response(body, status=status, dumps=_dumps)
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def current_service(app, wait=True):
+    """
+    The app's PredictionService. The shared one is looked up per request: with
+    STARTUP_MODE=background it appears once the warm-up thread has built it,
+    which requests wait for (off the event loop) unless `wait` is False.
+    """
+    service = app[SERVICE]
+    if service is not None:
+        return service
+    startup = predictive_service.startup
+    startup.ensure_started()
+    if wait and not startup.ready.is_set():
+        await asyncio.get_running_loop().run_in_executor(None, startup.wait)
+    return predictive_service.prediction_service
+
+
+async def predict_risk(app, service, health_data):
+    """PredictionService.predict_risk with the history read and the scoring on their own pools."""
+    new_data_flat = service._flatten_data(health_data)
+    if new_data_flat is None:
+        return {'error': 'Invalid input data format'}
+
+    loop = asyncio.get_running_loop()
+    user_id = health_data['userId']
+    stats = service.cached_stats(user_id)
+    if service.stats_cache is None:
+        # The lookup reads the user's newest record from MongoDB
+        cached, response_key = await loop.run_in_executor(app[IO_POOL], service.cached_response,
+                                                          health_data, new_data_flat, user_id, stats)
+    else:
+        cached, response_key = service.cached_response(health_data, new_data_flat, user_id, stats)
+    if cached is not None:
+        return cached
+    history = None
+    if stats is None:
+        history = await loop.run_in_executor(app[IO_POOL], service.load_history, user_id)
+    return await loop.run_in_executor(app[CPU_POOL], service.score_reading,
+                                      health_data, new_data_flat, user_id, stats, history, response_key)
+
+
+async def top_risk(request):
+    payload = await read_json(request)
+    body, status = top_risk_request(await current_service(request.app), {} if payload is None else payload)
+    return json_response(body, status)
+
+
+async def health_check(request):
+    body, status = health_status(await current_service(request.app, wait=False))
+    return json_response(body, status)
+
+
+async def reload_model(request):
+    payload = await read_json(request)
+    force = bool(payload.get('force')) if isinstance(payload, dict) else False
+    # Loading takes seconds; keep it off the event loop and the scoring pool
+    service = await current_service(request.app)
+    loop = asyncio.get_running_loop()
+    body, status = await loop.run_in_executor(None, reload_model_request, service,
+                                              request.headers.get('X-Admin-Token'), force)
+    return json_response(body, status)
+
+
+async def predict(request):
+    service = await current_service(request.app)
+    if service is None:
+        return json_response({'error': 'Prediction service is offline.'}, 503)
+
+    try:
+        health_data = await read_json(request)
+        if not health_data:
+            return json_response({'error': 'No JSON data provided'}, 400)
+
+        error = validate_predict_payload(health_data)
+        if error:
+            return json_response({'error': error}, 400)
+
+        user_id = health_data['userId']
+        result = await predict_risk(request.app, service, health_data)
+
+        if 'error' in result:
+            return json_response(result, 400)
+
+        logger.info(f"Prediction made for user {user_id}: {result['risk_level']}")
+        return json_response(result)
+
+    except Exception as e:
+        logger.error(f"Prediction error: {e}")
+        ERRORS.labels('predict').inc()
+        return json_response({'error': f'Internal server error: {e}'}, 500)
+
+
+async def predict_batch(request):
+    service = await current_service(request.app)
+    if service is None:
+        return json_response({'error': 'Prediction service is offline.'}, 503)
+
+    try:
+        payload = await read_json(request)
+        if payload is None:
+            return json_response({'error': 'No JSON data provided'}, 400)
+
+        items, error = batch_items(payload)
+        if error:
+            return json_response({'error': error}, 400)
+
+        # The batch path is dominated by its single grouped history query
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(request.app[IO_POOL], service.predict_risk_batch, items)
+        response = batch_response(results)
+        logger.info(f"Batch prediction made for {response['count']} readings ({response['failed']} failed)")
+        return json_response(response)
+
+    except Exception as e:
+        logger.error(f"Batch prediction error: {e}")
+        ERRORS.labels('predict_batch').inc()
+        return json_response({'error': f'Internal server error: {e}'}, 500)
+
+
+async def metrics(request):
+    return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def home(request):
+    return json_response({
+        'message': 'CareOClock Predictive Engine is running.',
+        'endpoints': {
+            '/health': 'GET - Check service health',
+            '/predict': 'POST - Get risk prediction',
+            '/predict/batch': 'POST - Get risk predictions for many users',
+            '/risk/top': 'POST - Highest-risk users from the latest risk index',
+            '/metrics': 'GET - Prometheus metrics',
+            '/admin/reload-model': 'POST - Load newly published model artifacts (X-Admin-Token)'
+        }
+    })
+
+
+@web.middleware
+async def cors_and_errors(request, handler):
+    """Allow-all CORS (as flask_cors is configured), the JSON 404 body and request metrics."""
+    started = perf_counter()
+    if request.method == 'OPTIONS':
+        response = web.Response()
+        response.headers['Access-Control-Allow-Methods'] = request.headers.get(
+            'Access-Control-Request-Method', 'GET, POST, OPTIONS')
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', 'Content-Type')
+    else:
+        try:
+            response = await handler(request)
+        except web.HTTPNotFound:
+            response = json_response({'error': 'Endpoint not found'}, 404)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    record_request(request.path, response.status, perf_counter() - started, request.content_length)
+    return response
+
+
+async def _start_pools(app):
+    app[IO_POOL] = ThreadPoolExecutor(max_workers=ASYNC_IO_THREADS, thread_name_prefix='mongo-io')
+    app[CPU_POOL] = ThreadPoolExecutor(max_workers=ASYNC_CPU_THREADS, thread_name_prefix='scoring')
+    if app[SERVICE] is None:
+        # In the serving process (after any fork), so STARTUP_MODE=background can build it now
+        predictive_service.startup.ensure_started()
+
+
+async def _stop_pools(app):
+    app[IO_POOL].shutdown(wait=True)
+    app[CPU_POOL].shutdown(wait=True)
+
+
+def create_app(service=None):
+    """Builds the aiohttp application around `service` (default: the shared PredictionService)."""
+    app = web.Application(middlewares=[cors_and_errors])
+    app[SERVICE] = service
+    app.on_startup.append(_start_pools)
+    app.on_cleanup.append(_stop_pools)
+
+    app.router.add_get('/health', health_check)
+    app.router.add_post('/predict', predict)
+    app.router.add_post('/predict/batch', predict_batch)
+    app.router.add_post('/risk/top', top_risk)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_post('/admin/reload-model', reload_model)
+    app.router.add_get('/', home)
+    return app
+
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    print("\n--- Starting CareOClock Predictive Engine (asyncio) ---")
+    web.run_app(app, host='0.0.0.0', port=5001)
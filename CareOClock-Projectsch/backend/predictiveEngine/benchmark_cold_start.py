@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+CareOClock Cold Start Benchmark
+Measures how long a fresh predictive_service worker takes to come up, per
+STARTUP_MODE: the module import (until the worker can accept connections),
+the shared PredictionService being built (until it can score), the
+first /predict, the first /predict of a second user and warm requests. Every
+run is a separate process, so each one starts cold. History is served from an
+in-memory healthrecords collection; no MongoDB is needed.
+
+    python benchmark_cold_start.py                         # writes cold_start_benchmark.json
+    python benchmark_cold_start.py --output new.json --compare cold_start_benchmark.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+MODES = ('eager', 'background')
+# Packages whose import dominates a cold start; reported if the module import loaded them
+HEAVY_MODULES = ('numpy', 'pandas', 'sklearn', 'xgboost', 'joblib', 'pymongo', 'flask')
+USER_IDS = ('65a1b2c3d4e5f6a7b8c9d0e1', '65a1b2c3d4e5f6a7b8c9d0e2')
+HISTORY_RECORDS = 30
+# History comes from the in-memory collection; only the latest-risk load tries this server
+BENCHMARK_MONGODB_URI = 'mongodb://127.0.0.1:27017/careoclock_benchmark'
+# Measures compared by --compare (seconds)
+MEASURES = ('import_seconds', 'ready_seconds', 'first_request_seconds', 'new_user_request_seconds',
+            'warm_request_seconds')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CareOClock cold start benchmark")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--repeats', type=int, default=5, help="fresh processes per mode")
+    parser.add_argument('--warm-requests', type=int, default=20)
+    parser.add_argument('--output', default='cold_start_benchmark.json')
+    parser.add_argument('--compare', help="earlier results file to print median ratios against")
+    parser.add_argument('--run', choices=MODES, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def reading(user_id, i):
+    """A /predict body; the systolic value changes so no request is a retry of another."""
+    return {
+        'userId': user_id,
+        'bloodPressure': {'systolic': 140 + i % 20, 'diastolic': 90},
+        'bloodSugar': {'value': 150, 'testType': 'random'},
+        'heartRate': {'value': 88},
+        'weight': {'value': 74.2},
+        'sleepHours': 6.5,
+        'temperature': 98.9,
+        'oxygenLevel': 96,
+    }
+
+
+def run_one(args):
+    """One cold start, in the current (fresh) process."""
+    start = time.perf_counter()
+    import predictive_service
+    result = {'import_seconds': time.perf_counter() - start,
+              'imported_at_startup': [name for name in HEAVY_MODULES if name in sys.modules]}
+
+    service = predictive_service.startup.wait(timeout=None)
+    result['ready_seconds'] = time.perf_counter() - start
+    if service is None:
+        raise RuntimeError(f"PredictionService failed to start: {predictive_service.startup.error}")
+
+    from memory_store import InMemoryHealthRecords
+    from synthetic_data import generate_user_documents
+
+    # The shared service reads history from memory instead of MongoDB
+    collection = InMemoryHealthRecords(generate_user_documents(USER_IDS, HISTORY_RECORDS, days=13))
+    service.records_collection = service.history_collection = collection
+
+    client = predictive_service.app.test_client()
+
+    def post(body):
+        request_start = time.perf_counter()
+        response = client.post('/predict', json=body)
+        seconds = time.perf_counter() - request_start
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}: {response.get_json()}")
+        return seconds
+
+    result['first_request_seconds'] = post(reading(USER_IDS[0], 0))
+    result['new_user_request_seconds'] = post(reading(USER_IDS[1], 0))
+    warm = sorted(post(reading(USER_IDS[0], i)) for i in range(1, args.warm_requests + 1))
+    result['warm_request_seconds'] = warm[len(warm) // 2]
+    # ru_maxrss is in KiB on Linux
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def run_isolated(mode, args):
+    """run_one in a child process started with STARTUP_MODE=mode."""
+    env = dict(os.environ, STARTUP_MODE=mode, MONGODB_URI=BENCHMARK_MONGODB_URI,
+               MONGO_SERVER_SELECTION_TIMEOUT_MS='500', PYTHONDONTWRITEBYTECODE='1')
+    command = [sys.executable, os.path.abspath(__file__), '--run', mode, '--warm-requests', str(args.warm_requests)]
+    completed = subprocess.run(command, capture_output=True, text=True, env=env,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1:] or [f'exit code {completed.returncode}']
+        return {'mode': mode, 'status': 'failed', 'error': error[0]}
+    return dict(json.loads(completed.stdout.strip().splitlines()[-1]), mode=mode, status='ok')
+
+
+def summarize(runs):
+    """Median of each measure over the successful runs of one mode."""
+    ok = [r for r in runs if r['status'] == 'ok']
+    summary = {'runs': len(runs), 'failed': len(runs) - len(ok)}
+    for measure in MEASURES + ('peak_rss_mb',):
+        values = sorted(r[measure] for r in ok if r.get(measure) is not None)
+        summary[measure] = values[len(values) // 2] if values else None
+    summary['imported_at_startup'] = ok[0]['imported_at_startup'] if ok else None
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(mode, s):
+    if s['import_seconds'] is None:
+        print(f"  {mode:<11} all {s['runs']} runs failed")
+        return
+    print(f"  {mode:<11} import {s['import_seconds']:>6.3f}s | ready {s['ready_seconds']:>6.3f}s | "
+          f"first request {s['first_request_seconds'] * 1000:>7.1f} ms | new user "
+          f"{s['new_user_request_seconds'] * 1000:>6.1f} ms | warm {s['warm_request_seconds'] * 1000:>5.1f} ms")
+    print(f"  {'':<11} loaded by the import: {', '.join(s['imported_at_startup'])}")
+
+
+def print_comparison(summaries, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['summary']
+    print(f"\nMedian vs {baseline_path} (new / old):")
+    for mode, s in summaries.items():
+        old = baseline.get(mode, {})
+        for measure in MEASURES:
+            if old.get(measure) and s.get(measure) is not None:
+                print(f"  {mode:<11} {measure:<26} {old[measure]:>9.4f} -> {s[measure]:>9.4f} s  "
+                      f"({s[measure] / old[measure]:.2f}x)")
+
+
+def main():
+    args = parse_args()
+    if args.run:
+        print(json.dumps(run_one(args)))
+        return
+
+    print("=" * 60)
+    print("CAREOCLOCK COLD START BENCHMARK")
+    print(f"Timestamp: {datetime.now()}")
+    print("=" * 60)
+
+    runs, summaries = [], {}
+    for mode in args.modes:
+        mode_runs = [run_isolated(mode, args) for _ in range(args.repeats)]
+        for r in mode_runs:
+            if r['status'] != 'ok':
+                print(f"  {mode:<11} run failed ({r['error']})")
+        runs.extend(mode_runs)
+        summaries[mode] = summarize(mode_runs)
+        print_summary(mode, summaries[mode])
+
+    report = {
+        'summary': summaries,
+        'runs': runs,
+        'environment': {
+            'git_revision': git_revision(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+        },
+        'config': {'modes': args.modes, 'repeats': args.repeats, 'warm_requests': args.warm_requests,
+                   'history_records': HISTORY_RECORDS},
+        'timestamp': str(datetime.now()),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        print_comparison(summaries, args.compare)
+
+    print(f"\n✓ Benchmark results saved to: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+CareOClock Safety-Net Benchmark
+Compares the columnar history evaluator against the original row-wise loop.
+"""
+
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+from safety_net import evaluate_history
+from synthetic_data import generate_history_df
+
+
+def rowwise_safety_net_history(history_df):
+    """Original iterrows() implementation, kept as the reference for equality and timing."""
+    alerts = []
+    for _, record in history_df.iterrows():
+        sys = record.get('bp_systolic')
+        dia = record.get('bp_diastolic')
+        o2 = record.get('oxygen_level')
+        gl = record.get('glucose')
+        hr = record.get('heart_rate')
+        temp = record.get('temperature')
+
+        if sys is not None and dia is not None:
+            if sys > 180 or dia > 120:
+                alerts.append(f"Hypertensive Crisis at {record['date']}: BP {sys}/{dia}")
+            if sys < 90 or dia < 60:
+                alerts.append(f"Hypotensive Crisis at {record['date']}: BP {sys}/{dia}")
+            if 140 < sys <= 180 or 90 < dia <= 120:
+                alerts.append(f"High Blood Pressure (Stage 2) at {record['date']}: BP {sys}/{dia}")
+            if 130 < sys <= 140 or 80 < dia <= 90:
+                alerts.append(f"High Blood Pressure (Stage 1) at {record['date']}: BP {sys}/{dia}")
+
+        if o2 is not None:
+            if o2 < 92:
+                alerts.append(f"Very Low Oxygen at {record['date']}: {o2}%")
+            elif o2 < 95:
+                alerts.append(f"Low Oxygen at {record['date']}: {o2}%")
+
+        if gl is not None:
+            if gl > 250:
+                alerts.append(f"Very High Blood Sugar at {record['date']}: {gl}")
+            elif gl < 70:
+                alerts.append(f"Low Blood Sugar at {record['date']}: {gl}")
+
+        if hr is not None:
+            if hr > 120:
+                alerts.append(f"Very High Heart Rate at {record['date']}: {hr}")
+            elif hr < 50:
+                alerts.append(f"Very Low Heart Rate at {record['date']}: {hr}")
+
+        if temp is not None:
+            if temp > 103:
+                alerts.append(f"High Fever at {record['date']}: {temp}")
+            elif temp > 100.4:
+                alerts.append(f"Fever at {record['date']}: {temp}")
+            elif temp < 95:
+                alerts.append(f"Low Body Temperature at {record['date']}: {temp}")
+    return alerts
+
+
+def time_call(fn, arg, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    print("=" * 60)
+    print("CAREOCLOCK SAFETY-NET BENCHMARK")
+    print(f"Timestamp: {datetime.now()}")
+    print("=" * 60)
+
+    results = []
+    for n_records in (30, 300, 3000):
+        history_df = generate_history_df(n_records, seed=n_records)
+
+        expected = rowwise_safety_net_history(history_df)
+        actual = evaluate_history(history_df)
+        if actual != expected:
+            raise AssertionError(f"Columnar alerts differ from row-wise alerts at {n_records} records")
+
+        repeats = 50 if n_records < 3000 else 10
+        rowwise_ms = time_call(rowwise_safety_net_history, history_df, repeats)
+        columnar_ms = time_call(evaluate_history, history_df, repeats)
+        speedup = rowwise_ms / columnar_ms if columnar_ms else float('inf')
+
+        print(f"{n_records:>5} records | alerts: {len(actual):>5} | row-wise: {rowwise_ms:8.3f} ms"
+              f" | columnar: {columnar_ms:8.3f} ms | speedup: {speedup:6.1f}x")
+        results.append({
+            'records': n_records,
+            'alerts': len(actual),
+            'rowwise_ms': rowwise_ms,
+            'columnar_ms': columnar_ms,
+            'speedup': speedup,
+        })
+
+    with open('safety_net_benchmark.json', 'w') as f:
+        json.dump({'results': results, 'timestamp': str(datetime.now())}, f, indent=2)
+
+    print("\n✓ Benchmark results saved to: safety_net_benchmark.json")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+CareOClock Per-Stage Benchmark
+Times every analysis stage of the three engine variants (predictive_service,
+predictive_engine, linear_regression) in isolation over synthetic histories of
+increasing size, reading from an in-memory healthrecords collection.
+
+    python benchmark_stages.py                                  # writes stage_benchmark.json
+    python benchmark_stages.py --output new.json --compare stage_benchmark.json
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import platform
+import subprocess
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from memory_store import InMemoryHealthRecords
+from synthetic_data import generate_user_documents
+
+warnings.filterwarnings('ignore')
+
+ENGINES = ('predictive_service', 'predictive_engine', 'linear_regression')
+HISTORY_SIZES = (0, 7, 30, 365, 5000)
+USER_ID = '65a1b2c3d4e5f6a7b8c9d0e1'
+# Inside both the 14-day (predictive_service) and 30-day (others) windows
+HISTORY_DAYS = 13
+
+# Scalar sleepHours/temperature/oxygenLevel are the one shape every engine's
+# _flatten_data accepts.
+READING = {
+    'userId': USER_ID,
+    'bloodPressure': {'systolic': 148, 'diastolic': 94},
+    'bloodSugar': {'value': 182, 'testType': 'random'},
+    'heartRate': {'value': 104},
+    'weight': {'value': 74.2},
+    'sleepHours': 6.5,
+    'temperature': 99.1,
+    'oxygenLevel': 95,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CareOClock per-stage benchmark")
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(HISTORY_SIZES))
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds spent timing each stage")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='stage_benchmark.json')
+    parser.add_argument('--compare', help="earlier results file to print median ratios against")
+    return parser.parse_args()
+
+
+def offline_service(module, collection):
+    """The engine's PredictionService reading from `collection` instead of MongoDB."""
+    if module.__name__ == 'predictive_service':
+        # Caches off: every stage is measured on the DataFrame path, and the
+        # repeated reading is scored each time instead of answered from the
+        # response cache; one model for the whole run and no latest risk index
+        return module.PredictionService(stats_cache_max_bytes=0, response_cache_max_bytes=0,
+                                        model_reload_interval=0, risk_index=False,
+                                        records_collection=collection)
+    service = object.__new__(module.PredictionService)
+    service.records_collection = collection
+    return service
+
+
+def time_stage(fn, min_time):
+    """Runs fn repeatedly for at least min_time seconds; per-call statistics in microseconds."""
+    fn()
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < 5 or time.perf_counter() < deadline:
+        start = time.perf_counter_ns()
+        fn()
+        timings.append((time.perf_counter_ns() - start) / 1000)
+        if len(timings) >= 100000:
+            break
+    timings = np.array(timings)
+    return {
+        'median_us': float(np.median(timings)),
+        'p95_us': float(np.percentile(timings, 95)),
+        'min_us': float(timings.min()),
+        'repeats': len(timings),
+    }
+
+
+def stage_calls(name, service, history_days):
+    """(stage, zero-argument callable) pairs for one engine, fed with that engine's own outputs."""
+    flat = service._flatten_data(dict(READING))
+    history_df = service.fetch_user_history(USER_ID, days=history_days)
+
+    stages = [
+        ('flatten_data', lambda: service._flatten_data(dict(READING))),
+        ('fetch_user_history', lambda: service.fetch_user_history(USER_ID, days=history_days)),
+        ('safety_net', lambda: service.analyze_safety_net(flat)),
+    ]
+    if hasattr(service, 'analyze_safety_net_history'):
+        stages.append(('safety_net_history', lambda: service.analyze_safety_net_history(history_df)))
+    stages += [
+        ('anomalies', lambda: service.analyze_anomalies(flat, history_df)),
+        ('trends', lambda: service.analyze_trends(history_df)),
+    ]
+
+    if name == 'predictive_service':
+        history_alerts, history_suggestions = service.analyze_safety_net_history(history_df)
+        safety_alerts, safety_suggestions = service.analyze_safety_net(flat)
+        anomaly_alerts = service.analyze_anomalies(flat, history_df)
+        trend_suggestions, trends = service._analyze_trends(history_df)
+        stages.append(('ml_prediction', lambda: service.predict_ml(flat)))
+        stages.append(('confidence_scoring', lambda: service._build_response(
+            history_alerts, history_suggestions, safety_alerts, safety_suggestions,
+            anomaly_alerts, trend_suggestions, trends)))
+    # predictive_engine and linear_regression score inline in predict_risk;
+    # their scoring cost shows up as the residual below.
+    stages.append(('predict_risk', lambda: service.predict_risk(dict(READING), USER_ID)))
+    return stages
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['engine'], r['records'], r['stage']): r for r in json.load(f)['results']}
+    print(f"\nMedian time vs {baseline_path} (new / old):")
+    for r in results:
+        old = baseline.get((r['engine'], r['records'], r['stage']))
+        if old and old['median_us']:
+            print(f"  {r['engine']:<19} {r['records']:>5} {r['stage']:<20} "
+                  f"{old['median_us']:>11.1f} -> {r['median_us']:>11.1f} us  ({r['median_us'] / old['median_us']:.2f}x)")
+
+
+def main():
+    args = parse_args()
+    logging.disable(logging.INFO)
+
+    print("=" * 60)
+    print("CAREOCLOCK PER-STAGE BENCHMARK")
+    print(f"Timestamp: {datetime.now()}")
+    print("=" * 60)
+
+    modules = {name: importlib.import_module(name) for name in args.engines}
+    results = []
+    for n_records in args.sizes:
+        collection = InMemoryHealthRecords(
+            generate_user_documents([USER_ID], n_records, days=HISTORY_DAYS, seed=args.seed))
+        for name, module in modules.items():
+            service = offline_service(module, collection)
+            history_days = 14 if name == 'predictive_service' else 30
+
+            print(f"\n{name} | {n_records} records")
+            stage_total = 0.0
+            for stage, fn in stage_calls(name, service, history_days):
+                timing = time_stage(fn, args.min_time)
+                results.append({'engine': name, 'records': n_records, 'stage': stage, **timing})
+                print(f"  {stage:<20} {timing['median_us']:>12.1f} us  (p95 {timing['p95_us']:.1f}, "
+                      f"n={timing['repeats']})")
+                if stage != 'predict_risk':
+                    stage_total += timing['median_us']
+                    continue
+                residual = max(timing['median_us'] - stage_total, 0.0)
+                results.append({'engine': name, 'records': n_records, 'stage': 'residual',
+                                'median_us': residual, 'p95_us': None, 'min_us': None, 'repeats': None})
+                print(f"  {'residual':<20} {residual:>12.1f} us  (predict_risk minus the stages above)")
+
+    report = {
+        'results': results,
+        'environment': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'scikit_learn': sklearn.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'config': {'sizes': args.sizes, 'min_time_s': args.min_time, 'seed': args.seed,
+                   'history_days': HISTORY_DAYS},
+        'timestamp': str(datetime.now()),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    print(f"\n✓ Benchmark results saved to: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+CareOClock Training Scaling Benchmark
+Measures how model training and inference scale with the number of training
+rows. Synthetic rows come from synthetic_data.generate_training_sample (the
+generator behind HealthRiskPredictor._generate_sample_data), go through the
+training FeatureTransformer and the same 80/20 split as train_models, and each
+model is fitted once with the evaluation settings (model_evaluation.py) - the
+per-candidate cost a grid or halving search multiplies. Every (size, model)
+run is a separate process, so its peak RSS is its own and a run that exhausts
+memory or the timeout does not end the benchmark.
+
+    python benchmark_training_scale.py                   # 10k, 100k, 1M, 10M rows
+    python benchmark_training_scale.py --sizes 10000 100000 --timeout 600
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+import xgboost
+
+warnings.filterwarnings('ignore')
+
+SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+MODELS = {'RandomForest': 'random_forest', 'XGBoost': 'xgboost'}
+BATCH_SIZES = (1, 100, 10_000, 100_000)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CareOClock training and inference scaling benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_SIZES))
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds per throughput measurement")
+    parser.add_argument('--timeout', type=float, default=3600, help="seconds per (size, model) run")
+    parser.add_argument('--jobs', type=int, default=-1, help="n_jobs for fitting (default: all cores)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='training_scale_benchmark.json')
+    parser.add_argument('--run', nargs=2, metavar=('ROWS', 'MODEL'), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_one(n_rows, model_name, args):
+    """One (size, model) measurement, in the current (fresh) process."""
+    from sklearn.model_selection import train_test_split
+
+    from benchmark_tree_evaluator import rows_per_second
+    from feature_transformer import FeatureTransformer
+    from model_evaluation import CANDIDATE_MODELS
+    from synthetic_data import generate_training_sample
+    from tree_compiler import compile_model
+
+    result = {'rows': n_rows, 'model': model_name, 'peak_rss_mb': {'start': peak_rss_mb()}}
+
+    start = time.perf_counter()
+    columns = generate_training_sample(n_rows, seed=args.seed)
+    result['generate_seconds'] = time.perf_counter() - start
+    result['peak_rss_mb']['data'] = peak_rss_mb()
+
+    start = time.perf_counter()
+    y = columns.pop('risk_level')
+    np.random.seed(args.seed)
+    X = FeatureTransformer().fit_transform(pd.DataFrame(columns))
+    del columns
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    del X
+    result['preprocess_seconds'] = time.perf_counter() - start
+    result['peak_rss_mb']['preprocess'] = peak_rss_mb()
+
+    model = CANDIDATE_MODELS[MODELS[model_name]][2]().set_params(n_jobs=args.jobs)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    result['fit_seconds'] = time.perf_counter() - start
+    result['fit_rows_per_sec'] = len(X_train) / result['fit_seconds']
+    result['peak_rss_mb']['fit'] = peak_rss_mb()
+    del X_train, y_train
+
+    result['test_accuracy'] = float(np.mean(model.predict(X_test) == y_test))
+    compiled = compile_model(model)
+    result['inference_rows_per_sec'] = {}
+    for batch_size in args.batch_sizes:
+        if batch_size > len(X_test):
+            continue
+        result['inference_rows_per_sec'][str(batch_size)] = {
+            'native': rows_per_second(model.predict_proba, X_test, batch_size, args.min_time),
+            'compiled': rows_per_second(compiled.predict_proba, X_test, batch_size, args.min_time),
+        }
+    result['peak_rss_mb']['inference'] = peak_rss_mb()
+    return result
+
+
+def run_isolated(n_rows, model_name, args):
+    """run_one in a child process; a timeout or crash (e.g. the OOM killer) becomes the result's status."""
+    command = [sys.executable, os.path.abspath(__file__), '--run', str(n_rows), model_name,
+               '--batch-sizes', *map(str, args.batch_sizes), '--min-time', str(args.min_time),
+               '--jobs', str(args.jobs), '--seed', str(args.seed)]
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except subprocess.TimeoutExpired:
+        return {'rows': n_rows, 'model': model_name, 'status': 'timeout', 'seconds': args.timeout}
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1:] or [f'exit code {completed.returncode}']
+        return {'rows': n_rows, 'model': model_name, 'status': 'failed', 'returncode': completed.returncode,
+                'error': error[0], 'seconds': time.perf_counter() - start}
+    return dict(json.loads(completed.stdout.strip().splitlines()[-1]), status='ok')
+
+
+def print_result(r):
+    if r['status'] != 'ok':
+        print(f"  {r['model']:<12} {r['status']} ({r.get('error', '')})")
+        return
+    print(f"  {r['model']:<12} fit {r['fit_seconds']:>9.2f}s ({r['fit_rows_per_sec']:>10,.0f} rows/s)  "
+          f"peak RSS {r['peak_rss_mb']['inference']:>7.0f} MB  accuracy {r['test_accuracy']:.4f}")
+    for batch_size, rates in r['inference_rows_per_sec'].items():
+        print(f"    batch {batch_size:>6} | native: {rates['native']:>12,.0f} rows/s"
+              f" | compiled: {rates['compiled']:>12,.0f} rows/s")
+
+
+def main():
+    args = parse_args()
+    if args.run:
+        print(json.dumps(run_one(int(args.run[0]), args.run[1], args)))
+        return
+
+    print("=" * 60)
+    print("CAREOCLOCK TRAINING SCALING BENCHMARK")
+    print(f"Timestamp: {datetime.now()}")
+    print("=" * 60)
+
+    results = []
+    for n_rows in args.sizes:
+        print(f"\n{n_rows:,} rows")
+        for model_name in args.models:
+            result = run_isolated(n_rows, model_name, args)
+            results.append(result)
+            print_result(result)
+
+    report = {
+        'results': results,
+        'environment': {
+            'cpu_count': os.cpu_count(),
+            'memory_gb': os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2**30,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scikit_learn': sklearn.__version__,
+            'xgboost': xgboost.__version__,
+            'machine': platform.machine(),
+        },
+        'config': {'sizes': args.sizes, 'models': args.models, 'batch_sizes': args.batch_sizes,
+                   'min_time_s': args.min_time, 'timeout_s': args.timeout, 'n_jobs': args.jobs,
+                   'seed': args.seed, 'test_size': 0.2},
+        'timestamp': str(datetime.now()),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n✓ Benchmark results saved to: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+CareOClock Tree Evaluator Benchmark
+Checks the compiled tree evaluator against each model's predict_proba on
+balanced_health_data.csv and compares single-row and batch throughput. The
+models, their compiled forms and the FeatureTransformer come from the current
+model bundle (model_bundle.py), the same artifacts serving loads.
+
+    python benchmark_tree_evaluator.py                    # bundle named by model_bundles/CURRENT
+    python benchmark_tree_evaluator.py --bundle model_bundles/v1.1-<hash>
+"""
+
+import argparse
+import json
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from model_bundle import MODEL_BUNDLE_DIR, current_bundle, load_bundle, load_compiled
+from tree_compiler import compile_model
+
+warnings.filterwarnings('ignore')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CareOClock tree evaluator benchmark")
+    parser.add_argument('--bundle', help="bundle directory (default: the one CURRENT points at)")
+    parser.add_argument('--data', default='balanced_health_data.csv')
+    return parser.parse_args()
+
+
+def find_bundle(path=None):
+    bundle = path or current_bundle(MODEL_BUNDLE_DIR)
+    if bundle is None:
+        raise SystemExit(f"No model bundle in {MODEL_BUNDLE_DIR}; train one, or build it from the "
+                         f"old .pkl files with: python model_bundle.py --from-legacy .")
+    return bundle
+
+
+def load_features(transformer, csv_path):
+    """Scaled feature matrix of the CSV, built the way serving builds it."""
+    df = pd.read_csv(csv_path)
+    return transformer.transform(transformer.raw_matrix(df))
+
+
+def rows_per_second(fn, X, batch_size, min_seconds=1.0):
+    """Calls fn on consecutive slices of X until min_seconds have elapsed."""
+    fn(X[:batch_size])
+    rows = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        offset = rows % (len(X) - batch_size + 1)
+        fn(X[offset:offset + batch_size])
+        rows += batch_size
+    return rows / (time.perf_counter() - start)
+
+
+def main():
+    print("=" * 60)
+    print("CAREOCLOCK TREE EVALUATOR BENCHMARK")
+    print(f"Timestamp: {datetime.now()}")
+    print("=" * 60)
+
+    args = parse_args()
+    bundle = find_bundle(args.bundle)
+    artifacts = load_bundle(bundle)
+    print(f"Bundle: {artifacts['manifest']['bundle']}")
+
+    X = load_features(artifacts['transformer'], args.data)
+    results = []
+    for name, model in artifacts['models'].items():
+        start = time.perf_counter()
+        compiled = load_compiled(bundle, name)
+        source = 'bundle'
+        if compiled is None:
+            compiled = compile_model(model)
+            source = 'compiled now'
+        load_ms = (time.perf_counter() - start) * 1000
+
+        expected = model.predict_proba(X)
+        actual = compiled.predict_proba(X)
+        if actual.dtype != expected.dtype or not np.array_equal(actual, expected):
+            mismatched = int((actual != expected).any(axis=1).sum())
+            raise AssertionError(f"{name}: compiled probabilities differ on {mismatched} of {len(X)} rows")
+
+        print(f"\n{name} ({type(model).__name__}): {compiled.n_trees} trees, {compiled.n_nodes} nodes,"
+              f" depth {compiled.max_depth}, {source} in {load_ms:.1f} ms")
+        print(f"  predict_proba identical on all {len(X)} rows")
+
+        timings = {}
+        for batch_size in (1, 100, len(X)):
+            original = rows_per_second(model.predict_proba, X, batch_size)
+            fast = rows_per_second(compiled.predict_proba, X, batch_size)
+            timings[batch_size] = {'original_rows_per_sec': original, 'compiled_rows_per_sec': fast,
+                                   'speedup': fast / original}
+            print(f"  batch {batch_size:>5} | original: {original:>11,.0f} rows/s"
+                  f" | compiled: {fast:>11,.0f} rows/s | speedup: {fast / original:6.2f}x")
+
+        results.append({
+            'model': name,
+            'model_type': type(model).__name__,
+            'trees': compiled.n_trees,
+            'nodes': compiled.n_nodes,
+            'max_depth': compiled.max_depth,
+            'array_bytes': compiled.nbytes,
+            'compiled_from': source,
+            'load_ms': load_ms,
+            'rows_checked': len(X),
+            'identical': True,
+            'throughput': {str(k): v for k, v in timings.items()},
+        })
+
+    with open('tree_evaluator_benchmark.json', 'w') as f:
+        json.dump({'bundle': artifacts['manifest']['bundle'], 'results': results,
+                   'timestamp': str(datetime.now())}, f, indent=2)
+
+    print("\n✓ Benchmark results saved to: tree_evaluator_benchmark.json")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
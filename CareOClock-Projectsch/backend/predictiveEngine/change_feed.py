@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+CareOClock Predictive Engine - Change Feed Consumer
+Description: Streaming mode for PredictionService. New healthrecords are
+             scored as they are inserted instead of when a client calls
+             /predict: a MongoDB change stream delivers each insert (or an
+             NDJSON file replays them locally), the user's rolling statistics
+             are seeded once from MongoDB and then updated per record, and
+             alerts raised by the new reading are emitted at once. Alert
+             latency is the time to process one record, not a polling
+             interval.
+
+    python change_feed.py --mongodb-uri mongodb://localhost:27017/?replicaSet=rs0
+    python change_feed.py --replay healthrecords.ndjson            # local stand-in
+    python change_feed.py --replay healthrecords.ndjson --follow   # keep reading as the file grows
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from bson import json_util
+
+from history_query import record_payload
+from metrics import Counter, Histogram
+from mongo_client import LazyMongoClient
+from risk_index import LATEST_RISK_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Recent latencies kept for the percentiles in summary()
+_LATENCY_WINDOW = 10000
+
+STREAM_EVENTS = Counter('careoclock_stream_events', 'Change feed records by outcome.', ['outcome'])
+STREAM_SECONDS = Histogram('careoclock_stream_event_seconds',
+                           'Change feed latency: scoring one record, and insert to alert.', ['measure'])
+
+
+# --- Sources: each yields (healthrecord document, insert time or None) ---
+
+def change_stream_records(collection, resume_token_file=None, max_await_ms=1000):
+    """
+    Inserts into `collection` from a change stream (MongoDB replica set or
+    sharded cluster). With `resume_token_file`, the position after the last
+    record handed out is saved there and a restart resumes from it.
+    """
+    resume_after = None
+    if resume_token_file and os.path.exists(resume_token_file):
+        with open(resume_token_file) as f:
+            resume_after = json_util.loads(f.read())
+    pipeline = [{'$match': {'operationType': 'insert'}}]
+    with collection.watch(pipeline, resume_after=resume_after, max_await_time_ms=max_await_ms) as stream:
+        for change in stream:
+            yield change['fullDocument'], change.get('wallTime')
+            # The generator resumes only once the consumer has handled the record
+            if resume_token_file:
+                _save_resume_token(resume_token_file, stream.resume_token)
+
+
+def _save_resume_token(path, token):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(json_util.dumps(token))
+    os.replace(tmp, path)
+
+
+def ndjson_records(path, follow=False, poll_seconds=0.2):
+    """
+    healthrecords documents from an NDJSON file in MongoDB extended JSON (as
+    written by mongoexport). With `follow`, waits for appended lines.
+    """
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if not line:
+                if not follow:
+                    return
+                time.sleep(poll_seconds)
+                continue
+            if line.strip():
+                yield json_util.loads(line), None
+
+
+# --- Consumer ---
+
+class StreamingScorer:
+    """
+    Scores each incoming record with PredictionService.score_reading. A user
+    seen for the first time has their window read from MongoDB once (without
+    the record itself, which is already stored); every later record updates
+    the cached statistics in place. Needs the service's rolling stats cache.
+    """
+
+    def __init__(self, service, emit):
+        if service.stats_cache is None:
+            raise ValueError("StreamingScorer needs the rolling stats cache (STATS_CACHE_MAX_BYTES > 0)")
+        self.service = service
+        self.emit = emit
+        self.events = 0
+        self.alerts = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self._processing = deque(maxlen=_LATENCY_WINDOW)
+        self._end_to_end = deque(maxlen=_LATENCY_WINDOW)
+
+    def process(self, record, inserted_at=None):
+        """Scores one record; returns the alert event it emitted, or None."""
+        start = time.perf_counter()
+        user_id = str(record['userId'])
+        try:
+            event = self._score(user_id, record)
+        except Exception as e:
+            logger.error(f"Change feed error for record {record.get('_id')}: {e}")
+            self.errors += 1
+            STREAM_EVENTS.labels('error').inc()
+            return None
+
+        seconds = time.perf_counter() - start
+        self.events += 1
+        self._processing.append(seconds)
+        STREAM_SECONDS.labels('processing').observe(seconds)
+        if inserted_at is not None:
+            end_to_end = (datetime.now(timezone.utc) - _as_utc(inserted_at)).total_seconds()
+            self._end_to_end.append(end_to_end)
+            STREAM_SECONDS.labels('end_to_end').observe(end_to_end)
+        if event is None:
+            STREAM_EVENTS.labels('scored').inc()
+            return None
+        event['processingSeconds'] = seconds
+        self.alerts += 1
+        STREAM_EVENTS.labels('alert').inc()
+        self.emit(event)
+        return event
+
+    def _score(self, user_id, record):
+        service = self.service
+        payload = record_payload(record)
+        new_data_flat = service._flatten_data(payload)
+        if new_data_flat is None:
+            raise ValueError('Invalid record format')
+        stats = service.cached_stats(user_id)
+        history = None
+        if stats is None:
+            history = service.load_history(user_id)
+            if history is not None and not history.empty and record.get('date') is not None:
+                history = history[history['date'] < pd.Timestamp(service._reading_date(payload))]
+                history = history.reset_index(drop=True)
+        result = service.score_reading(payload, new_data_flat, user_id, stats, history)
+
+        # alerts = history alerts + this reading's safety-net and anomaly alerts
+        summary = result['analysis_summary']
+        new_alerts = summary['immediate_alerts'] + summary['anomaly_alerts']
+        if not new_alerts:
+            return None
+        return {
+            'userId': user_id,
+            'healthRecordId': str(record.get('_id')),
+            'date': record['date'].isoformat() if record.get('date') else None,
+            'riskLevel': result['risk_level'],
+            'confidence': result['confidence'],
+            'alerts': result['alerts'][-new_alerts:],
+            'suggestions': result['suggestions'],
+        }
+
+    def run(self, records, limit=None):
+        for record, inserted_at in records:
+            self.process(record, inserted_at)
+            if limit and self.events + self.errors >= limit:
+                break
+        return self.summary()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        summary = {
+            'events': self.events,
+            'alerts': self.alerts,
+            'errors': self.errors,
+            'events_per_sec': self.events / elapsed if elapsed else 0.0,
+            'stats_cache': self.service.stats_cache.info(),
+        }
+        for name, values in (('processing_seconds', self._processing), ('end_to_end_seconds', self._end_to_end)):
+            if values:
+                p50, p99 = np.percentile(values, [50, 99])
+                summary[name] = {'p50': float(p50), 'p99': float(p99), 'max': float(max(values))}
+        return summary
+
+
+def _as_utc(moment):
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def write_event(event):
+    sys.stdout.write(json.dumps(event) + '\n')
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score CareOClock healthrecords as they are inserted")
+    parser.add_argument('--mongodb-uri', default=os.environ.get('MONGODB_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--database', help="default: the URI's database, else MONGODB_DATABASE")
+    parser.add_argument('--replay', metavar='NDJSON', help="read records from this file instead of a change stream")
+    parser.add_argument('--follow', action='store_true', help="with --replay, keep reading appended lines")
+    parser.add_argument('--resume-token-file', help="change stream position, saved after every record")
+    parser.add_argument('--alerts-collection', help="also insert alert events into this collection")
+    parser.add_argument('--limit', type=int, help="stop after this many records")
+    args = parser.parse_args()
+
+    # Alert events go to stdout as NDJSON; progress and errors to stderr
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    from predictive_service import PredictionService
+
+    mongo = LazyMongoClient(args.mongodb_uri, args.database)
+    if args.replay:
+        from memory_store import InMemoryHealthRecords
+
+        # Local stand-in: no stored history, state is built from the replayed records
+        service = PredictionService(records_collection=InMemoryHealthRecords(), response_cache_max_bytes=0)
+        records = ndjson_records(args.replay, follow=args.follow)
+    else:
+        records_collection = mongo.collection('healthrecords')
+        service = PredictionService(records_collection=records_collection, response_cache_max_bytes=0,
+                                    risk_index_collection=mongo.collection(LATEST_RISK_COLLECTION))
+        records = change_stream_records(records_collection, args.resume_token_file)
+
+    emit = write_event
+    if args.alerts_collection:
+        alerts = mongo.collection(args.alerts_collection)
+
+        def emit(event):
+            write_event(event)
+            alerts.insert_one(dict(event, createdAt=datetime.utcnow()))
+
+    scorer = StreamingScorer(service, emit)
+    try:
+        summary = scorer.run(records, limit=args.limit)
+    except KeyboardInterrupt:
+        summary = scorer.summary()
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+CareOClock Predictive Engine - Nightly Cohort Scoring
+Description: Re-scores every active user (any healthrecord in the last 14
+             days), not only those who happened to submit a reading, so the
+             predictions collection behind getHighRiskPatients covers the whole
+             cohort. One aggregation streams the window sorted by user; the
+             parent cuts it into chunks of whole users and a process pool runs
+             the PredictionService stages on them: each user's newest record is
+             scored against the rest of their window, exactly as /predict
+             would score it. Results go back with unordered bulk_write upserts
+             keyed on (userId, healthRecordId), so a re-run replaces rather
+             than duplicates, and each user's entry in latest_risk
+             (risk_index.py) is brought up to date.
+
+    python cohort_scoring.py --mongodb-uri mongodb://localhost:27017 --workers 8
+    python cohort_scoring.py --dry-run --report cohort_scoring.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import pandas as pd
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from history_query import HISTORY_PROJECTION, frame_from_cursor, record_payload
+from mongo_client import HISTORY_READ_PREFERENCE, LazyMongoClient
+from risk_index import LATEST_RISK_COLLECTION, latest_risk_document, write_latest_risk
+
+logger = logging.getLogger(__name__)
+
+COHORT_WINDOW_DAYS = 14
+CHUNK_USERS = 1000
+PREDICTIONS_COLLECTION = 'predictions'
+# Prediction schema limits (backend/models/Prediction.js)
+MODEL_TYPES = ('RandomForest', 'XGBoost')
+MAX_RISK_FACTOR_LENGTH = 200
+MAX_EXPLANATION_LENGTH = 1000
+
+# The history projection plus what the newest record needs to be scored and referenced
+COHORT_PROJECTION = {**HISTORY_PROJECTION, '_id': 1, 'userId': 1, 'bloodSugar.testType': 1}
+
+
+def cohort_pipeline(start_date):
+    """
+    Every record in the window, grouped by user and oldest first within a
+    user. The sort walks the { userId: 1, date: -1 } index backwards, so the
+    stream starts at once instead of after a blocking sort.
+    """
+    return [
+        {'$match': {'date': {'$gte': start_date}}},
+        {'$sort': {'userId': -1, 'date': 1}},
+        {'$project': COHORT_PROJECTION},
+    ]
+
+
+def user_chunks(cursor, chunk_users=CHUNK_USERS):
+    """Cuts a user-sorted record stream into lists of (user id, records), `chunk_users` users each."""
+    chunk, records, current = [], [], None
+    for doc in cursor:
+        if doc['userId'] != current:
+            if records:
+                chunk.append((str(current), records))
+                if len(chunk) >= chunk_users:
+                    yield chunk
+                    chunk = []
+            current, records = doc['userId'], []
+        records.append(doc)
+    if records:
+        chunk.append((str(current), records))
+    if chunk:
+        yield chunk
+
+
+def prediction_document(user_id, record_id, result, scored_at):
+    """The fields of a backend Prediction document for one scored reading."""
+    ml_prediction = result.get('ml_prediction') or {}
+    factors = result['alerts'] or result['suggestions']
+    document = {
+        'userId': user_id,
+        'healthRecordId': record_id,
+        'riskLevel': result['risk_level'],
+        'confidence': result['confidence'],
+        'riskFactors': [factor[:MAX_RISK_FACTOR_LENGTH] for factor in result['alerts']],
+        'explanation': ('; '.join(factors) or 'No alerts for the latest reading.')[:MAX_EXPLANATION_LENGTH],
+        'modelVersion': ml_prediction.get('model_version', '1.0'),
+        'alertGenerated': False,
+        'updatedAt': scored_at,
+    }
+    if ml_prediction.get('probabilities'):
+        document['probabilities'] = ml_prediction['probabilities']
+    if ml_prediction.get('model') in MODEL_TYPES:
+        document['modelType'] = ml_prediction['model']
+    return document
+
+
+# Set in each worker by _init_worker
+_service = None
+
+
+def _init_worker(mongodb_uri, database=None):
+    global _service
+    from predictive_service import PredictionService
+
+    # Scoring only: no caches, one model for the whole run, and no latest risk
+    # index (the parent writes latest_risk from the chunk results)
+    _service = PredictionService(mongodb_uri, stats_cache_max_bytes=0, response_cache_max_bytes=0,
+                                 model_reload_interval=0, risk_index=False, database=database)
+
+
+def score_chunk(chunk, service=None):
+    """
+    Scores each user's newest record against the rest of their window.
+    Returns (prediction documents, latest_risk documents, users that failed,
+    scoring seconds).
+    """
+    service = service or _service
+    start = time.perf_counter()
+    # One frame for the whole chunk, split by user as fetch_users_history does
+    frame = frame_from_cursor((doc for _, records in chunk for doc in records[:-1]), key_columns=('userId',))
+    histories = {user_id: pd.DataFrame() for user_id, _ in chunk}
+    if not frame.empty:
+        for user_id, group in frame.groupby('userId', sort=False):
+            histories[user_id] = group.drop(columns='userId').reset_index(drop=True)
+    history_alerts = service.evaluate_histories(histories)
+
+    scored_at = datetime.utcnow()
+    documents, latest_risk, failed = [], [], 0
+    for user_id, records in chunk:
+        latest = records[-1]
+        try:
+            new_data_flat = service._flatten_data(record_payload(latest))
+            if new_data_flat is None:
+                failed += 1
+                continue
+            result = service._score(new_data_flat, histories[user_id],
+                                    history_alerts=list(history_alerts[user_id][1]))
+            document = prediction_document(latest['userId'], latest['_id'], result, scored_at)
+            documents.append(document)
+            latest_risk.append(latest_risk_document(user_id, latest['date'], document['riskLevel'],
+                                                    document['confidence'], document['modelVersion'], scored_at))
+        except Exception as e:
+            logger.error(f"Cohort scoring error for user {user_id}: {e}")
+            failed += 1
+    return documents, latest_risk, failed, time.perf_counter() - start
+
+
+def write_predictions(collection, documents):
+    """Unordered bulk upsert; returns (documents written, write errors)."""
+    if not documents:
+        return 0, 0
+    requests = [UpdateOne({'userId': doc['userId'], 'healthRecordId': doc['healthRecordId']},
+                          {'$set': doc, '$setOnInsert': {'createdAt': doc['updatedAt']}}, upsert=True)
+                for doc in documents]
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        return result.upserted_count + result.matched_count, 0
+    except BulkWriteError as e:
+        details = e.details
+        logger.error(f"{len(details['writeErrors'])} prediction writes failed, "
+                     f"first: {details['writeErrors'][0]['errmsg']}")
+        return details['nUpserted'] + details['nMatched'], len(details['writeErrors'])
+
+
+def score_cohort(records, predictions, mongodb_uri, workers=None, chunk_users=CHUNK_USERS,
+                 days=COHORT_WINDOW_DAYS, dry_run=False, service=None, latest_risk=None, database=None):
+    """
+    Streams the active cohort from `records`, scores it on `workers`
+    processes (in this process with workers=1, using `service` if given) and
+    writes the predictions to `predictions` (and, if given, the `latest_risk`
+    collection) unless dry_run. Workers connect to `mongodb_uri` and
+    `database`, which should be the database `records` lives in.
+    Returns the run summary.
+    """
+    workers = workers or os.cpu_count() or 1
+    start_date = datetime.utcnow() - timedelta(days=days)
+    totals = Counter()
+    risk_levels = Counter()
+
+    def collect(documents, latest_documents, failed, seconds):
+        totals['scored'] += len(documents)
+        totals['failed'] += failed
+        totals['score_seconds'] += seconds
+        risk_levels.update(doc['riskLevel'] for doc in documents)
+        if not dry_run:
+            write_start = time.perf_counter()
+            written, errors = write_predictions(predictions, documents)
+            totals['written'] += written
+            totals['write_errors'] += errors
+            if latest_risk is not None:
+                totals['write_errors'] += write_latest_risk(latest_risk, latest_documents)[1]
+            totals['write_seconds'] += time.perf_counter() - write_start
+
+    start = time.perf_counter()
+    cursor = records.aggregate(cohort_pipeline(start_date), allowDiskUse=True, batchSize=10000)
+    chunks = user_chunks(cursor, chunk_users)
+    if workers == 1:
+        if service is None:
+            _init_worker(mongodb_uri, database)
+        for chunk in chunks:
+            totals['users'] += len(chunk)
+            collect(*score_chunk(chunk, service))
+    else:
+        # spawn: workers start clean instead of inheriting this process's MongoClient threads
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(mongodb_uri, database)) as pool:
+            # A bounded number of chunks in flight keeps memory flat however large the cohort
+            pending = set()
+            for chunk in chunks:
+                totals['users'] += len(chunk)
+                pending.add(pool.submit(score_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(*future.result())
+            for future in pending:
+                collect(*future.result())
+    wall_seconds = time.perf_counter() - start
+
+    users_per_sec = totals['users'] / wall_seconds if wall_seconds else 0.0
+    return {
+        'users': totals['users'],
+        'scored': totals['scored'],
+        'failed': totals['failed'],
+        'written': totals['written'],
+        'write_errors': totals['write_errors'],
+        'risk_levels': dict(risk_levels),
+        'wall_seconds': wall_seconds,
+        'score_seconds': totals['score_seconds'],
+        'write_seconds': totals['write_seconds'],
+        'users_per_sec': users_per_sec,
+        'hours_per_million_users': 1e6 / users_per_sec / 3600 if users_per_sec else None,
+        'workers': workers,
+        'chunk_users': chunk_users,
+        'window_days': days,
+        'dry_run': dry_run,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nightly risk scoring of every active CareOClock user")
+    parser.add_argument('--mongodb-uri', default=os.environ.get('MONGODB_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--database', help="default: the URI's database, else MONGODB_DATABASE")
+    parser.add_argument('--workers', type=int, default=None, help="scoring processes (default: all cores)")
+    parser.add_argument('--chunk-users', type=int, default=CHUNK_USERS)
+    parser.add_argument('--days', type=int, default=COHORT_WINDOW_DAYS)
+    parser.add_argument('--dry-run', action='store_true', help="score without writing predictions")
+    parser.add_argument('--report', help="also write the run summary to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print("=" * 60)
+    print("CAREOCLOCK NIGHTLY COHORT SCORING")
+    print(f"Timestamp: {datetime.now()}")
+    print("=" * 60)
+
+    mongo = LazyMongoClient(args.mongodb_uri, args.database)
+    # The cohort read is a long scan that tolerates replication lag; writes go to the primary
+    summary = score_cohort(mongo.collection('healthrecords', HISTORY_READ_PREFERENCE),
+                           mongo.collection(PREDICTIONS_COLLECTION), args.mongodb_uri,
+                           workers=args.workers, chunk_users=args.chunk_users, days=args.days,
+                           dry_run=args.dry_run, latest_risk=mongo.collection(LATEST_RISK_COLLECTION),
+                           database=mongo.database_name)
+    summary['timestamp'] = str(datetime.now())
+
+    print(f"\n✓ Scored {summary['scored']:,} of {summary['users']:,} active users "
+          f"in {summary['wall_seconds']:.1f}s ({summary['users_per_sec']:,.0f} users/s, "
+          f"{summary['workers']} processes)")
+    if summary['hours_per_million_users']:
+        print(f"✓ At this rate 1M users take {summary['hours_per_million_users']:.2f} h")
+    print(f"✓ Risk levels: {summary['risk_levels']}")
+    if not args.dry_run:
+        print(f"✓ Predictions written: {summary['written']:,} ({summary['write_errors']} write errors)")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"✓ Run summary saved to: {args.report}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+CareOClock Predictive Engine - Feature Transformer
+Description: The one implementation of the model's feature pipeline, used by
+             HealthRiskPredictor for training and by RiskModel for serving.
+             Derived features (bp_ratio, heart_rate_category), risk labels and
+             standard scaling are computed column-wise with NumPy over a raw
+             matrix; a single reading is just a one-row matrix. The fitted
+             transformer is saved in the model bundle (model_bundle.py).
+"""
+
+import math
+
+import numpy as np
+
+# Raw inputs taken from a reading, in training order
+RAW_FEATURES = ('heart_rate', 'bp_systolic', 'bp_diastolic', 'glucose',
+                'sleep_hours', 'temperature', 'oxygen_level', 'age')
+FEATURE_COLUMNS = list(RAW_FEATURES) + ['bp_ratio', 'bmi_estimate', 'heart_rate_category']
+RISK_LEVELS = ('Low', 'Medium', 'High')
+
+# BMI is not recorded; training draws this placeholder N(mean, std) per row
+BMI_PLACEHOLDER = (25, 5)
+
+_HR, _SYS, _DIA = (RAW_FEATURES.index(name) for name in ('heart_rate', 'bp_systolic', 'bp_diastolic'))
+
+
+# 100 bpm itself is still category 1
+_HR_BINS = np.array([60, np.nextafter(100, np.inf)])
+
+
+def heart_rate_category(hr):
+    """0 below 60 bpm, 1 up to 100 bpm, 2 above (NaN counts as above, as before)."""
+    return np.digitize(np.asarray(hr, dtype=float), _HR_BINS)
+
+
+def bp_ratio(systolic, diastolic):
+    diastolic = np.asarray(diastolic, dtype=float)
+    return systolic / np.where(diastolic == 0, 1, diastolic)
+
+
+def risk_label_codes(heart_rate, bp_systolic, bp_diastolic, glucose, sleep_hours, age,
+                     age_weight=1.0, medium_at=2, high_at=3):
+    """
+    Rule-based risk labels as indices into RISK_LEVELS: one point each for an
+    abnormal heart rate, high blood pressure, high glucose and short sleep,
+    `age_weight` for age over 65. Comparisons with NaN add nothing.
+    """
+    heart_rate = np.asarray(heart_rate, dtype=float)
+    score = ((heart_rate > 100) | (heart_rate < 60)).astype(float)
+    score += (np.asarray(bp_systolic) > 140) | (np.asarray(bp_diastolic) > 90)
+    score += np.asarray(glucose) > 140
+    score += np.asarray(sleep_hours) < 6
+    score += (np.asarray(age) > 65) * age_weight
+    return np.select([score >= high_at, score >= medium_at], [2, 1], 0).astype(np.uint8)
+
+
+def risk_labels(codes):
+    return np.array(RISK_LEVELS, dtype=object)[np.asarray(codes)]
+
+
+class FeatureTransformer:
+    """
+    Fitted state: the raw-feature means used to fill missing values (the
+    training frame's column means) and the StandardScaler over all features.
+    """
+
+    def __init__(self, feature_names=FEATURE_COLUMNS):
+        # scikit-learn takes most of a cold import; serving unpickles a fitted transformer instead
+        from sklearn.preprocessing import StandardScaler
+
+        self.feature_names = list(feature_names)
+        self.scaler = StandardScaler()
+        self.fill = None
+        self.mean = None
+        self.scale = None
+        self.bmi_fill = None
+        order = [FEATURE_COLUMNS.index(name) for name in self.feature_names]
+        self._order = None if order == list(range(len(FEATURE_COLUMNS))) else order
+
+    @classmethod
+    def from_scaler(cls, scaler, feature_names):
+        """Transformer for artifacts saved before feature_transformer.pkl existed."""
+        transformer = cls(feature_names)
+        transformer.scaler = scaler
+        transformer._fitted(np.asarray(scaler.mean_, dtype=float)[[transformer.feature_names.index(name)
+                                                                     for name in RAW_FEATURES]])
+        return transformer
+
+    def _fitted(self, fill):
+        self.fill = np.asarray(fill, dtype=float)
+        self.mean = np.asarray(self.scaler.mean_, dtype=float)
+        self.scale = np.asarray(self.scaler.scale_, dtype=float)
+        # Serving has no BMI either; the training mean carries no information either way
+        self.bmi_fill = float(self.mean[self.feature_names.index('bmi_estimate')])
+
+    @staticmethod
+    def raw_matrix(df):
+        """(n, len(RAW_FEATURES)) float matrix from a DataFrame with the raw columns."""
+        return df[list(RAW_FEATURES)].to_numpy(dtype=float)
+
+    @staticmethod
+    def raw_row(flat):
+        """One-row raw matrix from a flattened reading; absent values are NaN."""
+        nan = math.nan
+        return np.array([[nan if flat.get(name) is None else flat[name] for name in RAW_FEATURES]], dtype=float)
+
+    def features(self, raw, bmi=None):
+        """Unscaled feature matrix in feature_names order; NaN inputs take the fill values."""
+        raw = np.where(np.isnan(raw), self.fill, raw)
+        n = len(raw)
+        X = np.empty((n, len(FEATURE_COLUMNS)), order='F')
+        X[:, :len(RAW_FEATURES)] = raw
+        X[:, -3] = bp_ratio(raw[:, _SYS], raw[:, _DIA])
+        X[:, -2] = self.bmi_fill if bmi is None else bmi
+        X[:, -1] = heart_rate_category(raw[:, _HR])
+        return X if self._order is None else X[:, self._order]
+
+    def transform(self, raw):
+        X = self.features(raw)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def transform_row(self, flat):
+        return self.transform(self.raw_row(flat))
+
+    def fit_transform(self, df):
+        """
+        Fits on a training frame and returns its scaled feature matrix.
+        Missing values take the frame's column means; bmi_estimate is the
+        random placeholder training has always used.
+        """
+        self.fill = df[list(RAW_FEATURES)].mean().to_numpy(dtype=float)
+        raw = self.raw_matrix(df)
+        X = self.features(raw, bmi=np.random.normal(*BMI_PLACEHOLDER, len(raw)))
+        # Scaled in place (what StandardScaler.transform computes on its copy),
+        # so large training sets hold one feature matrix, not two
+        self.scaler.fit(X)
+        self._fitted(self.fill)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def partial_fit_transform(self, df):
+        """
+        Folds a batch of new training rows into the fitted statistics and
+        returns the batch scaled with the updated ones. The scaler's stored
+        n_samples_seen_, mean_ and var_ are sufficient statistics, so
+        StandardScaler.partial_fit gives the same scaling a fit on all rows
+        would; missing values in the batch take the previous fill values.
+        """
+        raw = self.raw_matrix(df)
+        X = self.features(raw, bmi=np.random.normal(*BMI_PLACEHOLDER, len(raw)))
+        self.scaler.partial_fit(X)
+        self._fitted(self.scaler.mean_[[self.feature_names.index(name) for name in RAW_FEATURES]])
+        X -= self.mean
+        X /= self.scale
+        return X
@@ -0,0 +1,183 @@
+"""
+CareOClock Predictive Engine - History Query Pushdown
+Description: Builds the MongoDB projection and aggregation pipeline used to read
+             a user's history window, and turns the results into the shapes the
+             analysis stages consume without per-document dict flattening.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from safety_net import HISTORY_ALERT_FILTER
+from trend_engine import SUM_KEYS, TREND_VITALS, slopes_from_sums, as_trend_dict
+
+
+# (column, document field, nested key). sleepHours/temperature/oxygenLevel are
+# projected whole because older records store them as plain numbers.
+HISTORY_FIELDS = [
+    ('bp_systolic', 'bloodPressure', 'systolic'),
+    ('bp_diastolic', 'bloodPressure', 'diastolic'),
+    ('glucose', 'bloodSugar', 'value'),
+    ('heart_rate', 'heartRate', 'value'),
+    ('weight', 'weight', 'value'),
+    ('sleep_hours', 'sleepHours', 'value'),
+    ('temperature', 'temperature', 'value'),
+    ('oxygen_level', 'oxygenLevel', 'value'),
+]
+_SCALAR_CAPABLE = {'sleepHours', 'temperature', 'oxygenLevel'}
+
+# Only the vitals and date come over the wire; notes, audit fields,
+# riskAssessment and _id stay on the server.
+HISTORY_PROJECTION = {'_id': 0, 'date': 1}
+for _, _field, _key in HISTORY_FIELDS:
+    HISTORY_PROJECTION[_field if _field in _SCALAR_CAPABLE else f'{_field}.{_key}'] = 1
+
+# Fields whose presence makes a record count as a reading (mirrors dropping
+# rows where every vital is missing).
+_ANY_VITAL = {'$or': [{f'{field}.{key}': {'$type': 'number'}} for _, field, key in HISTORY_FIELDS] +
+                     [{field: {'$type': 'number'}} for field in sorted(_SCALAR_CAPABLE)]}
+
+_SUMMARY_FEATURES = {
+    'heart_rate': '$heartRate.value',
+    'bp_systolic': '$bloodPressure.systolic',
+    'glucose': '$bloodSugar.value',
+    'weight': '$weight.value',
+    'oxygen_level': {'$ifNull': ['$oxygenLevel.value', '$oxygenLevel']},
+}
+
+
+def record_payload(doc):
+    """A stored healthrecord in the /predict payload shape (sleep, temperature and oxygen as plain numbers)."""
+    payload = dict(doc)
+    for field in _SCALAR_CAPABLE:
+        if isinstance(payload.get(field), dict):
+            payload[field] = payload[field].get('value')
+    return payload
+
+
+def frame_from_cursor(cursor, key_columns=()):
+    """
+    Fills one list per column straight from the cursor and converts each to a
+    typed NumPy array, instead of building a dict per document and coercing
+    every column with pd.to_numeric afterwards. `key_columns` are extra
+    top-level fields copied through as strings (e.g. 'userId').
+    Returns the same frame fetch_user_history always returned, or an empty one.
+    """
+    nan = math.nan
+    dates = []
+    keys = {name: [] for name in key_columns}
+    columns = {name: [] for name, _, _ in HISTORY_FIELDS}
+    fields = [(columns[name], field, key) for name, field, key in HISTORY_FIELDS]
+
+    for doc in cursor:
+        dates.append(doc.get('date'))
+        for name, values in keys.items():
+            values.append(str(doc.get(name)))
+        for values, field, key in fields:
+            v = doc.get(field)
+            if isinstance(v, dict):
+                v = v.get(key)
+            values.append(nan if v is None else v)
+
+    if not dates:
+        return pd.DataFrame()
+
+    data = {'date': pd.to_datetime(dates)}
+    for name, values in columns.items():
+        arr = np.array(values)
+        if arr.dtype.kind not in 'iuf':
+            arr = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy()
+        data[name] = arr
+    data.update(keys)
+
+    df = pd.DataFrame(data)
+    return df.dropna(how='all', subset=list(columns)).reset_index(drop=True)
+
+
+def summary_pipeline(user_oid, start_date, tail_size=7):
+    """
+    Aggregation computing the window moments server-side: per-feature window
+    counts/sums, mean and sample std of the last `tail_size` readings, the
+    least-squares sums for every trend vital, and only the records that can fire
+    a history safety-net alert. The leading $match/$sort walk the
+    { userId: 1, date: -1 } index in order, so no blocking sort is needed.
+    """
+    window_group = {'_id': None, 'rows': {'$sum': 1}}
+    tail_group = {'_id': None}
+    for name, path in _SUMMARY_FEATURES.items():
+        window_group[f'{name}_n'] = {'$sum': {'$cond': [{'$isNumber': path}, 1, 0]}}
+        window_group[f'{name}_sum'] = {'$sum': path}
+        tail_group[f'{name}_mean'] = {'$avg': path}
+        tail_group[f'{name}_std'] = {'$stdDevSamp': path}
+
+    trend_group = {'_id': None}
+    for name in TREND_VITALS:
+        path = _SUMMARY_FEATURES[name]
+        terms = {'n': 1, 't': '$t', 'tt': {'$multiply': ['$t', '$t']}, 'y': path,
+                 'ty': {'$multiply': ['$t', path]}, 'yy': {'$multiply': [path, path]}}
+        for key, term in terms.items():
+            trend_group[f'{name}_{key}'] = {'$sum': {'$cond': [{'$isNumber': path}, term, 0]}}
+
+    days = {'$divide': [{'$subtract': ['$date', start_date]}, 86400000]}
+    return [
+        {'$match': {'userId': user_oid, 'date': {'$gte': start_date}, **_ANY_VITAL}},
+        {'$sort': {'date': -1}},
+        {'$facet': {
+            'window': [{'$group': window_group}],
+            'tail': [{'$limit': tail_size}, {'$group': tail_group}],
+            'trend': [{'$addFields': {'t': days}}, {'$group': trend_group}],
+            'alerts': [
+                {'$match': HISTORY_ALERT_FILTER},
+                {'$sort': {'date': 1}},
+                {'$project': HISTORY_PROJECTION},
+            ],
+        }},
+    ]
+
+
+class WindowSummary:
+    """
+    Read-only result of summary_pipeline. Answers the same queries as
+    rolling_stats.UserRollingStats, so it can be scored with the same code,
+    but cannot be updated incrementally.
+    """
+
+    def __init__(self, facets, history_alerts, available=True):
+        # False when the aggregation failed: an empty window that must not be
+        # cached as the user's history
+        self.available = available
+        self._window = (facets.get('window') or [{}])[0]
+        self._tail = (facets.get('tail') or [{}])[0]
+        self._trend = (facets.get('trend') or [{}])[0]
+        self._history_alerts = history_alerts
+
+    @classmethod
+    def unavailable(cls):
+        return cls({}, [], available=False)
+
+    @property
+    def row_count(self):
+        return self._window.get('rows', 0)
+
+    def history_alerts(self):
+        return list(self._history_alerts)
+
+    def window_count(self, feature):
+        return self._window.get(f'{feature}_n', 0)
+
+    def window_mean(self, feature):
+        n = self.window_count(feature)
+        return self._window[f'{feature}_sum'] / n if n else math.nan
+
+    def tail_moments(self, feature):
+        mean = self._tail.get(f'{feature}_mean')
+        std = self._tail.get(f'{feature}_std')
+        return (math.nan if mean is None else mean), (math.nan if std is None else std)
+
+    def trend_slopes(self):
+        sums = [np.array([self._trend.get(f'{name}_{key}', 0.0) for name in TREND_VITALS], dtype=float)
+                for key in SUM_KEYS]
+        slope, se = slopes_from_sums(*sums)
+        return as_trend_dict(TREND_VITALS, slope, se, sums[0])
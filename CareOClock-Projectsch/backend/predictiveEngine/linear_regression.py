@@ -11,10 +11,10 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
-from pymongo import MongoClient
 from bson import ObjectId
 from sklearn.linear_model import LinearRegression
 import warnings
+from mongo_client import LazyMongoClient
 
 # Suppress warnings from sklearn/pandas
 warnings.filterwarnings('ignore')
@@ -29,14 +29,14 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 
 
 class PredictionService:
-    def __init__(self, mongodb_uri=''):
+    def __init__(self, mongodb_uri=None):
         try:
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client['test'] # Use your DB name
-            self.records_collection = self.db['healthrecords']
-            logger.info("Successfully connected to MongoDB.")
+            # MONGODB_URI / MONGODB_DATABASE; connects on first use (mongo_client.py)
+            self.mongo = LazyMongoClient(mongodb_uri)
+            self.records_collection = self.mongo.lazy_collection('healthrecords')
+            logger.info(f"MongoDB configured for database '{self.mongo.database_name}'.")
         except Exception as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
+            logger.error(f"Invalid MongoDB configuration: {e}")
             raise e
 
     def _flatten_data(self, new_data_nested):
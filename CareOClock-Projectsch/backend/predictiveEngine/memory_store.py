@@ -0,0 +1,124 @@
+"""
+CareOClock Predictive Engine - In-Memory Health Records
+Description: A thread-safe stand-in for the MongoDB healthrecords collection,
+             for load tests and benchmarks that must run without a database.
+             It covers the query shapes PredictionService issues (userId
+             equality or $in, date ranges, inclusion projections, sorts) and
+             can add a fixed round-trip delay to mimic a networked server.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+
+def _matches(value, condition):
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, arg in condition.items():
+        if op == '$in':
+            ok = value in arg
+        elif value is None:
+            ok = False
+        elif op == '$gte':
+            ok = value >= arg
+        elif op == '$gt':
+            ok = value > arg
+        elif op == '$lte':
+            ok = value <= arg
+        elif op == '$lt':
+            ok = value < arg
+        else:
+            raise NotImplementedError(f"Unsupported query operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    """Inclusion projection with dotted paths (e.g. 'bloodPressure.systolic')."""
+    out = {'_id': doc['_id']} if projection.get('_id', 1) and '_id' in doc else {}
+    for path, include in projection.items():
+        if path == '_id' or not include:
+            continue
+        head, _, rest = path.partition('.')
+        if head not in doc:
+            continue
+        if not rest:
+            out[head] = doc[head]
+        elif isinstance(doc[head], dict) and rest in doc[head]:
+            out.setdefault(head, {})[rest] = doc[head][rest]
+    return out
+
+
+class InMemoryCursor:
+    def __init__(self, docs, projection=None, latency=0.0):
+        self._docs = docs
+        self._projection = projection
+        self._latency = latency
+
+    def sort(self, key_or_list, direction=1):
+        keys = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        for key, order in reversed(keys):
+            self._docs.sort(key=lambda doc: doc.get(key), reverse=order == -1)
+        return self
+
+    def limit(self, count):
+        if count:
+            self._docs = self._docs[:count]
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        if self._latency:
+            time.sleep(self._latency)
+        if self._projection:
+            return (_project(doc, self._projection) for doc in self._docs)
+        return iter(self._docs)
+
+
+class InMemoryHealthRecords:
+    """
+    Documents are kept per user, so userId lookups touch only that user's
+    records. `latency_ms` is slept once per query when the cursor is read.
+    """
+
+    def __init__(self, docs=(), latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        self._by_user = defaultdict(list)
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.insert_many(docs)
+
+    def insert_many(self, docs):
+        with self._lock:
+            for doc in docs:
+                self._by_user[doc['userId']].append(doc)
+
+    def insert_one(self, doc):
+        self.insert_many([doc])
+
+    def find(self, filter=None, projection=None):
+        filter = dict(filter or {})
+        user_condition = filter.pop('userId', None)
+        with self._lock:
+            self.queries += 1
+            if user_condition is None:
+                candidates = [doc for docs in self._by_user.values() for doc in docs]
+            elif isinstance(user_condition, dict) and set(user_condition) == {'$in'}:
+                candidates = [doc for user in user_condition['$in'] for doc in self._by_user.get(user, ())]
+            else:
+                candidates = list(self._by_user.get(user_condition, ()))
+
+        docs = [doc for doc in candidates
+                if all(_matches(doc.get(field), condition) for field, condition in filter.items())]
+        return InMemoryCursor(docs, projection, self.latency)
+
+    def count_documents(self, filter=None):
+        return sum(1 for _ in self.find(filter))
+
+    def aggregate(self, pipeline):
+        raise NotImplementedError("InMemoryHealthRecords does not run aggregation pipelines; "
+                                  "use HISTORY_FETCH_MODE=projected or documents")
@@ -0,0 +1,267 @@
+"""
+CareOClock Predictive Engine - Model Bundle
+Description: Saves everything a trained model version needs - both models,
+             their array-compiled forms, the FeatureTransformer and the label
+             encoder - as one versioned bundle directory with a manifest and
+             a content hash, replacing the separate .pkl files. Files are
+             uncompressed joblib dumps, so the compiled node arrays load with
+             mmap_mode='r' and serving workers share the same page-cache pages
+             instead of each holding a copy.
+
+Bundle layout (<root>/v<model_version>-<hash[:12]>/):
+    manifest.json               version, metadata, per-file sha256, content hash
+    preprocessing.joblib        FeatureTransformer and LabelEncoder
+    <Model>.joblib              fitted RandomForest / XGBoost (training, fallback)
+    <Model>.compiled.joblib     CompiledEnsemble node arrays (serving, mmap)
+<root>/CURRENT names the bundle in use and is replaced atomically.
+
+Usage:
+    python model_bundle.py --from-legacy .          # bundle the old .pkl files
+    python model_bundle.py --verify <bundle dir>
+    python model_bundle.py --measure-load <bundle dir>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+from datetime import datetime
+
+import joblib
+
+from feature_transformer import FeatureTransformer
+from tree_compiler import compile_model
+
+# Relative to the model directory unless absolute
+MODEL_BUNDLE_DIR = os.environ.get('MODEL_BUNDLE_DIR', 'model_bundles')
+BUNDLE_FORMAT = 1
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+PREPROCESSING_FILE = 'preprocessing.joblib'
+# Files written by save_models before bundles existed
+LEGACY_MODEL_FILES = {'RandomForest': 'random_forest_model.pkl', 'XGBoost': 'xgboost_model.pkl'}
+
+
+def model_file(name):
+    return f'{name}.joblib'
+
+
+def compiled_file(name):
+    return f'{name}.compiled.joblib'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _content_hash(files):
+    """Hash over the (name, sha256) of every payload file, in name order."""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}\0{files[name]['sha256']}\n".encode())
+    return digest.hexdigest()
+
+
+def save_bundle(root, models, transformer, label_encoder, metadata):
+    """
+    Writes a bundle for `models` ({name: fitted model}) under `root` and
+    points CURRENT at it. The directory is staged and renamed into place; a
+    bundle with the same content already present is reused.
+    Returns (bundle path, manifest).
+    """
+    root = os.path.abspath(root)
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, f'.staging-{os.getpid()}')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    joblib.dump({'transformer': transformer, 'label_encoder': label_encoder},
+                os.path.join(staging, PREPROCESSING_FILE))
+    for name, model in models.items():
+        joblib.dump(model, os.path.join(staging, model_file(name)))
+        try:
+            joblib.dump(compile_model(model), os.path.join(staging, compiled_file(name)))
+        except (TypeError, ValueError) as e:
+            print(f"Not compiling {name} ({e}); serving will use predict_proba")
+
+    files = {name: {'sha256': _sha256(os.path.join(staging, name)),
+                    'bytes': os.path.getsize(os.path.join(staging, name))}
+             for name in sorted(os.listdir(staging))}
+    content_hash = _content_hash(files)
+    version = metadata.get('model_version', '1.0')
+    bundle_name = f'v{version}-{content_hash[:12]}'
+    manifest = dict(metadata, bundle=bundle_name, bundle_format=BUNDLE_FORMAT, content_hash=content_hash,
+                    models=list(models), files=files)
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    path = os.path.join(root, bundle_name)
+    if os.path.exists(path):
+        shutil.rmtree(staging)
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    else:
+        os.rename(staging, path)
+    set_current(root, bundle_name)
+    return path, manifest
+
+
+def set_current(root, bundle_name):
+    pointer = os.path.join(root, CURRENT_FILE)
+    tmp = f'{pointer}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        f.write(bundle_name + '\n')
+    os.replace(tmp, pointer)
+
+
+def current_bundle(root):
+    """Path of the bundle CURRENT points at, or None if there is none."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(root, name)
+    return path if name and os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('bundle_format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('bundle_format')} in {path}")
+    return manifest
+
+
+def verify_bundle(path):
+    """Recomputes every file hash; raises ValueError on any mismatch."""
+    manifest = read_manifest(path)
+    for name, entry in manifest['files'].items():
+        if _sha256(os.path.join(path, name)) != entry['sha256']:
+            raise ValueError(f"{name} in {path} does not match its manifest hash")
+    if _content_hash(manifest['files']) != manifest['content_hash']:
+        raise ValueError(f"Content hash of {path} does not match its manifest")
+    return manifest
+
+
+def load_preprocessing(path):
+    """(FeatureTransformer, LabelEncoder) of a bundle."""
+    preprocessing = joblib.load(os.path.join(path, PREPROCESSING_FILE))
+    return preprocessing['transformer'], preprocessing['label_encoder']
+
+
+def load_compiled(path, name, mmap_mode='r'):
+    """
+    The CompiledEnsemble of one model with its node arrays memory-mapped,
+    or None if the bundle has no compiled form of it.
+    """
+    compiled_path = os.path.join(path, compiled_file(name))
+    if not os.path.exists(compiled_path):
+        return None
+    return joblib.load(compiled_path, mmap_mode=mmap_mode)
+
+
+def load_model(path, name):
+    # sklearn and XGBoost copy their tree structures out of the file on
+    # unpickling, so the fitted models are private per process either way
+    return joblib.load(os.path.join(path, model_file(name)))
+
+
+def load_bundle(path):
+    """Everything in a bundle, for training: {'manifest', 'models', 'transformer', 'label_encoder'}."""
+    manifest = read_manifest(path)
+    transformer, label_encoder = load_preprocessing(path)
+    return {
+        'manifest': manifest,
+        'models': {name: load_model(path, name) for name in manifest['models']},
+        'transformer': transformer,
+        'label_encoder': label_encoder,
+    }
+
+
+def load_legacy(model_dir):
+    """The separate .pkl artifacts in the load_bundle layout, metadata standing in for the manifest."""
+    with open(os.path.join(model_dir, 'model_metadata.pkl'), 'rb') as f:
+        metadata = pickle.load(f)
+    transformer_path = os.path.join(model_dir, 'feature_transformer.pkl')
+    if os.path.exists(transformer_path):
+        transformer = joblib.load(transformer_path)
+    else:
+        with open(os.path.join(model_dir, 'feature_names.pkl'), 'rb') as f:
+            feature_names = pickle.load(f)
+        transformer = FeatureTransformer.from_scaler(joblib.load(os.path.join(model_dir, 'scaler.pkl')),
+                                                     feature_names)
+    return {
+        'manifest': metadata,
+        'models': {name: joblib.load(os.path.join(model_dir, filename))
+                   for name, filename in LEGACY_MODEL_FILES.items()},
+        'transformer': transformer,
+        'label_encoder': joblib.load(os.path.join(model_dir, 'label_encoder.pkl')),
+    }
+
+
+# Run in a fresh interpreter so module imports are timed too
+_COLD_LOAD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+from model_inference import RiskModel
+imported = time.perf_counter()
+risk_model = RiskModel.from_bundle(sys.argv[1])
+print(json.dumps({
+    'bundle': risk_model.bundle,
+    'model': risk_model.name,
+    'import_seconds': imported - start,
+    'load_seconds': risk_model.load_seconds,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def measure_cold_load(path):
+    """
+    Loads the bundle for serving in a new Python process and returns its
+    timings: module imports, RiskModel load (including the warm-up
+    prediction) and peak RSS. Right after training the files are usually
+    still in the page cache, so this measures a new worker, not a cold disk.
+    """
+    result = subprocess.run([sys.executable, '-c', _COLD_LOAD_SCRIPT, os.path.abspath(path)],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, check and time CareOClock model bundles")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--from-legacy', metavar='MODEL_DIR',
+                       help="bundle the .pkl files written by older save_models")
+    group.add_argument('--verify', metavar='BUNDLE')
+    group.add_argument('--measure-load', metavar='BUNDLE')
+    args = parser.parse_args()
+
+    if args.measure_load:
+        print(json.dumps(measure_cold_load(args.measure_load), indent=2))
+    elif args.verify:
+        manifest = verify_bundle(args.verify)
+        print(f"✓ {manifest['bundle']} matches its manifest ({len(manifest['files'])} files)")
+    else:
+        artifacts = load_legacy(args.from_legacy)
+        metadata = dict(artifacts['manifest'])
+        metadata.setdefault('model_version', '1.0')
+        metadata['bundled_at'] = datetime.now().isoformat()
+        path, manifest = save_bundle(os.path.join(args.from_legacy, MODEL_BUNDLE_DIR), artifacts['models'],
+                                     artifacts['transformer'], artifacts['label_encoder'], metadata)
+        print(f"✓ Bundle saved to: {path}")
+        print(f"Cold load: {json.dumps(measure_cold_load(path))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+CareOClock Predictive Engine - Model Inference
+Description: Loads the model bundle written by HealthRiskPredictor.save_models
+             once (model_bundle.py; the older separate .pkl files still load)
+             and scores single readings with it. From a bundle only the
+             memory-mapped compiled trees are loaded, not the fitted models.
+             Features come from the same FeatureTransformer training used
+             (feature_transformer.py), applied to a one-row NumPy matrix, so a
+             request pays for the trees only, not for DataFrame construction
+             or input validation.
+"""
+
+import logging
+import os
+import pickle
+import time
+
+import joblib
+import numpy as np
+
+from feature_transformer import FeatureTransformer
+from model_bundle import (LEGACY_MODEL_FILES, MODEL_BUNDLE_DIR, current_bundle, load_compiled, load_model,
+                          load_preprocessing, read_manifest)
+from tree_compiler import compile_model
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.dirname(os.path.abspath(__file__)))
+MODEL_FILE = os.environ.get('MODEL_FILE', 'best_model.pkl')
+
+
+class RiskModel:
+    """
+    A trained classifier plus the FeatureTransformer it was fitted with.
+    Missing inputs are filled with the training means.
+    """
+
+    def __init__(self, model, transformer, label_encoder, metadata=None, name=None, compiled=None):
+        self.model = model
+        self.transformer = transformer
+        self.feature_names = transformer.feature_names
+        self.metadata = metadata or {}
+        self.name = name or type(model).__name__
+        self.version = self.metadata.get('model_version')
+        self.bundle = self.metadata.get('bundle')
+        self.load_seconds = None
+
+        # Array-compiled trees give the same probabilities as predict_proba
+        # without its per-call validation and dispatch overhead.
+        if compiled is None:
+            try:
+                compiled = compile_model(model)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Falling back to {type(model).__name__}.predict_proba: {e}")
+        self.compiled = compiled
+
+        classes = model.classes_ if model is not None else compiled.classes
+        self.class_names = [str(c) for c in label_encoder.inverse_transform(classes)]
+
+    @classmethod
+    def load(cls, model_dir=MODEL_DIR, model_file=MODEL_FILE):
+        """
+        The current bundle under model_dir if there is one, else the .pkl
+        files. model_file picks the model either way: best_model.pkl is the
+        one training chose, random_forest_model.pkl / xgboost_model.pkl a
+        specific one.
+        """
+        bundle = current_bundle(os.path.join(model_dir, MODEL_BUNDLE_DIR))
+        if bundle is not None:
+            names = {filename: name for name, filename in LEGACY_MODEL_FILES.items()}
+            return cls.from_bundle(bundle, names.get(model_file))
+
+        start = time.perf_counter()
+        model = joblib.load(os.path.join(model_dir, model_file))
+        label_encoder = joblib.load(os.path.join(model_dir, 'label_encoder.pkl'))
+        transformer_path = os.path.join(model_dir, 'feature_transformer.pkl')
+        if os.path.exists(transformer_path):
+            transformer = joblib.load(transformer_path)
+        else:
+            with open(os.path.join(model_dir, 'feature_names.pkl'), 'rb') as f:
+                feature_names = pickle.load(f)
+            transformer = FeatureTransformer.from_scaler(joblib.load(os.path.join(model_dir, 'scaler.pkl')),
+                                                         feature_names)
+        metadata = {}
+        metadata_path = os.path.join(model_dir, 'model_metadata.pkl')
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'rb') as f:
+                metadata = pickle.load(f)
+
+        name = metadata.get('best_model') if model_file == 'best_model.pkl' else None
+        risk_model = cls(model, transformer, label_encoder, metadata, name=name)
+        # One throwaway prediction so the first request doesn't pay for lazy setup
+        risk_model.predict({})
+        risk_model.load_seconds = time.perf_counter() - start
+        return risk_model
+
+    @classmethod
+    def from_bundle(cls, path, name=None):
+        """
+        Loads one model of a bundle (default: the best one). The compiled
+        node arrays are memory-mapped read-only; the fitted model is only
+        unpickled when the bundle has no compiled form of it.
+        """
+        start = time.perf_counter()
+        manifest = read_manifest(path)
+        name = name or manifest['best_model']
+        transformer, label_encoder = load_preprocessing(path)
+        compiled = load_compiled(path, name)
+        model = load_model(path, name) if compiled is None else None
+        risk_model = cls(model, transformer, label_encoder, manifest, name=name, compiled=compiled)
+        risk_model.predict({})
+        risk_model.load_seconds = time.perf_counter() - start
+        return risk_model
+
+    def predict_proba_scaled(self, X):
+        if self.compiled is not None:
+            return self.compiled.predict_proba(X)
+        return self.model.predict_proba(X)
+
+    def predict(self, flat):
+        X = self.transformer.transform_row(flat)
+        proba = self.predict_proba_scaled(X)[0]
+        best = int(np.argmax(proba))
+        return {
+            'risk_level': self.class_names[best],
+            'probabilities': dict(zip(self.class_names, proba.tolist())),
+            'model': self.name,
+            'model_version': self.version,
+        }
+
+    def info(self):
+        return {
+            'model': self.name,
+            'model_version': self.version,
+            'trained_at': self.metadata.get('timestamp'),
+            'features': len(self.feature_names),
+            'classes': self.class_names,
+            'evaluator': 'compiled' if self.compiled is not None else 'native',
+            'bundle': self.bundle,
+            'load_seconds': self.load_seconds,
+        }
+
+
+def load_risk_model(model_dir=MODEL_DIR, model_file=MODEL_FILE):
+    """RiskModel.load, or None (logged) when the artifacts are missing or unreadable."""
+    try:
+        risk_model = RiskModel.load(model_dir, model_file)
+        logger.info(f"Loaded {risk_model.name} risk model from {model_dir} in {risk_model.load_seconds:.3f}s")
+        return risk_model
+    except Exception as e:
+        logger.warning(f"ML risk model unavailable ({e}); serving rule-based predictions only.")
+        return None
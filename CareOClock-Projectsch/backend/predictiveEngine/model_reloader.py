@@ -0,0 +1,157 @@
+"""
+CareOClock Predictive Engine - Model Hot Reload
+Description: Keeps a serving process's RiskModel up to date with the artifact
+             directory without a restart. A daemon thread polls the model
+             bundle's CURRENT pointer (or the .pkl files' modification times),
+             and the admin reload endpoint calls the same reload(). The new
+             model is loaded and warmed off the request path and swapped in by
+             a single reference assignment: requests that already picked up
+             the old model finish with it, later ones get the new one. A load
+             that fails leaves the old model serving.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+
+from metrics import Counter
+from model_bundle import MODEL_BUNDLE_DIR, current_bundle
+from model_inference import MODEL_DIR, MODEL_FILE, RiskModel
+
+logger = logging.getLogger(__name__)
+
+# Seconds between artifact checks; 0 disables the watcher (the endpoint still works)
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.environ.get('MODEL_RELOAD_INTERVAL_SECONDS', 10))
+# Files whose modification time marks a new model when there is no bundle
+_LEGACY_FILES = ('model_metadata.pkl', 'feature_transformer.pkl', 'scaler.pkl', 'label_encoder.pkl')
+
+MODEL_RELOADS = Counter('careoclock_model_reloads', 'Model artifact reload attempts by outcome.', ['status'])
+
+
+def artifact_signature(model_dir=MODEL_DIR, model_file=MODEL_FILE):
+    """Changes whenever a different model is published: the current bundle, else the .pkl mtimes."""
+    bundle = current_bundle(os.path.join(model_dir, MODEL_BUNDLE_DIR))
+    if bundle is not None:
+        return bundle
+    stamps = []
+    for name in (model_file,) + _LEGACY_FILES:
+        try:
+            stamps.append(os.stat(os.path.join(model_dir, name)).st_mtime_ns)
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class ModelReloader:
+    """
+    Owns the active RiskModel. Readers take `reloader.model` once per
+    prediction and use that reference; reload() replaces it.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, model_file=MODEL_FILE, interval=MODEL_RELOAD_INTERVAL_SECONDS):
+        self.model_dir = model_dir
+        self.model_file = model_file
+        self.interval = interval
+        self.model = None
+        self.signature = None
+        self.loaded_at = None
+        self.last_checked = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        # Artifacts that failed to load are not retried until they change again
+        self._failed_signature = None
+        # One load at a time; readers never take it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reload(self, force=False):
+        """
+        Loads and warms the model if the artifacts changed since the last
+        load (always with force=True), then swaps it in.
+        Returns {'status': 'loaded' | 'reloaded' | 'unchanged' | 'failed', ...}.
+        """
+        with self._lock:
+            self.last_checked = datetime.now().isoformat()
+            signature = artifact_signature(self.model_dir, self.model_file)
+            if not force:
+                if self.model is not None and signature == self.signature:
+                    return self._result('unchanged')
+                if signature == self._failed_signature:
+                    return self._result('failed', error=self.last_error)
+            try:
+                model = RiskModel.load(self.model_dir, self.model_file)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f'{type(e).__name__}: {e}'
+                self._failed_signature = signature
+                MODEL_RELOADS.labels('failed').inc()
+                if self.model is None:
+                    logger.warning(f"ML risk model unavailable ({e}); serving rule-based predictions only.")
+                else:
+                    logger.error(f"Model reload failed, still serving {self.model.version}: {e}")
+                return self._result('failed', error=self.last_error)
+
+            previous = self.model
+            self.model = model
+            self.signature = signature
+            self.loaded_at = datetime.now().isoformat()
+            self.last_error = None
+            self._failed_signature = None
+            status = 'loaded' if previous is None else 'reloaded'
+            if previous is not None:
+                self.reloads += 1
+            MODEL_RELOADS.labels(status).inc()
+            logger.info(f"{status.capitalize()} {model.name} risk model {model.version} ({model.bundle or 'pkl'}) "
+                        f"from {self.model_dir} in {model.load_seconds:.3f}s")
+            return self._result(status, previous_version=previous.version if previous else None)
+
+    def _result(self, status, **extra):
+        model = self.model
+        return dict(status=status, model_version=model.version if model else None,
+                    bundle=model.bundle if model else None,
+                    load_seconds=model.load_seconds if model else None, **extra)
+
+    # --- Watcher ---
+
+    def start(self):
+        """Starts the polling thread (no-op when the interval is 0 or it already runs)."""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        if self._thread is None:
+            # Threads do not survive fork (e.g. gunicorn --preload); restart in each worker
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='model-reloader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Model watcher error: {e}")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        if self._thread is not None and not self._stop.is_set():
+            self._thread = threading.Thread(target=self._watch, name='model-reloader', daemon=True)
+            self._thread.start()
+
+    def info(self):
+        return {
+            'watching': self._thread is not None and self._thread.is_alive(),
+            'interval_seconds': self.interval,
+            'loaded_at': self.loaded_at,
+            'last_checked': self.last_checked,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,242 @@
+"""
+CareOClock Predictive Engine - Budgeted Model Search
+Description: Successive-halving hyperparameter search for the RandomForest and
+             XGBoost risk models under a wall-clock budget. Random candidates
+             are scored on growing stratified subsets of cached CV folds, and
+             only the best 1/eta advance to the next rung. XGBoost fits stop
+             early on a slice held out from each training fold. Both searches
+             run at the same time, each on its own share of the CPU cores, so
+             neither oversubscribes the machine.
+"""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold
+
+SEARCH_BUDGET_SECONDS = float(os.environ.get('SEARCH_BUDGET_SECONDS', 600))
+
+RF_SPACE = {
+    'n_estimators': [100, 200, 300],
+    'max_depth': [10, 20, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 0.5],
+}
+XGB_SPACE = {
+    'max_depth': [3, 4, 6, 8, 10],
+    'learning_rate': [0.03, 0.05, 0.1, 0.2, 0.3],
+    'subsample': [0.7, 0.85, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'min_child_weight': [1, 3, 5],
+}
+# Upper bound on boosting rounds; early stopping picks the actual count
+XGB_MAX_ROUNDS = 1000
+XGB_EARLY_STOPPING_ROUNDS = 30
+# Share of each training fold held out to decide when to stop boosting
+EARLY_STOPPING_FRACTION = 0.1
+
+
+def sample_candidates(space, n, rng):
+    """n distinct random parameter combinations (fewer if the space is smaller)."""
+    size = math.prod(len(values) for values in space.values())
+    seen, candidates = set(), []
+    while len(candidates) < min(n, size):
+        params = {name: values[rng.integers(len(values))] for name, values in space.items()}
+        key = tuple(sorted(params.items(), key=lambda item: item[0]))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+class FoldCache:
+    """
+    Stratified CV folds split once and shared by every candidate. Rung subsets
+    are prefixes of a fixed per-fold stratified order, so a candidate promoted
+    to a larger rung sees a superset of its earlier rows; the sliced arrays
+    are built once per (fold, size) and reused.
+    """
+
+    def __init__(self, X, y, n_folds=3, random_state=42):
+        self.X, self.y = X, y
+        self.n_classes = len(np.unique(y))
+        rng = np.random.default_rng(random_state)
+        self.folds = []
+        for train, val in StratifiedKFold(n_folds, shuffle=True, random_state=random_state).split(X, y):
+            self.folds.append((self._interleave(train, y, rng), val))
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _interleave(idx, y, rng):
+        """Row order in which every prefix keeps the class proportions."""
+        idx = rng.permutation(idx)
+        labels = y[idx]
+        rank = np.empty(len(idx))
+        for label in np.unique(labels):
+            members = np.flatnonzero(labels == label)
+            rank[members] = (np.arange(len(members)) + 0.5) / len(members)
+        return idx[np.argsort(rank, kind='stable')]
+
+    @property
+    def max_resources(self):
+        return min(len(train) for train, _ in self.folds)
+
+    def get(self, fold, n_samples):
+        """
+        Arrays for one fold at n_samples training rows: (X, y) of all of them,
+        the fit and early-stopping parts of those rows, and the validation fold.
+        """
+        key = (fold, n_samples)
+        with self._lock:
+            arrays = self._arrays.get(key)
+            if arrays is None:
+                train, val = self.folds[fold]
+                rows = train[:n_samples]
+                # Every k-th row of the stratified order goes to the early-stopping slice
+                stop_every = max(2, round(1 / EARLY_STOPPING_FRACTION))
+                stop = rows[stop_every - 1::stop_every]
+                fit = np.setdiff1d(rows, stop, assume_unique=True)
+                arrays = (self.X[rows], self.y[rows], self.X[fit], self.y[fit], self.X[stop], self.y[stop],
+                          self.X[val], self.y[val])
+                self._arrays[key] = arrays
+        return arrays
+
+
+def fit_random_forest(params, X, y, n_jobs, random_state=42):
+    return RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, **params).fit(X, y)
+
+
+def fit_xgboost(params, X, y, X_stop, y_stop, n_jobs, random_state=42):
+    model = xgb.XGBClassifier(n_estimators=XGB_MAX_ROUNDS, early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS,
+                              eval_metric='mlogloss', random_state=random_state, n_jobs=n_jobs, **params)
+    return model.fit(X, y, eval_set=[(X_stop, y_stop)], verbose=False)
+
+
+class SuccessiveHalving:
+    """
+    Runs one model family's search. Rung r trains on min_resources * eta**r
+    rows of each fold and gets an equal share of the remaining time; a rung
+    that runs out ranks only the candidates it scored. The winner is the best
+    candidate of the largest rung reached.
+    """
+
+    def __init__(self, kind, folds, n_candidates, eta, n_jobs, rng):
+        self.kind = kind
+        self.folds = folds
+        self.candidates = sample_candidates(RF_SPACE if kind == 'RandomForest' else XGB_SPACE, n_candidates, rng)
+        self.eta = eta
+        self.n_jobs = n_jobs
+        self.fits = 0
+        self.rungs = []
+
+    def _score(self, params, n_samples):
+        scores, rounds = [], []
+        for fold in range(len(self.folds.folds)):
+            X_all, y_all, X_fit, y_fit, X_stop, y_stop, X_val, y_val = self.folds.get(fold, n_samples)
+            if self.kind == 'RandomForest':
+                model = fit_random_forest(params, X_all, y_all, self.n_jobs)
+            else:
+                model = fit_xgboost(params, X_fit, y_fit, X_stop, y_stop, self.n_jobs)
+                rounds.append(model.best_iteration + 1)
+            self.fits += 1
+            scores.append(float(np.mean(model.predict(X_val) == y_val)))
+        return float(np.mean(scores)), (int(np.median(rounds)) if rounds else None)
+
+    def resource_schedule(self):
+        max_resources = self.folds.max_resources
+        n_rungs = 1 + int(math.log(max(len(self.candidates), 1), self.eta))
+        min_resources = max(max_resources // self.eta ** (n_rungs - 1), 30 * self.folds.n_classes)
+        return [min(max_resources, min_resources * self.eta ** r) for r in range(n_rungs)]
+
+    def run(self, deadline):
+        survivors = list(range(len(self.candidates)))
+        schedule = self.resource_schedule()
+        for rung, n_samples in enumerate(schedule):
+            # Each rung costs about the same, so each gets an equal share of what is left
+            rung_deadline = time.monotonic() + (deadline - time.monotonic()) / (len(schedule) - rung)
+            results = []
+            for i in survivors:
+                # Always score at least one candidate so there is a result
+                if results and time.monotonic() >= rung_deadline:
+                    break
+                score, rounds = self._score(self.candidates[i], n_samples)
+                results.append({'candidate': i, 'score': score, 'rounds': rounds})
+            results.sort(key=lambda r: -r['score'])
+            self.rungs.append({'n_samples': n_samples, 'results': results})
+            if time.monotonic() >= deadline or len(results) <= 1:
+                break
+            survivors = [r['candidate'] for r in results[:max(1, len(results) // self.eta)]]
+
+        best = self.rungs[-1]['results'][0]
+        params = dict(self.candidates[best['candidate']])
+        return params, best
+
+    def summary(self, params, best):
+        return {
+            'best_params': params,
+            'cv_accuracy': best['score'],
+            'boosting_rounds': best['rounds'],
+            'rungs': [{'n_samples': rung['n_samples'], 'evaluated': len(rung['results'])} for rung in self.rungs],
+            'candidates': len(self.candidates),
+            'fits': self.fits,
+            'n_jobs': self.n_jobs,
+        }
+
+
+def split_cores(n_cores=None):
+    """Cores for the (RandomForest, XGBoost) searches; RF trees parallelize better, so it gets the odd one."""
+    n_cores = n_cores or os.cpu_count() or 1
+    if n_cores == 1:
+        return 1, 1
+    return n_cores - n_cores // 2, n_cores // 2
+
+
+def search_models(X_train, y_train, budget_seconds=SEARCH_BUDGET_SECONDS, n_candidates=16, eta=3, n_folds=3,
+                  n_cores=None, random_state=42):
+    """
+    Searches both model families at once and refits each winner on all of
+    X_train (XGBoost with the boosting rounds its folds stopped at).
+    Returns (rf_model, xgb_model, report dict). The budget covers the search;
+    the two final refits come on top of it.
+    """
+    start = time.monotonic()
+    folds = FoldCache(X_train, y_train, n_folds=n_folds, random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    n_cores = n_cores or os.cpu_count() or 1
+    rf_jobs, xgb_jobs = split_cores(n_cores)
+    searches = [
+        SuccessiveHalving('RandomForest', folds, n_candidates, eta, rf_jobs, rng),
+        SuccessiveHalving('XGBoost', folds, n_candidates, eta, xgb_jobs, rng),
+    ]
+    if n_cores > 1:
+        # One thread per family on its own cores; the libraries release the GIL while fitting
+        deadline = start + budget_seconds
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            outcomes = list(pool.map(lambda search: search.run(deadline), searches))
+    else:
+        # A single core runs them back to back; XGBoost inherits any time RF leaves over
+        outcomes = [searches[0].run(start + budget_seconds / 2), searches[1].run(start + budget_seconds)]
+    search_seconds = time.monotonic() - start
+
+    (rf_params, rf_best), (xgb_params, xgb_best) = outcomes
+    rf_model = fit_random_forest(rf_params, X_train, y_train, n_jobs=n_cores)
+    xgb_model = xgb.XGBClassifier(n_estimators=xgb_best['rounds'], eval_metric='mlogloss', random_state=random_state,
+                                  n_jobs=n_cores, **xgb_params).fit(X_train, y_train)
+
+    report = {
+        'budget_seconds': budget_seconds,
+        'search_seconds': search_seconds,
+        'total_seconds': time.monotonic() - start,
+        'cores': {'RandomForest': rf_jobs, 'XGBoost': xgb_jobs},
+        'RandomForest': searches[0].summary(rf_params, rf_best),
+        'XGBoost': searches[1].summary(xgb_params, xgb_best),
+    }
+    return rf_model, xgb_model, report
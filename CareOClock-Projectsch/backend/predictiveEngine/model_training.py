@@ -4,80 +4,75 @@ Author: AI Assistant
 Description: Trains RandomForest and XGBoost models for health risk prediction
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split, GridSearchCV
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import LabelEncoder
 import xgboost as xgb
-import pickle
-import joblib
-from datetime import datetime
-import pymongo
+from datetime import datetime, timezone
+import os
+from bson import ObjectId
+from mongo_client import HISTORY_READ_PREFERENCE, LazyMongoClient
+from training_data import (ids_up_to, load_training_columns, read_records_after, recent_ids,
+                           training_frame)
+from model_update import (RF_EXTRA_TREES, XGB_EXTRA_ROUNDS, continue_boosting, extend_random_forest,
+                          next_version, rescale_thresholds)
+from model_search import search_models, SEARCH_BUDGET_SECONDS
+from feature_transformer import FeatureTransformer, risk_label_codes, risk_labels, RISK_LEVELS
+from synthetic_data import generate_training_sample
+from model_bundle import MODEL_BUNDLE_DIR, current_bundle, load_bundle, load_legacy, measure_cold_load, save_bundle
 import warnings
 warnings.filterwarnings('ignore')
 
+# Local columnar copy of the training records; '' disables it
+TRAINING_SNAPSHOT_DIR = os.environ.get('TRAINING_SNAPSHOT_DIR', 'training_snapshot')
+
 
 class HealthRiskPredictor:
-    def __init__(self, mongodb_uri=''):
-        self.client = pymongo.MongoClient(mongodb_uri)
-        self.db = self.client['careoclock']  # Use your DB name
-        self.scaler = StandardScaler()
+    def __init__(self, mongodb_uri=None):
+        # Same database as the prediction service when MONGODB_URI /
+        # MONGODB_DATABASE name one, else 'careoclock' as before; training
+        # reads may go to a secondary
+        self.mongo = LazyMongoClient(mongodb_uri, default_database='careoclock')
+        self.records_collection = self.mongo.lazy_collection('healthrecords', HISTORY_READ_PREFERENCE)
+        self.feature_transformer = FeatureTransformer()
+        self.scaler = self.feature_transformer.scaler
         self.label_encoder = LabelEncoder()
         self.rf_model = None
         self.xgb_model = None
         self.feature_names = None
         self.best_model = None
         self.best_model_name = None
-
-    def load_data_from_mongodb(self):
+        self.model_version = '1.0'
+        self.incremental_updates = 0
+        # Newest healthrecords _id the models have seen (MongoDB training only)
+        self.data_high_water_mark = None
+        # Ids just before the mark, so the next incremental read can overlap it
+        self.data_recent_ids = None
+        self.metadata = {}
+
+    def load_data_from_mongodb(self, snapshot_dir=TRAINING_SNAPSHOT_DIR, full_reload=False):
         """
-        Load health data from MongoDB (adapted for your existing HealthRecord structure)
+        Load health data from MongoDB (adapted for your existing HealthRecord structure).
+        Records are read in projected cursor batches into NumPy columns and kept
+        in a local snapshot (see training_data.py), so repeat runs only fetch
+        records added since the previous one.
         """
         try:
-            cursor = self.db.healthrecords.find({})
-            data_list = []
-
-            for doc in cursor:
-                heart_rate = doc.get('heartRate', {}).get('value')
-                bp_systolic = doc.get('bloodPressure', {}).get('systolic')
-                bp_diastolic = doc.get('bloodPressure', {}).get('diastolic')
-                glucose = doc.get('bloodSugar', {}).get('value')
-                sleep_hours = doc.get('sleepHours', {}).get('value', 7)
-                temperature = doc.get('temperature', {}).get('value', 98.6)
-                oxygen_level = doc.get('oxygenLevel', {}).get('value', 98)
-                weight = doc.get('weight', {}).get('value', 70)
-                activity_level = doc.get('activityLevel', 5)
-                stress_level = doc.get('stressLevel', 5)
-                mood_rating = doc.get('moodRating', 5)
-                energy_level = doc.get('energyLevel', 5)
-                pain_level = doc.get('painLevel', 0)
-
-                if (heart_rate is not None and bp_systolic is not None 
-                    and bp_diastolic is not None and glucose is not None):
-                    data_list.append({
-                        'heart_rate': heart_rate,
-                        'bp_systolic': bp_systolic,
-                        'bp_diastolic': bp_diastolic,
-                        'glucose': glucose,
-                        'sleep_hours': sleep_hours,
-                        'temperature': temperature,
-                        'oxygen_level': oxygen_level,
-                        'weight': weight,
-                        'activity_level': activity_level,
-                        'stress_level': stress_level,
-                        'mood_rating': mood_rating,
-                        'energy_level': energy_level,
-                        'pain_level': pain_level,
-                        'age': 65,  # Placeholder for age
-                        'risk_level': self._calculate_risk_label(doc)
-                    })
-
-            if not data_list:
+            columns, stats = load_training_columns(self.records_collection, snapshot_dir=snapshot_dir,
+                                                   full=full_reload)
+            print(f"Training records: {stats['snapshot_rows']} from snapshot, "
+                  f"{stats['new_rows']} new from MongoDB")
+
+            if not len(columns['_id']):
                 print("No real data found. Generating sample training data...")
                 return self._generate_sample_data()
 
-            df = pd.DataFrame(data_list)
+            df = training_frame(columns)
+            self.data_high_water_mark = ObjectId(columns['_id'][-1:].tobytes())
+            self.data_recent_ids = recent_ids(columns['_id'], self.data_high_water_mark)
 
             print("Risk level distribution:\n", df['risk_level'].value_counts())
 
@@ -87,6 +82,35 @@ class HealthRiskPredictor:
             print(f"Error loading data from MongoDB: {e}")
             return self._generate_sample_data()
 
+    def load_new_records_from_mongodb(self):
+        """
+        Records added since the saved models were trained: past the stored
+        data_high_water_mark, or created after the training timestamp for
+        models trained from CSV. The read overlaps the mark by HWM_OVERLAP and
+        skips the data_recent_ids already trained on (for models saved without
+        them, every record up to the mark). Returns None when there are none.
+        """
+        mark = self.metadata.get('data_high_water_mark')
+        if mark:
+            after = ObjectId(mark)
+            seen = self.metadata.get('data_recent_ids')
+            if seen is None:
+                seen = ids_up_to(self.records_collection, after)
+        else:
+            trained_at = datetime.fromisoformat(self.metadata['timestamp']).astimezone(timezone.utc)
+            after = ObjectId.from_datetime(trained_at)
+            seen = []
+        columns, last_id = read_records_after(self.records_collection, after, seen)
+        print(f"Found {len(columns['_id'])} new training records after {after}")
+        if last_id is not None:
+            self.data_high_water_mark = max(last_id, after)
+            self.data_recent_ids = recent_ids(columns['_id'], self.data_high_water_mark, seen)
+        if not len(columns['_id']):
+            return None
+        df = training_frame(columns)
+        print("Risk level distribution:\n", df['risk_level'].value_counts())
+        return df
+
     def load_data_from_csv(self, csv_path='balanced_health_data.csv'):
         try:
             df = pd.read_csv(csv_path)
@@ -98,118 +122,53 @@ class HealthRiskPredictor:
             return None
 
     def _calculate_risk_label(self, doc):
-        risk_factors = 0
-
-        hr = doc.get('heartRate', {}).get('value', 70)
-        if hr > 100 or hr < 60:
-            risk_factors += 1
-
+        # Single-document form of the rule the loader applies per column chunk
         bp = doc.get('bloodPressure', {})
-        if bp.get('systolic', 120) > 140 or bp.get('diastolic', 80) > 90:
-            risk_factors += 1
-
-        glucose = doc.get('bloodSugar', {}).get('value', 100)
-        if glucose > 140:
-            risk_factors += 1
-
-        sleep_hours = doc.get('sleepHours', {}).get('value', 7)
-        if sleep_hours < 6:
-            risk_factors += 1
-
-        age = doc.get('age', 65)
-        if age > 65:
-            risk_factors += 1
-
-        if risk_factors >= 3:
-            return 'High'
-        elif risk_factors >= 2:
-            return 'Medium'
-        else:
-            return 'Low'
+        code = risk_label_codes(doc.get('heartRate', {}).get('value', 70), bp.get('systolic', 120),
+                                bp.get('diastolic', 80), doc.get('bloodSugar', {}).get('value', 100),
+                                doc.get('sleepHours', {}).get('value', 7), doc.get('age', 65))
+        return RISK_LEVELS[int(code)]
 
     def _generate_sample_data(self, n_samples=1000):
+        # Seeds the global generator, as this always has: preprocessing's BMI
+        # placeholder draws continue from it
         np.random.seed(42)
-        data = {
-            'heart_rate': np.random.normal(75, 15, n_samples),
-            'bp_systolic': np.random.normal(120, 20, n_samples),
-            'bp_diastolic': np.random.normal(80, 10, n_samples),
-            'glucose': np.random.normal(100, 25, n_samples),
-            'sleep_hours': np.random.normal(7, 1.5, n_samples),
-            'temperature': np.random.normal(98.6, 0.8, n_samples),
-            'oxygen_level': np.random.normal(98, 2, n_samples),
-            'age': np.random.randint(20, 90, n_samples)
-        }
-        df = pd.DataFrame(data)
-
-        def get_risk_level(row):
-            score = 0
-            if row['heart_rate'] > 100 or row['heart_rate'] < 60:
-                score += 1
-            if row['bp_systolic'] > 140 or row['bp_diastolic'] > 90:
-                score += 1
-            if row['glucose'] > 140:
-                score += 1
-            if row['sleep_hours'] < 6:
-                score += 1
-            if row['age'] > 65:
-                score += 0.5
-            if score >= 3:
-                return 'High'
-            elif score >= 1.5:
-                return 'Medium'
-            else:
-                return 'Low'
-
-        df['risk_level'] = df.apply(get_risk_level, axis=1)
+        columns = generate_training_sample(n_samples, rng=np.random)
+        df = pd.DataFrame({name: values for name, values in columns.items() if name != 'risk_level'})
+        df['risk_level'] = risk_labels(columns['risk_level'])
         print("Sample data risk distribution:\n", df['risk_level'].value_counts())
         return df
 
     def preprocess_data(self, df):
-        df = df.fillna(df.mean(numeric_only=True))
-        df['bp_ratio'] = df['bp_systolic'] / df['bp_diastolic'].replace(0, 1)
-        df['bmi_estimate'] = np.random.normal(25, 5, len(df))  # Placeholder
+        # Shared with serving (model_inference.RiskModel), see feature_transformer.py
+        self.feature_transformer = FeatureTransformer()
+        X_scaled = self.feature_transformer.fit_transform(df)
+        self.scaler = self.feature_transformer.scaler
+        self.feature_names = self.feature_transformer.feature_names
 
-        def hr_category(hr):
-            if hr < 60:
-                return 0
-            elif hr <= 100:
-                return 1
-            else:
-                return 2
-
-        df['heart_rate_category'] = df['heart_rate'].apply(hr_category)
-
-        feature_columns = ['heart_rate', 'bp_systolic', 'bp_diastolic', 'glucose',
-                           'sleep_hours', 'temperature', 'oxygen_level', 'age',
-                           'bp_ratio', 'bmi_estimate', 'heart_rate_category']
-
-        X = df[feature_columns]
-        y = df['risk_level']
-
-        self.feature_names = feature_columns
-
-        y_encoded = self.label_encoder.fit_transform(y)
+        y_encoded = self.label_encoder.fit_transform(df['risk_level'])
         print("Encoded classes:", list(self.label_encoder.classes_))
-        X_scaled = self.scaler.fit_transform(X)
 
         return X_scaled, y_encoded
 
-    def train_models(self, X, y):
+    def train_models(self, X, y, search='grid', budget_seconds=SEARCH_BUDGET_SECONDS):
+        """
+        search='grid' runs the fixed GridSearchCV sweeps; search='halving' runs
+        the budgeted successive-halving search in model_search.py.
+        """
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-        print("Training Random Forest...")
-        rf_params = {'n_estimators': [100], 'max_depth': [10, None], 'min_samples_split': [2, 5]}
-        self.rf_model = RandomForestClassifier(random_state=42)
-        rf_grid = GridSearchCV(self.rf_model, rf_params, cv=3, scoring='accuracy', n_jobs=-1)
-        rf_grid.fit(X_train, y_train)
-        self.rf_model = rf_grid.best_estimator_
-
-        print("Training XGBoost...")
-        xgb_params = {'n_estimators': [100], 'max_depth': [6, 10], 'learning_rate': [0.1]}
-        self.xgb_model = xgb.XGBClassifier(random_state=42, use_label_encoder=False, eval_metric='mlogloss')
-        xgb_grid = GridSearchCV(self.xgb_model, xgb_params, cv=3, scoring='accuracy', n_jobs=-1)
-        xgb_grid.fit(X_train, y_train)
-        self.xgb_model = xgb_grid.best_estimator_
+        search_report = None
+        if search == 'halving':
+            print(f"Searching Random Forest and XGBoost (successive halving, {budget_seconds:g}s budget)...")
+            self.rf_model, self.xgb_model, search_report = search_models(X_train, y_train, budget_seconds)
+            for name in ('RandomForest', 'XGBoost'):
+                print(f"{name}: CV accuracy {search_report[name]['cv_accuracy']:.4f} "
+                      f"with {search_report[name]['best_params']}")
+            print(f"Search took {search_report['search_seconds']:.1f}s "
+                  f"({search_report['total_seconds']:.1f}s with the final refits)")
+        else:
+            self._grid_search(X_train, y_train)
 
         rf_score = self.rf_model.score(X_test, y_test)
         xgb_score = self.xgb_model.score(X_test, y_test)
@@ -226,40 +185,155 @@ class HealthRiskPredictor:
 
         print(f"Selected Best Model: {self.best_model_name}")
 
-        return {'rf_accuracy': rf_score, 'xgb_accuracy': xgb_score, 'best_model': self.best_model_name}
+        results = {'rf_accuracy': rf_score, 'xgb_accuracy': xgb_score, 'best_model': self.best_model_name}
+        if search_report:
+            results['search'] = search_report
+        return results
 
-    def save_models(self, save_path='./'):
-        try:
-            joblib.dump(self.rf_model, f'{save_path}random_forest_model.pkl')
-            joblib.dump(self.xgb_model, f'{save_path}xgboost_model.pkl')
-            joblib.dump(self.best_model, f'{save_path}best_model.pkl')
+    def _grid_search(self, X_train, y_train):
+        print("Training Random Forest...")
+        rf_params = {'n_estimators': [100], 'max_depth': [10, None], 'min_samples_split': [2, 5]}
+        self.rf_model = RandomForestClassifier(random_state=42)
+        rf_grid = GridSearchCV(self.rf_model, rf_params, cv=3, scoring='accuracy', n_jobs=-1)
+        rf_grid.fit(X_train, y_train)
+        self.rf_model = rf_grid.best_estimator_
 
-            joblib.dump(self.scaler, f'{save_path}scaler.pkl')
-            joblib.dump(self.label_encoder, f'{save_path}label_encoder.pkl')
+        print("Training XGBoost...")
+        xgb_params = {'n_estimators': [100], 'max_depth': [6, 10], 'learning_rate': [0.1]}
+        self.xgb_model = xgb.XGBClassifier(random_state=42, use_label_encoder=False, eval_metric='mlogloss')
+        xgb_grid = GridSearchCV(self.xgb_model, xgb_params, cv=3, scoring='accuracy', n_jobs=-1)
+        xgb_grid.fit(X_train, y_train)
+        self.xgb_model = xgb_grid.best_estimator_
 
-            with open(f'{save_path}feature_names.pkl', 'wb') as f:
-                pickle.dump(self.feature_names, f)
+    def load_saved_models(self, save_path='./'):
+        """Loads the current model bundle (or the older .pkl files) to be extended by update_models."""
+        bundle = current_bundle(os.path.join(save_path, MODEL_BUNDLE_DIR))
+        artifacts = load_bundle(bundle) if bundle else load_legacy(save_path)
+        self.metadata = artifacts['manifest']
+        self.rf_model = artifacts['models']['RandomForest']
+        self.xgb_model = artifacts['models']['XGBoost']
+        self.label_encoder = artifacts['label_encoder']
+        self.feature_transformer = artifacts['transformer']
+        self.feature_names = self.feature_transformer.feature_names
+        self.scaler = self.feature_transformer.scaler
+        self.best_model_name = self.metadata.get('best_model', 'RandomForest')
+        self.best_model = self.xgb_model if self.best_model_name == 'XGBoost' else self.rf_model
+        self.model_version = self.metadata.get('model_version', '1.0')
+        self.incremental_updates = self.metadata.get('incremental_updates', 0)
+        mark = self.metadata.get('data_high_water_mark')
+        self.data_high_water_mark = ObjectId(mark) if mark else None
+        self.data_recent_ids = self.metadata.get('data_recent_ids')
+
+    def update_models(self, df, extra_trees=RF_EXTRA_TREES, extra_rounds=XGB_EXTRA_ROUNDS):
+        """
+        Extends the loaded models with new records: the scaler statistics are
+        updated, the existing trees' thresholds follow the new scaling, the
+        RandomForest gets `extra_trees` trees fitted on the new rows and
+        XGBoost `extra_rounds` more boosting rounds. Bumps model_version.
+        """
+        transformer = self.feature_transformer
+        y = self.label_encoder.transform(df['risk_level'])
+        n_classes = len(self.label_encoder.classes_)
+
+        # Accuracy on the new rows before the models learn from them
+        X_before = transformer.transform(transformer.raw_matrix(df))
+        rf_before = self.rf_model.score(X_before, y)
+        xgb_before = self.xgb_model.score(X_before, y)
+
+        old_mean, old_scale = transformer.mean.copy(), transformer.scale.copy()
+        X = transformer.partial_fit_transform(df)
+        for model in (self.rf_model, self.xgb_model):
+            rescale_thresholds(model, old_mean, old_scale, transformer.mean, transformer.scale)
+
+        print(f"Adding {extra_trees} trees to Random Forest...")
+        extend_random_forest(self.rf_model, X, y, n_classes, extra_trees)
+        print(f"Continuing XGBoost for {extra_rounds} rounds...")
+        continue_boosting(self.xgb_model, X, y, n_classes, extra_rounds)
+
+        previous_version = self.model_version
+        self.model_version = next_version(previous_version)
+        self.incremental_updates += 1
+        print(f"Model version {previous_version} -> {self.model_version}")
+
+        return {
+            'new_records': len(df),
+            'rf_accuracy_before_update': rf_before,
+            'xgb_accuracy_before_update': xgb_before,
+            'rf_trees': len(self.rf_model.estimators_),
+            'xgb_rounds': self.xgb_model.get_booster().num_boosted_rounds(),
+            'scaler_samples_seen': int(transformer.scaler.n_samples_seen_),
+            'model_version': self.model_version,
+            'best_model': self.best_model_name
+        }
 
+    def save_models(self, save_path='./'):
+        """
+        Writes both models and their preprocessing as one versioned bundle
+        (see model_bundle.py) and times loading it in a fresh process.
+        Returns {'bundle', 'path', 'content_hash', 'cold_load'}.
+        """
+        try:
             metadata = {
                 'timestamp': datetime.now().isoformat(),
                 'best_model': self.best_model_name,
                 'feature_names': self.feature_names,
-                'model_version': '1.0'
+                'model_version': self.model_version,
+                'incremental_updates': self.incremental_updates,
+                'data_high_water_mark': str(self.data_high_water_mark) if self.data_high_water_mark else None,
+                'data_recent_ids': self.data_recent_ids
             }
-
-            with open(f'{save_path}model_metadata.pkl', 'wb') as f:
-                pickle.dump(metadata, f)
-
-            print(f"Models saved successfully to {save_path}")
+            path, manifest = save_bundle(os.path.join(save_path, MODEL_BUNDLE_DIR),
+                                         {'RandomForest': self.rf_model, 'XGBoost': self.xgb_model},
+                                         self.feature_transformer, self.label_encoder, metadata)
+            size_mb = sum(entry['bytes'] for entry in manifest['files'].values()) / 2**20
+            print(f"Models saved successfully to {path} ({size_mb:.1f} MB, "
+                  f"content hash {manifest['content_hash'][:12]})")
+
+            cold_load = measure_cold_load(path)
+            print(f"Cold load of {cold_load['model']}: {cold_load['load_seconds'] * 1000:.1f} ms "
+                  f"(+{cold_load['import_seconds'] * 1000:.0f} ms imports, "
+                  f"peak RSS {cold_load['max_rss_mb']:.0f} MB)")
+            return {'bundle': manifest['bundle'], 'path': path, 'content_hash': manifest['content_hash'],
+                    'cold_load': cold_load}
         except Exception as e:
             print(f"Error saving models: {e}")
+            return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the CareOClock risk models")
+    parser.add_argument('--search', choices=('grid', 'halving'), default='grid',
+                        help="fixed grid search, or budgeted successive halving")
+    parser.add_argument('--budget-seconds', type=float, default=SEARCH_BUDGET_SECONDS,
+                        help="wall-clock budget for --search halving")
+    parser.add_argument('--incremental', action='store_true',
+                        help="extend the saved models with MongoDB records added since they were trained")
+    parser.add_argument('--extra-trees', type=int, default=RF_EXTRA_TREES)
+    parser.add_argument('--extra-rounds', type=int, default=XGB_EXTRA_ROUNDS)
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
     print("Starting CareOClock Predictive Analytics Training...")
 
     predictor = HealthRiskPredictor()
 
+    if args.incremental:
+        predictor.load_saved_models()
+        print(f"Loaded model version {predictor.model_version} trained at {predictor.metadata.get('timestamp')}")
+        df = predictor.load_new_records_from_mongodb()
+        if df is None:
+            print("No new records since the last training. Nothing to do.")
+            return
+        print("Updating models...")
+        results = predictor.update_models(df, args.extra_trees, args.extra_rounds)
+        print("Saving models...")
+        results['model_bundle'] = predictor.save_models()
+        print("Incremental update completed successfully!")
+        print("Results:", results)
+        return
+
     # To load data from CSV, uncomment next line and comment MongoDB load line
     df = predictor.load_data_from_csv()  # Load from CSV
 
@@ -273,10 +347,10 @@ def main():
     X, y = predictor.preprocess_data(df)
 
     print("Training models...")
-    results = predictor.train_models(X, y)
+    results = predictor.train_models(X, y, search=args.search, budget_seconds=args.budget_seconds)
 
     print("Saving models...")
-    predictor.save_models()
+    results['model_bundle'] = predictor.save_models()
 
     print("Training completed successfully!")
     print("Results:", results)
@@ -0,0 +1,112 @@
+"""
+CareOClock Predictive Engine - Incremental Model Updates
+Description: Helpers for extending the saved models with new records instead
+             of retraining from scratch: the RandomForest grows extra trees
+             (warm start) and XGBoost keeps boosting from its saved booster.
+             Refitting the scaler shifts every scaled feature, so the split
+             thresholds of the existing trees are first moved into the new
+             scaled space. Each remapped threshold is nudged by a small
+             relative margin toward the branch that takes ties, so float32
+             rounding of the newly scaled features does not send a row on
+             the threshold down the other one.
+"""
+
+import json
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+RF_EXTRA_TREES = 20
+XGB_EXTRA_ROUNDS = 50
+# Relative margin for moved thresholds; float32 rounding is ~6e-8
+_TIE_MARGIN = 1e-6
+
+
+def _remap(features, thresholds, old_mean, old_scale, new_mean, new_scale):
+    raw = thresholds * old_scale[features] + old_mean[features]
+    return (raw - new_mean[features]) / new_scale[features]
+
+
+def rescale_forest_thresholds(forest, old_mean, old_scale, new_mean, new_scale):
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        split = tree.feature >= 0
+        remapped = _remap(tree.feature[split], tree.threshold[split], old_mean, old_scale, new_mean, new_scale)
+        # sklearn compares the float32 features with x <= t, so a row on the
+        # threshold goes left; sit just above the remapped value so float32
+        # rounding of the newly scaled row cannot send it right.
+        # tree_.threshold is a writable view of the fitted tree's node array
+        tree.threshold[split] = remapped + _TIE_MARGIN * np.maximum(1.0, np.abs(remapped))
+
+
+def rescale_booster_thresholds(xgb_model, old_mean, old_scale, new_mean, new_scale):
+    booster = xgb_model.get_booster()
+    config = json.loads(booster.save_raw('json'))
+    for tree in config['learner']['gradient_booster']['model']['trees']:
+        left = np.asarray(tree['left_children'])
+        # Leaves keep their output value in split_conditions
+        split = left != -1
+        conditions = np.asarray(tree['split_conditions'], dtype=float)
+        features = np.asarray(tree['split_indices'])[split]
+        remapped = _remap(features, conditions[split], old_mean, old_scale, new_mean, new_scale)
+        # XGBoost splits on x < t with t a training value, so rows at the
+        # threshold go right; keep them there despite float32 rounding by
+        # sitting just below the remapped value (far closer than data spacing)
+        conditions[split] = remapped - _TIE_MARGIN * np.maximum(1.0, np.abs(remapped))
+        tree['split_conditions'] = conditions.astype(np.float32).tolist()
+    booster.load_model(bytearray(json.dumps(config).encode()))
+
+
+def rescale_thresholds(model, old_mean, old_scale, new_mean, new_scale):
+    """Moves a fitted model's split thresholds from one standard scaling to another, in place."""
+    args = [np.asarray(a, dtype=float) for a in (old_mean, old_scale, new_mean, new_scale)]
+    if isinstance(model, RandomForestClassifier):
+        rescale_forest_thresholds(model, *args)
+    elif hasattr(model, 'get_booster'):
+        rescale_booster_thresholds(model, *args)
+    else:
+        raise TypeError(f"Cannot rescale thresholds of {type(model).__name__}")
+
+
+def pad_missing_classes(X, y, n_classes):
+    """
+    Both libraries take the class set from the labels of the fit call; a
+    batch missing a class gets one zero-weight row for it, so the model keeps
+    all outputs while the row itself has no influence.
+    Returns (X, y, sample_weight).
+    """
+    missing = np.setdiff1d(np.arange(n_classes), y)
+    weights = np.ones(len(y))
+    if len(missing):
+        X = np.vstack([X, np.repeat(X[:1], len(missing), axis=0)])
+        y = np.concatenate([y, missing])
+        weights = np.concatenate([weights, np.zeros(len(missing))])
+    return X, y, weights
+
+
+def extend_random_forest(forest, X, y, n_classes, extra_trees=RF_EXTRA_TREES):
+    """Adds `extra_trees` trees fitted on the new rows (warm start); the existing trees are kept."""
+    X, y, weights = pad_missing_classes(X, y, n_classes)
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + extra_trees)
+    forest.fit(X, y, sample_weight=weights)
+    forest.set_params(warm_start=False)
+    return forest
+
+
+def continue_boosting(xgb_model, X, y, n_classes, extra_rounds=XGB_EXTRA_ROUNDS):
+    """Appends `extra_rounds` boosting rounds fitted on the new rows to the saved booster."""
+    X, y, weights = pad_missing_classes(X, y, n_classes)
+    booster = xgb_model.get_booster()
+    total_rounds = booster.num_boosted_rounds() + extra_rounds
+    xgb_model.set_params(n_estimators=extra_rounds)
+    xgb_model.fit(X, y, sample_weight=weights, xgb_model=booster, verbose=False)
+    xgb_model.set_params(n_estimators=total_rounds)
+    return xgb_model
+
+
+def next_version(version):
+    """'1.0' -> '1.1'; anything unparseable starts a fresh '<version>.1'."""
+    major, _, minor = str(version or '1.0').rpartition('.')
+    if major and minor.isdigit():
+        return f'{major}.{int(minor) + 1}'
+    return f'{version}.1'
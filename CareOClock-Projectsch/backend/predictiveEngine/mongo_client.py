@@ -0,0 +1,262 @@
+"""
+CareOClock Predictive Engine - MongoDB Client
+Description: One configured MongoClient per process, created on first use.
+             A MongoClient opened before gunicorn forks its workers (--preload)
+             is shared by all of them, with its monitor threads left behind in
+             the parent and its pooled sockets shared across processes.
+             LazyMongoClient only checks the URI up front and connects in the
+             process that first runs a query, so every worker gets its own
+             pool. Pool size, timeouts and read preferences come from the
+             environment, and the time spent waiting for a pooled connection
+             is recorded in careoclock_mongo_pool_wait_seconds.
+             A single fork hook drops the parent's clients in every child.
+
+Environment (unset means the MongoClient default):
+    MONGODB_URI                        connection string (same variable as the Node backend)
+    MONGODB_DATABASE                   database when neither the caller nor the URI names one
+                                       (default: the client's default_database, else test)
+    MONGO_MAX_POOL_SIZE                maxPoolSize, connections per worker process
+    MONGO_MIN_POOL_SIZE                minPoolSize
+    MONGO_MAX_IDLE_TIME_MS             maxIdleTimeMS
+    MONGO_WAIT_QUEUE_TIMEOUT_MS        waitQueueTimeoutMS, longest wait for a free connection
+    MONGO_CONNECT_TIMEOUT_MS           connectTimeoutMS
+    MONGO_SERVER_SELECTION_TIMEOUT_MS  serverSelectionTimeoutMS
+    MONGO_SOCKET_TIMEOUT_MS            socketTimeoutMS
+    MONGO_READ_PREFERENCE              readPreference for every other read (default: primary)
+    MONGO_HISTORY_READ_PREFERENCE      readPreference for history reads, e.g. secondaryPreferred
+"""
+
+import os
+import threading
+import weakref
+from time import perf_counter
+
+from pymongo import MongoClient, ReadPreference
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.uri_parser import parse_uri
+
+from metrics import Counter, Histogram
+
+MONGODB_URI = os.environ.get('MONGODB_URI', '')
+MONGODB_DATABASE = os.environ.get('MONGODB_DATABASE')
+DEFAULT_DATABASE = 'test'
+HISTORY_READ_PREFERENCE = os.environ.get('MONGO_HISTORY_READ_PREFERENCE') or None
+
+# (MongoClient option, environment variable, type)
+_CLIENT_OPTIONS = (
+    ('maxPoolSize', 'MONGO_MAX_POOL_SIZE', int),
+    ('minPoolSize', 'MONGO_MIN_POOL_SIZE', int),
+    ('maxIdleTimeMS', 'MONGO_MAX_IDLE_TIME_MS', int),
+    ('waitQueueTimeoutMS', 'MONGO_WAIT_QUEUE_TIMEOUT_MS', int),
+    ('connectTimeoutMS', 'MONGO_CONNECT_TIMEOUT_MS', int),
+    ('serverSelectionTimeoutMS', 'MONGO_SERVER_SELECTION_TIMEOUT_MS', int),
+    ('socketTimeoutMS', 'MONGO_SOCKET_TIMEOUT_MS', int),
+    ('readPreference', 'MONGO_READ_PREFERENCE', str),
+)
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+POOL_WAIT_SECONDS = Histogram('careoclock_mongo_pool_wait_seconds',
+                              'Time to check a connection out of the MongoDB pool.', ['outcome'])
+POOL_CONNECTIONS = Counter('careoclock_mongo_connections', 'MongoDB pool connections by event.', ['event'])
+
+
+def client_options(environ=None):
+    """MongoClient keyword arguments from the MONGO_* environment variables that are set."""
+    environ = os.environ if environ is None else environ
+    options = {option: cast(environ[variable]) for option, variable, cast in _CLIENT_OPTIONS
+               if environ.get(variable)}
+    if 'readPreference' in options and options['readPreference'] not in READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGO_READ_PREFERENCE {options['readPreference']!r}")
+    return options
+
+
+def database_name(uri, database=None, default=DEFAULT_DATABASE):
+    """`database` if given, else the one in the URI path, else MONGODB_DATABASE, else `default`. Validates the URI."""
+    return database or parse_uri(uri)['database'] or MONGODB_DATABASE or default
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """Connection pool listener: check-out waits, connections open and in use."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._waits = {outcome: POOL_WAIT_SECONDS.labels(outcome) for outcome in ('ok', 'failed')}
+        self._events = {event: POOL_CONNECTIONS.labels(event) for event in ('created', 'closed', 'cleared')}
+
+    def _waited(self, outcome):
+        started = getattr(self._local, 'started', None)
+        seconds = perf_counter() - started if started is not None else 0.0
+        self._local.started = None
+        self._waits[outcome].observe(seconds)
+        return seconds
+
+    def connection_check_out_started(self, event):
+        self._local.started = perf_counter()
+
+    def connection_checked_out(self, event):
+        seconds = self._waited('ok')
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def connection_check_out_failed(self, event):
+        self._waited('failed')
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        self._events['created'].inc()
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        self._events['closed'].inc()
+        with self._lock:
+            self.open -= 1
+
+    def pool_cleared(self, event):
+        self._events['cleared'].inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def info(self):
+        with self._lock:
+            return {
+                'connections_open': self.open,
+                'connections_in_use': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'mean_wait_seconds': self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+                'max_wait_seconds': self.max_wait_seconds,
+            }
+
+
+class LazyMongoClient:
+    """
+    A MongoClient for `uri` that is created in the process that first needs
+    it. The URI is validated at once (so a bad configuration still fails at
+    startup), nothing connects until the first query, and a forked child
+    drops the parent's client and opens its own. `default_database` is used
+    when neither `database`, the URI nor MONGODB_DATABASE names one.
+    """
+
+    def __init__(self, uri=None, database=None, options=None, default_database=DEFAULT_DATABASE):
+        self.uri = MONGODB_URI if uri is None else uri
+        self.database_name = database_name(self.uri, database, default_database)
+        self.options = client_options() if options is None else options
+        self._client = None
+        self._pid = None
+        self._collections = {}
+        self._monitor = None
+        self._lock = threading.Lock()
+        _clients.add(self)
+
+    @property
+    def client(self):
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._monitor = PoolMonitor()
+                self._collections = {}
+                self._client = MongoClient(self.uri, event_listeners=[self._monitor], **self.options)
+                self._pid = os.getpid()
+            return self._client
+
+    def collection(self, name, read_preference=None):
+        """`name` in this process's client, optionally with a read preference ('secondaryPreferred', ...)."""
+        key = (name, read_preference)
+        collection = self._collections.get(key)
+        if collection is None or self._pid != os.getpid():
+            database = self.client[self.database_name]
+            collection = database.get_collection(
+                name, read_preference=READ_PREFERENCES[read_preference] if read_preference else None)
+            self._collections[key] = collection
+        return collection
+
+    def lazy_collection(self, name, read_preference=None):
+        """A stand-in for collection(name) that resolves it on every use, in whichever process uses it."""
+        if read_preference and read_preference not in READ_PREFERENCES:
+            raise ValueError(f"Unknown read preference {read_preference!r}")
+        return LazyCollection(self, name, read_preference)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._collections = {}
+
+    def _after_fork(self):
+        # The parent's client and its sockets belong to the parent; never close them from here
+        self._lock = threading.Lock()
+        self._client = None
+        self._collections = {}
+
+    def info(self):
+        info = {
+            'database': self.database_name,
+            'options': dict(self.options),
+            'connected': self._client is not None and self._pid == os.getpid(),
+        }
+        if info['connected']:
+            info['pool'] = self._monitor.info()
+        return info
+
+
+# Every LazyMongoClient alive in this process, reset by one fork hook
+_clients = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for client in list(_clients):
+        client._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class LazyCollection:
+    """Forwards attribute access to LazyMongoClient.collection(name, read_preference)."""
+
+    def __init__(self, mongo, name, read_preference=None):
+        self._mongo = mongo
+        self.name = name
+        self.read_preference_name = read_preference
+
+    def __getattr__(self, attr):
+        return getattr(self._mongo.collection(self.name, self.read_preference_name), attr)
+
+    def __repr__(self):
+        return f'LazyCollection({self._mongo.database_name}.{self.name})'
@@ -1,12 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+import hmac
 import logging
-from pymongo import MongoClient
+import os
+import threading
+from time import perf_counter
 from bson import ObjectId
-from sklearn.linear_model import LinearRegression
+from safety_net import evaluate_history, evaluate_history_rows, evaluate_record
+from rolling_stats import RollingStatsCache, STAT_FEATURES
+from response_cache import ResponseCache, reading_hash
+from risk_index import LATEST_RISK_COLLECTION, RISK_LEVELS, LatestRiskIndex
+from history_query import HISTORY_PROJECTION, frame_from_cursor, summary_pipeline, WindowSummary
+from trend_engine import fit_trends
+from model_reloader import MODEL_RELOAD_INTERVAL_SECONDS, ModelReloader
+from mongo_client import HISTORY_READ_PREFERENCE, LazyMongoClient
+from metrics import (REGISTRY, CONTENT_TYPE, COUNT_BUCKETS, BYTES_BUCKETS, Counter, Histogram,
+                     timed)
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -14,20 +26,140 @@ warnings.filterwarnings('ignore')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_SIZE = 5000
+ANOMALY_FEATURES = ['heart_rate', 'bp_systolic', 'glucose']
+TREND_FEATURES = ['bp_systolic', 'weight', 'glucose']
+
+# Long-term slope rules: (vital, direction, min change per day, require
+# significance, suggestion)
+SLOPE_RULES = [
+    ('bp_systolic', 1, 0.5, False, "Long-Term Trend: Your blood pressure appears to be on a gradual upward trend over the last month."),
+    ('weight', 1, 0.1, True, "Long-Term Trend: Your weight appears to be on a gradual upward trend over the last month."),
+    ('glucose', 1, 1.0, True, "Long-Term Trend: Your blood sugar appears to be on a gradual upward trend over the last month."),
+    ('heart_rate', 1, 0.5, True, "Long-Term Trend: Your resting heart rate appears to be on a gradual upward trend over the last month."),
+    ('oxygen_level', -1, 0.2, True, "Long-Term Trend: Your oxygen saturation appears to be on a gradual downward trend over the last month."),
+]
+
+# Per-user rolling statistics cache; set STATS_CACHE_MAX_BYTES=0 to disable
+STATS_CACHE_MAX_BYTES = int(os.environ.get('STATS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+STATS_CACHE_TTL_SECONDS = int(os.environ.get('STATS_CACHE_TTL_SECONDS', 3600))
+# Last /predict response per user, answering retries of the same reading;
+# set RESPONSE_CACHE_MAX_BYTES=0 to disable
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 300))
+# Latest risk per user behind POST /risk/top; set RISK_INDEX=0 to disable
+RISK_INDEX = os.environ.get('RISK_INDEX', '1') != '0'
+
+# How history is read: 'documents' (whole records), 'projected' (vitals + date
+# only) or 'aggregate' (window moments computed in MongoDB; used when the
+# stats cache is disabled, since the cache needs individual rows to slide)
+HISTORY_FETCH_MODE = os.environ.get('HISTORY_FETCH_MODE', 'projected')
+
+# Shared secret for POST /admin/reload-model (X-Admin-Token header); the
+# endpoint is disabled while it is unset. The artifact watcher needs no token.
+MODEL_RELOAD_TOKEN = os.environ.get('MODEL_RELOAD_TOKEN')
+
+# 'eager' builds the shared PredictionService (model load included) while this
+# module is imported; 'background' builds it on a thread started by the first
+# use in each process (a request, a health check, the aiohttp app starting),
+# so a worker accepts connections meanwhile and requests wait for it. The
+# import never starts the thread: under gunicorn --preload it runs in the
+# master, and a build thread there would be forked mid-import. To warm up
+# before the first request, add to gunicorn.conf.py:
+#     def post_fork(server, worker):
+#         import predictive_service
+#         predictive_service.startup.ensure_started()
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+STARTUP_WAIT_SECONDS = float(os.environ.get('STARTUP_WAIT_SECONDS', 30))
+
+# Metrics served at /metrics. Label children are bound here once so the hot
+# path only does a perf_counter pair and a histogram bucket increment.
+STAGE_SECONDS = Histogram('careoclock_stage_seconds', 'Time spent in each analysis stage.', ['stage'])
+MONGO_SECONDS = Histogram('careoclock_mongo_seconds', 'MongoDB round trip including reading the cursor.',
+                          ['operation'])
+MONGO_DOCUMENTS = Histogram('careoclock_mongo_documents', 'Documents returned per MongoDB query.',
+                            ['operation'], buckets=COUNT_BUCKETS)
+PREDICTIONS = Counter('careoclock_predictions', 'Scored readings by risk level.', ['risk_level'])
+REQUEST_SECONDS = Histogram('careoclock_http_request_seconds', 'Request latency by endpoint.', ['endpoint'])
+REQUESTS = Counter('careoclock_http_requests', 'Requests by endpoint and status code.', ['endpoint', 'status'])
+REQUEST_BYTES = Histogram('careoclock_http_request_bytes', 'Request body size by endpoint.', ['endpoint'],
+                          buckets=BYTES_BUCKETS)
+ERRORS = Counter('careoclock_errors', 'Handled errors by kind.', ['kind'])
+
+_RISK_LEVELS = {level: PREDICTIONS.labels(level) for level in ('Low', 'Medium', 'High')}
+# Endpoints are a fixed set; anything else is reported as 'other' so unknown
+# paths cannot grow the label space
+METERED_ENDPOINTS = ('/predict', '/predict/batch', '/risk/top', '/health', '/metrics', '/admin/reload-model', '/')
+
+
+def record_request(endpoint, status, seconds, content_length):
+    """HTTP metrics for one request; shared by the Flask and asyncio front ends."""
+    if endpoint not in METERED_ENDPOINTS:
+        endpoint = 'other'
+    REQUEST_SECONDS.labels(endpoint).observe(seconds)
+    REQUESTS.labels(endpoint, status).inc()
+    if content_length:
+        REQUEST_BYTES.labels(endpoint).observe(content_length)
+
+
+def _mongo_read(operation, fetch):
+    """Materializes fetch() and records its round-trip time and document count."""
+    start = perf_counter()
+    docs = list(fetch())
+    MONGO_SECONDS.labels(operation).observe(perf_counter() - start)
+    MONGO_DOCUMENTS.labels(operation).observe(len(docs))
+    return docs
+
+def _history_available(history):
+    """False for a failed history read: None, or an unavailable WindowSummary."""
+    return history is not None and (not isinstance(history, WindowSummary) or history.available)
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 class PredictionService:
-    def __init__(self, mongodb_uri=''):
-        try:
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client['test']  # Use your DB name
-            self.records_collection = self.db['healthrecords']
-            logger.info("Successfully connected to MongoDB.")
-        except Exception as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
-            raise e
-
+    def __init__(self, mongodb_uri=None, stats_cache_max_bytes=STATS_CACHE_MAX_BYTES, history_mode=HISTORY_FETCH_MODE,
+                 records_collection=None, response_cache_max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 model_reload_interval=MODEL_RELOAD_INTERVAL_SECONDS, risk_index_collection=None,
+                 history_read_preference=HISTORY_READ_PREFERENCE, risk_index=RISK_INDEX, database=None):
+        self.history_mode = history_mode
+        self.stats_cache = RollingStatsCache(max_bytes=stats_cache_max_bytes, ttl_seconds=STATS_CACHE_TTL_SECONDS,
+                                             window_days=14) if stats_cache_max_bytes else None
+        self.response_cache = ResponseCache(max_bytes=response_cache_max_bytes,
+                                            ttl_seconds=RESPONSE_CACHE_TTL_SECONDS) if response_cache_max_bytes else None
+        # Loads the model now and swaps in newly published ones (model_reloader.py)
+        self.model_reloader = ModelReloader(interval=model_reload_interval)
+        self.model_reloader.reload()
+        self.mongo = None
+        if records_collection is not None:
+            # Pre-built collection (e.g. memory_store.InMemoryHealthRecords in load tests)
+            self.records_collection = records_collection
+            self.history_collection = records_collection
+        else:
+            try:
+                # Validates the URI now and connects on first use, once per worker process (mongo_client.py)
+                self.mongo = LazyMongoClient(mongodb_uri, database)
+                self.records_collection = self.mongo.lazy_collection('healthrecords')
+                # History windows tolerate replication lag, so they may be read from secondaries
+                self.history_collection = self.mongo.lazy_collection('healthrecords', history_read_preference)
+                if risk_index_collection is None and risk_index:
+                    risk_index_collection = self.mongo.lazy_collection(LATEST_RISK_COLLECTION)
+                logger.info(f"MongoDB configured for database '{self.mongo.database_name}'.")
+            except Exception as e:
+                logger.error(f"Invalid MongoDB configuration: {e}")
+                raise e
+        # Latest risk per user for top-K queries (risk_index.py); None when disabled
+        self.risk_index = LatestRiskIndex(risk_index_collection) if risk_index else None
+        self.model_reloader.start()
+        if self.risk_index is not None:
+            self.risk_index.start()
+
+    @property
+    def risk_model(self):
+        """The active RiskModel (None without one); replaced whole on reload."""
+        return self.model_reloader.model
+
+    @timed(STAGE_SECONDS.labels('flatten_data'))
     def _flatten_data(self, new_data_nested):
         flat_data = {}
         try:
@@ -48,6 +180,8 @@ class PredictionService:
             flat_data['sleep_hours'] = float(new_data_nested.get('sleepHours') or new_data_nested.get('sleep_hours', 0))
             flat_data['temperature'] = float(new_data_nested.get('temperature') or new_data_nested.get('temperature', 0))
             flat_data['oxygen_level'] = float(new_data_nested.get('oxygenLevel') or new_data_nested.get('oxygen_level', 0))
+            if new_data_nested.get('age') is not None:
+                flat_data['age'] = float(new_data_nested['age'])
 
             # Filter zeros if truly missing
             for key in list(flat_data.keys()):
@@ -56,47 +190,110 @@ class PredictionService:
 
         except Exception as e:
             logger.error(f"Error flattening new data: {e}. Data: {new_data_nested}")
+            ERRORS.labels('invalid_reading').inc()
             return None
         return flat_data
 
+    def _flatten_record(self, doc):
+        return {
+            'date': doc.get('date'),
+            'bp_systolic': doc.get('bloodPressure', {}).get('systolic'),
+            'bp_diastolic': doc.get('bloodPressure', {}).get('diastolic'),
+            'glucose': doc.get('bloodSugar', {}).get('value'),
+            'heart_rate': doc.get('heartRate', {}).get('value'),
+            'weight': doc.get('weight', {}).get('value'),
+            'sleep_hours': (doc.get('sleepHours', {}) if isinstance(doc.get('sleepHours'), dict) else {'value': doc.get('sleepHours')}).get('value'),
+            'temperature': (doc.get('temperature', {}) if isinstance(doc.get('temperature'), dict) else {'value': doc.get('temperature')}).get('value'),
+            'oxygen_level': (doc.get('oxygenLevel', {}) if isinstance(doc.get('oxygenLevel'), dict) else {'value': doc.get('oxygenLevel')}).get('value')
+        }
+
+    def _history_frame(self, flat_list, key_columns=('date',)):
+        df = pd.DataFrame(flat_list)
+        df = df.dropna(how='all', subset=df.columns.difference(list(key_columns)))
+        df['date'] = pd.to_datetime(df['date'])
+        for col in df.columns.difference(list(key_columns)):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df
+
+    @timed(STAGE_SECONDS.labels('fetch_user_history'))
     def fetch_user_history(self, user_id, days=14):
+        """The user's window, oldest first (empty without recent records), or None if the read failed."""
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
-            cursor = self.records_collection.find({
+            query = {
                 "userId": ObjectId(user_id),
                 "date": {"$gte": start_date}
-            }).sort("date", 1)
-
-            records = list(cursor)
-            if not records:
+            }
+
+            if self.history_mode == 'documents':
+                records = _mongo_read('find', lambda: self.history_collection.find(query).sort("date", 1))
+                if not records:
+                    logger.info(f"No recent history found for user {user_id}")
+                    return pd.DataFrame()
+                return self._history_frame([self._flatten_record(doc) for doc in records])
+
+            df = frame_from_cursor(_mongo_read(
+                'find', lambda: self.history_collection.find(query, HISTORY_PROJECTION).sort("date", 1)))
+            if df.empty:
                 logger.info(f"No recent history found for user {user_id}")
-                return pd.DataFrame()
-
-            flat_list = []
-            for doc in records:
-                flat_doc = {
-                    'date': doc.get('date'),
-                    'bp_systolic': doc.get('bloodPressure', {}).get('systolic'),
-                    'bp_diastolic': doc.get('bloodPressure', {}).get('diastolic'),
-                    'glucose': doc.get('bloodSugar', {}).get('value'),
-                    'heart_rate': doc.get('heartRate', {}).get('value'),
-                    'weight': doc.get('weight', {}).get('value'),
-                    'sleep_hours': (doc.get('sleepHours', {}) if isinstance(doc.get('sleepHours'), dict) else {'value': doc.get('sleepHours')}).get('value'),
-                    'temperature': (doc.get('temperature', {}) if isinstance(doc.get('temperature'), dict) else {'value': doc.get('temperature')}).get('value'),
-                    'oxygen_level': (doc.get('oxygenLevel', {}) if isinstance(doc.get('oxygenLevel'), dict) else {'value': doc.get('oxygenLevel')}).get('value')
-                }
-                flat_list.append(flat_doc)
-
-            df = pd.DataFrame(flat_list)
-            df = df.dropna(how='all', subset=df.columns.difference(['date']))
-            df['date'] = pd.to_datetime(df['date'])
-            for col in df.columns.difference(['date']):
-                df[col] = pd.to_numeric(df[col], errors='coerce')
             return df
         except Exception as e:
             logger.error(f"Error fetching user history: {e}")
-            return pd.DataFrame()
+            ERRORS.labels('fetch_history').inc()
+            return None
 
+    @timed(STAGE_SECONDS.labels('fetch_user_summary'))
+    def fetch_user_summary(self, user_id, days=14):
+        """
+        Computes the window moments in MongoDB (see history_query.summary_pipeline)
+        and returns a WindowSummary; only records that can raise a history
+        alert are transferred. If the aggregation fails, the summary is empty
+        and marked unavailable.
+        """
+        try:
+            start_date = datetime.utcnow() - timedelta(days=days)
+            facets = next(iter(_mongo_read(
+                'aggregate', lambda: self.history_collection.aggregate(summary_pipeline(ObjectId(user_id), start_date)))), {})
+            alert_df = frame_from_cursor(facets.get('alerts', []))
+            return WindowSummary(facets, evaluate_history(alert_df))
+        except Exception as e:
+            logger.error(f"Error fetching user summary: {e}")
+            ERRORS.labels('fetch_history').inc()
+            return WindowSummary.unavailable()
+
+    @timed(STAGE_SECONDS.labels('fetch_users_history'))
+    def fetch_users_history(self, user_ids, days=14):
+        """
+        Loads the histories of many users with a single $in query and returns
+        a dict of user id -> DataFrame (oldest to newest, same shape as
+        fetch_user_history). Users without recent records map to an empty
+        frame; if the read fails, every user maps to None.
+        """
+        histories = {user_id: pd.DataFrame() for user_id in user_ids}
+        if not user_ids:
+            return histories
+        try:
+            start_date = datetime.utcnow() - timedelta(days=days)
+            # userId desc / date asc walks the { userId: 1, date: -1 } index backwards
+            query = {
+                "userId": {"$in": [ObjectId(user_id) for user_id in user_ids]},
+                "date": {"$gte": start_date}
+            }
+            docs = _mongo_read('find_many', lambda: self.history_collection.find(
+                query, {**HISTORY_PROJECTION, 'userId': 1}).sort([("userId", -1), ("date", 1)]))
+
+            df = frame_from_cursor(docs, key_columns=('userId',))
+            if df.empty:
+                return histories
+            for user_id, group in df.groupby('userId', sort=False):
+                histories[user_id] = group.drop(columns='userId').reset_index(drop=True)
+            return histories
+        except Exception as e:
+            logger.error(f"Error fetching batch user history: {e}")
+            ERRORS.labels('fetch_history').inc()
+            return dict.fromkeys(user_ids)
+
+    @timed(STAGE_SECONDS.labels('safety_net'))
     def analyze_safety_net(self, data):
         alerts = []
         suggestions = []
@@ -151,65 +348,40 @@ class PredictionService:
 
         return alerts, suggestions
 
+    @timed(STAGE_SECONDS.labels('safety_net_history'))
     def analyze_safety_net_history(self, history_df):
-        alerts = []
+        alerts = evaluate_history(history_df)
         suggestions = []
-        for _, record in history_df.iterrows():
-            sys = record.get('bp_systolic')
-            dia = record.get('bp_diastolic')
-            o2 = record.get('oxygen_level')
-            gl = record.get('glucose')
-            hr = record.get('heart_rate')
-            temp = record.get('temperature')
-
-            if sys is not None and dia is not None:
-                if sys > 180 or dia > 120:
-                    alerts.append(f"Hypertensive Crisis at {record['date']}: BP {sys}/{dia}")
-                if sys < 90 or dia < 60:
-                    alerts.append(f"Hypotensive Crisis at {record['date']}: BP {sys}/{dia}")
-                if 140 < sys <= 180 or 90 < dia <= 120:
-                    alerts.append(f"High Blood Pressure (Stage 2) at {record['date']}: BP {sys}/{dia}")
-                if 130 < sys <= 140 or 80 < dia <= 90:
-                    alerts.append(f"High Blood Pressure (Stage 1) at {record['date']}: BP {sys}/{dia}")
-
-            if o2 is not None:
-                if o2 < 92:
-                    alerts.append(f"Very Low Oxygen at {record['date']}: {o2}%")
-                elif o2 < 95:
-                    alerts.append(f"Low Oxygen at {record['date']}: {o2}%")
-
-            if gl is not None:
-                if gl > 250:
-                    alerts.append(f"Very High Blood Sugar at {record['date']}: {gl}")
-                elif gl < 70:
-                    alerts.append(f"Low Blood Sugar at {record['date']}: {gl}")
-
-            if hr is not None:
-                if hr > 120:
-                    alerts.append(f"Very High Heart Rate at {record['date']}: {hr}")
-                elif hr < 50:
-                    alerts.append(f"Very Low Heart Rate at {record['date']}: {hr}")
-
-            if temp is not None:
-                if temp > 103:
-                    alerts.append(f"High Fever at {record['date']}: {temp}")
-                elif temp > 100.4:
-                    alerts.append(f"Fever at {record['date']}: {temp}")
-                elif temp < 95:
-                    alerts.append(f"Low Body Temperature at {record['date']}: {temp}")
-
         return alerts, suggestions
 
+    @timed(STAGE_SECONDS.labels('anomalies'))
     def analyze_anomalies(self, new_data, history_df):
-        alerts = []
         if len(history_df) < 5:
-            return alerts
+            return []
         recent_df = history_df.tail(7) if len(history_df) > 7 else history_df
-        for feature in ['heart_rate', 'bp_systolic', 'glucose']:
-            if feature not in recent_df or recent_df[feature].isnull().all() or not new_data.get(feature):
+        moments = {}
+        for feature in ANOMALY_FEATURES:
+            if feature not in recent_df or recent_df[feature].isnull().all():
+                continue
+            moments[feature] = (recent_df[feature].mean(), recent_df[feature].std())
+        return self._anomaly_alerts(new_data, moments)
+
+    @timed(STAGE_SECONDS.labels('anomalies'))
+    def analyze_anomalies_from_stats(self, new_data, stats):
+        if stats.row_count < 5:
+            return []
+        moments = {}
+        for feature in ANOMALY_FEATURES:
+            mean, std = stats.tail_moments(feature)
+            if not pd.isna(mean):
+                moments[feature] = (mean, std)
+        return self._anomaly_alerts(new_data, moments)
+
+    def _anomaly_alerts(self, new_data, moments):
+        alerts = []
+        for feature, (mean, std) in moments.items():
+            if not new_data.get(feature):
                 continue
-            mean = recent_df[feature].mean()
-            std = recent_df[feature].std()
             if std == 0 or pd.isna(std) or pd.isna(mean):
                 continue
             new_value = new_data[feature]
@@ -220,43 +392,307 @@ class PredictionService:
         return alerts
 
     def analyze_trends(self, history_df):
-        suggestions = []
+        return self._analyze_trends(history_df)[0]
+
+    @timed(STAGE_SECONDS.labels('trends'))
+    def _analyze_trends(self, history_df):
         if len(history_df) < 7:
-            return suggestions
-        for feature in ['bp_systolic', 'weight', 'glucose']:
+            return [], {}
+        averages = {}
+        for feature in TREND_FEATURES:
             if feature not in history_df or history_df[feature].count() < 7:
                 continue
-            avg_30d = history_df[feature].mean()
-            avg_7d = history_df.tail(7)[feature].mean()
+            averages[feature] = (history_df[feature].mean(), history_df.tail(7)[feature].mean())
+        trends = fit_trends(history_df)
+        return self._trend_suggestions(averages, trends), trends
+
+    def analyze_trends_from_stats(self, stats):
+        return self._analyze_trends_from_stats(stats)[0]
+
+    @timed(STAGE_SECONDS.labels('trends'))
+    def _analyze_trends_from_stats(self, stats):
+        if stats.row_count < 7:
+            return [], {}
+        averages = {}
+        for feature in TREND_FEATURES:
+            if stats.window_count(feature) < 7:
+                continue
+            averages[feature] = (stats.window_mean(feature), stats.tail_moments(feature)[0])
+        trends = stats.trend_slopes()
+        return self._trend_suggestions(averages, trends), trends
+
+    def _trend_suggestions(self, averages, trends):
+        suggestions = []
+        for feature, (avg_30d, avg_7d) in averages.items():
             if pd.isna(avg_30d) or pd.isna(avg_7d):
                 continue
             if avg_7d > (avg_30d * 1.02):
                 suggestions.append(f"Upward Trend: Your {feature.replace('_', ' ')} has been higher than your monthly average for the past week.")
             elif avg_7d < (avg_30d * 0.95) and feature != 'weight':
                 suggestions.append(f"Downward Trend: Your {feature.replace('_', ' ')} has been lower than your monthly average. Keep up the good work!")
-        df = history_df.dropna(subset=['bp_systolic', 'weight']).copy()
-        if len(df) > 7:
-            df['time'] = (df['date'] - df['date'].min()).dt.total_seconds()
-            X = df[['time']]
-            y_bp = df['bp_systolic']
-            lr_bp = LinearRegression().fit(X, y_bp)
-            slope_bp = lr_bp.coef_[0] * (60 * 60 * 24)
-            if slope_bp > 0.5:
-                suggestions.append("Long-Term Trend: Your blood pressure appears to be on a gradual upward trend over the last month.")
+        for feature, direction, per_day, significant_only, message in SLOPE_RULES:
+            if feature not in trends:
+                continue
+            slope, std_error, _ = trends[feature]
+            if direction * slope <= per_day:
+                continue
+            # Two standard errors away from flat; the BP rule predates the
+            # error estimate and keeps its original slope-only threshold
+            if significant_only and (std_error is None or abs(slope) <= 2 * std_error):
+                continue
+            suggestions.append(message)
         return suggestions
 
+    def _reading_date(self, new_data_nested):
+        """Date the reading will be stored under, at MongoDB's millisecond precision."""
+        date = None
+        if new_data_nested.get('date'):
+            try:
+                ts = pd.Timestamp(new_data_nested['date'])
+                if ts.tzinfo is not None:
+                    ts = ts.tz_convert('UTC').tz_localize(None)
+                date = ts.to_pydatetime()
+            except (ValueError, TypeError):
+                date = None
+        date = date or datetime.utcnow()
+        return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+    def _record_reading(self, user_id, stats, new_data_flat, date):
+        """Folds a scored reading into the user's cached statistics."""
+        if stats.last_date is not None and date < stats.last_date:
+            # Out-of-order reading: reseed from MongoDB next time
+            self.stats_cache.invalidate(user_id)
+            return False
+        stats.add(date, [new_data_flat.get(f) for f in STAT_FEATURES], evaluate_record(date, new_data_flat))
+        self.stats_cache.resize(user_id)
+        return True
+
     def predict_risk(self, new_data_nested, user_id):
         new_data_flat = self._flatten_data(new_data_nested)
         if new_data_flat is None:
             return {'error': 'Invalid input data format'}
 
-        history_df = self.fetch_user_history(user_id, days=14)
-
-        history_alerts, history_suggestions = self.analyze_safety_net_history(history_df)
+        stats = self.cached_stats(user_id)
+        cached, response_key = self.cached_response(new_data_nested, new_data_flat, user_id, stats)
+        if cached is not None:
+            return cached
+        history = self.load_history(user_id) if stats is None else None
+        return self.score_reading(new_data_nested, new_data_flat, user_id, stats, history, response_key)
+
+    # predict_risk is split into its MongoDB read (load_history) and its CPU
+    # work (score_reading) so the asyncio front end can run them on separate
+    # executors.
+
+    def cached_stats(self, user_id):
+        """Warm rolling statistics for the user, or None when history has to be read."""
+        return self.stats_cache.get(str(user_id)) if self.stats_cache is not None else None
+
+    def cached_response(self, new_data_nested, new_data_flat, user_id, stats):
+        """
+        (response, key): the stored response if this exact reading was already
+        scored against the user's current history and model, else None and the
+        key score_reading stores its result under.
+        """
+        if self.response_cache is None:
+            return None, None
+        key = reading_hash(new_data_flat, new_data_nested.get('date'))
+        if self.stats_cache is None:
+            # Without cached statistics the newest stored record marks the history
+            marker = self._latest_record_marker(user_id)
+        elif stats is not None:
+            marker = self._stats_marker(stats)
+        else:
+            # Cold user: nothing cached can match
+            return None, (key, None)
+        return self.response_cache.get(str(user_id), key, marker), (key, marker)
+
+    def _stats_marker(self, stats):
+        return stats.loaded_at, stats.revision, self.model_reloader.loaded_at
+
+    def _latest_record_marker(self, user_id):
+        try:
+            docs = _mongo_read('find_latest', lambda: self.records_collection.find(
+                {'userId': ObjectId(user_id)}, {'_id': 1, 'date': 1}).sort('date', -1).limit(1))
+        except Exception as e:
+            logger.error(f"Error reading latest record for user {user_id}: {e}")
+            return None
+        latest = (docs[0].get('_id'), docs[0].get('date')) if docs else ()
+        return latest, self.model_reloader.loaded_at
+
+    def _cache_response(self, user_id, response_key, marker, result):
+        if response_key is not None and marker is not None and 'error' not in result:
+            self.response_cache.put(user_id, response_key[0], marker, result)
+
+    def load_history(self, user_id):
+        """History read for a user without cached statistics."""
+        if self.stats_cache is None and self.history_mode == 'aggregate':
+            return self.fetch_user_summary(user_id, days=14)
+        return self.fetch_user_history(user_id, days=14)
+
+    def _record_risk(self, user_id, date, result):
+        if self.risk_index is not None:
+            self.risk_index.record(user_id, date, result)
+
+    def score_reading(self, new_data_nested, new_data_flat, user_id, stats, history, response_key=None):
+        """
+        Scores a reading against warm `stats` or a freshly loaded `history`,
+        updating the caches; `response_key` comes from cached_response. If the
+        history read failed (None, or an unavailable WindowSummary) the
+        reading is scored without history and nothing is cached.
+        """
+        user_id = str(user_id)
+        date = self._reading_date(new_data_nested)
+        if stats is None and not _history_available(history):
+            result = self._score(new_data_flat, pd.DataFrame())
+            self._record_risk(user_id, date, result)
+            return result
+
+        if self.stats_cache is None:
+            if isinstance(history, WindowSummary):
+                result = self._score_from_stats(new_data_flat, history)
+            else:
+                result = self._score(new_data_flat, history)
+            self._record_risk(user_id, date, result)
+            if response_key is not None:
+                self._cache_response(user_id, response_key, response_key[1], result)
+            return result
+
+        if stats is None:
+            alert_rows, history_alerts = evaluate_history_rows(history)
+            result = self._score(new_data_flat, history, history_alerts=history_alerts)
+            stats = self.stats_cache.new_stats(history, alert_rows, history_alerts)
+            self.stats_cache.put(user_id, stats)
+        else:
+            with stats.lock:
+                stats.expire()
+                result = self._score_from_stats(new_data_flat, stats)
+
+        self._record_risk(user_id, date, result)
+        with stats.lock:
+            if self._record_reading(user_id, stats, new_data_flat, date):
+                # A retry finds the statistics with this reading already recorded
+                self._cache_response(user_id, response_key, self._stats_marker(stats), result)
+        return result
+
+    def predict_risk_batch(self, items):
+        """
+        Scores many readings at once. `items` is a list of raw request payloads
+        (each with a userId); users without warm cached statistics have their
+        histories fetched in one query, and the history safety net runs once
+        over the combined window.
+        Returns one result per item, in order; failures carry an 'error' key.
+        """
+        results = [None] * len(items)
+        flat_items = {}
+        for i, item in enumerate(items):
+            user_id = item.get('userId') if isinstance(item, dict) else None
+            if not user_id:
+                results[i] = {'userId': user_id, 'error': 'Missing required field: userId'}
+            elif not ObjectId.is_valid(user_id):
+                results[i] = {'userId': user_id, 'error': 'Invalid userId format'}
+            else:
+                new_data_flat = self._flatten_data(item)
+                if new_data_flat is None:
+                    results[i] = {'userId': user_id, 'error': 'Invalid input data format'}
+                else:
+                    flat_items[i] = (str(user_id), new_data_flat)
+
+        user_ids = list(dict.fromkeys(user_id for user_id, _ in flat_items.values()))
+        warm = {}
+        if self.stats_cache is not None:
+            for user_id in user_ids:
+                stats = self.stats_cache.get(user_id)
+                if stats is not None:
+                    warm[user_id] = stats
+        cold_ids = [user_id for user_id in user_ids if user_id not in warm]
+        histories = self.fetch_users_history(cold_ids, days=14)
+        history_alerts = self.evaluate_histories(histories)
+
+        for i, (user_id, new_data_flat) in flat_items.items():
+            try:
+                if user_id in warm:
+                    stats = warm[user_id]
+                    with stats.lock:
+                        stats.expire()
+                        result = self._score_from_stats(new_data_flat, stats)
+                elif histories[user_id] is None:
+                    # The history read failed: score without it and seed no statistics
+                    result = self._score(new_data_flat, pd.DataFrame())
+                else:
+                    alert_rows, alerts = history_alerts[user_id]
+                    result = self._score(new_data_flat, histories[user_id], history_alerts=list(alerts))
+                    if self.stats_cache is not None:
+                        stats = self.stats_cache.new_stats(histories[user_id], alert_rows, alerts)
+                        self.stats_cache.put(user_id, stats)
+                        warm[user_id] = stats
+                date = self._reading_date(items[i])
+                self._record_risk(user_id, date, result)
+                if user_id in warm:
+                    with warm[user_id].lock:
+                        self._record_reading(user_id, warm[user_id], new_data_flat, date)
+                result['userId'] = user_id
+                results[i] = result
+            except Exception as e:
+                logger.error(f"Batch prediction error for user {user_id}: {e}")
+                ERRORS.labels('batch_item').inc()
+                results[i] = {'userId': user_id, 'error': f'Internal server error: {e}'}
+        return results
+
+    def evaluate_histories(self, histories):
+        """
+        History safety net for many users in one columnar pass over their
+        combined windows. `histories` maps user id -> history DataFrame;
+        returns user id -> (alert rows, alerts) as evaluate_history_rows would.
+        """
+        history_alerts = {user_id: ([], []) for user_id in histories}
+        frames = [history.assign(userId=user_id) for user_id, history in histories.items()
+                  if history is not None and not history.empty]
+        if frames:
+            combined = pd.concat(frames, ignore_index=True)
+            firsts = combined['userId'].drop_duplicates()
+            offsets = dict(zip(firsts.tolist(), firsts.index.tolist()))
+            rows, alerts = evaluate_history_rows(combined)
+            owners = combined['userId'].to_numpy()[rows]
+            for row, owner, alert in zip(rows.tolist(), owners, alerts):
+                history_alerts[owner][0].append(row - offsets[owner])
+                history_alerts[owner][1].append(alert)
+        return history_alerts
+
+    def _score(self, new_data_flat, history_df, history_alerts=None):
+        if history_alerts is None:
+            history_alerts, history_suggestions = self.analyze_safety_net_history(history_df)
+        else:
+            history_suggestions = []
         safety_alerts, safety_suggestions = self.analyze_safety_net(new_data_flat)
         anomaly_alerts = self.analyze_anomalies(new_data_flat, history_df)
-        trend_suggestions = self.analyze_trends(history_df)
+        trend_suggestions, trends = self._analyze_trends(history_df)
+        return self._build_response(history_alerts, history_suggestions, safety_alerts, safety_suggestions,
+                                    anomaly_alerts, trend_suggestions, trends, self.predict_ml(new_data_flat))
 
+    def _score_from_stats(self, new_data_flat, stats):
+        safety_alerts, safety_suggestions = self.analyze_safety_net(new_data_flat)
+        anomaly_alerts = self.analyze_anomalies_from_stats(new_data_flat, stats)
+        trend_suggestions, trends = self._analyze_trends_from_stats(stats)
+        return self._build_response(stats.history_alerts(), [], safety_alerts, safety_suggestions,
+                                    anomaly_alerts, trend_suggestions, trends, self.predict_ml(new_data_flat))
+
+    @timed(STAGE_SECONDS.labels('ml_prediction'))
+    def predict_ml(self, new_data_flat):
+        """Trained-model risk level and class probabilities, or None without a model."""
+        # One reference for the whole prediction, so a concurrent reload cannot mix models
+        risk_model = self.risk_model
+        if risk_model is None:
+            return None
+        try:
+            return risk_model.predict(new_data_flat)
+        except Exception as e:
+            logger.error(f"ML prediction error: {e}")
+            ERRORS.labels('ml_prediction').inc()
+            return None
+
+    @timed(STAGE_SECONDS.labels('confidence_scoring'))
+    def _build_response(self, history_alerts, history_suggestions, safety_alerts, safety_suggestions,
+                        anomaly_alerts, trend_suggestions, trends, ml_prediction=None):
         all_alerts = history_alerts + safety_alerts + anomaly_alerts
         all_suggestions = history_suggestions + safety_suggestions + trend_suggestions
 
@@ -292,37 +728,219 @@ class PredictionService:
                 'anomaly_alerts': len(anomaly_alerts),
                 'trend_suggestions': len(trend_suggestions)
             },
+            'trends': {
+                feature: {'slope_per_day': slope, 'std_error': std_error, 'points': points}
+                for feature, (slope, std_error, points) in trends.items()
+            },
+            'ml_prediction': ml_prediction,
             'timestamp': datetime.now().isoformat()
         }
 
+        _RISK_LEVELS[risk_level].inc()
         return response
 
 
-try:
-    prediction_service = PredictionService()
-except Exception as e:
-    logger.error(f"CRITICAL: Failed to initialize PredictionService. {e}")
-    prediction_service = None
+class ServiceStartup:
+    """
+    Builds the shared PredictionService, inline (eager) or on a background
+    thread started by ensure_started in the process that will serve.
+    """
+
+    def __init__(self, mode=STARTUP_MODE):
+        self.mode = mode
+        self.ready = threading.Event()
+        self.seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+    def start(self):
+        """Builds the service now when eager; in background mode ensure_started does."""
+        if self.mode != 'background':
+            self.run()
+
+    def ensure_started(self):
+        """Starts the background build in this process unless it has one (a no-op when eager)."""
+        if self.mode != 'background' or self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            if not self.ready.is_set():
+                threading.Thread(target=self.run, name='service-startup', daemon=True).start()
+
+    def run(self):
+        global prediction_service
+        start = perf_counter()
+        try:
+            prediction_service = PredictionService()
+        except Exception as e:
+            logger.error(f"CRITICAL: Failed to initialize PredictionService. {e}")
+            self.error = str(e)
+        self.seconds = perf_counter() - start
+        self.ready.set()
+
+    def wait(self, timeout=STARTUP_WAIT_SECONDS):
+        """The shared service, once started; None if it failed or is still starting after `timeout`."""
+        self.ensure_started()
+        self.ready.wait(timeout)
+        return prediction_service
+
+    def info(self):
+        return {
+            'mode': self.mode,
+            'ready': self.ready.is_set(),
+            'seconds': self.seconds,
+        }
 
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    if prediction_service is None:
-        return jsonify({
+prediction_service = None
+startup = ServiceStartup()
+startup.start()
+
+
+# Request handling shared by the Flask app and the asyncio front end
+# (async_service.py), so both serve the same contract.
+
+def health_status(service):
+    startup.ensure_started()
+    if service is None and not startup.ready.is_set():
+        return {'status': 'starting', 'startup': startup.info()}, 503
+    if service is None:
+        return {
             'status': 'unhealthy',
             'error': 'PredictionService failed to initialize. Check DB connection.'
-        }), 500
+        }, 500
 
-    return jsonify({
+    risk_model = service.risk_model
+    return {
         'status': 'healthy',
         'engine_type': 'Rule-Based & Time-Series Analysis',
+        'stats_cache': service.stats_cache.info() if service.stats_cache else None,
+        'response_cache': service.response_cache.info() if service.response_cache else None,
+        'risk_index': service.risk_index.info() if service.risk_index else None,
+        'mongo': service.mongo.info() if service.mongo else None,
+        'startup': startup.info(),
+        'ml_model': risk_model.info() if risk_model else None,
+        'model_reload': service.model_reloader.info(),
         'timestamp': datetime.now().isoformat()
-    }), 200
+    }, 200
+
+
+def reload_model_request(service, token, force=False):
+    """(body, status) for an admin model reload: loads new artifacts, then swaps them in."""
+    if service is None:
+        return {'error': 'Prediction service is offline.'}, 503
+    if not MODEL_RELOAD_TOKEN:
+        return {'error': 'Model reload endpoint is disabled; set MODEL_RELOAD_TOKEN'}, 403
+    if not hmac.compare_digest((token or '').encode(), MODEL_RELOAD_TOKEN.encode()):
+        return {'error': 'Invalid admin token'}, 403
+    result = service.model_reloader.reload(force=force)
+    return result, 500 if result['status'] == 'failed' else 200
+
+
+def top_risk_request(service, payload):
+    """
+    (body, status) for the highest-risk users from the latest risk index:
+    {"k": 100, "riskLevel": "High", "userIds": [...]}, userIds optional
+    (e.g. a caregiver's assigned patients).
+    """
+    if service is None:
+        return {'error': 'Prediction service is offline.'}, 503
+    if service.risk_index is None:
+        return {'error': 'Latest risk index is disabled (RISK_INDEX=0)'}, 503
+    if not isinstance(payload, dict):
+        return {'error': 'Body must be a JSON object'}, 400
+    k = payload.get('k', 100)
+    risk_level = payload.get('riskLevel', 'High')
+    user_ids = payload.get('userIds')
+    if not isinstance(k, int) or isinstance(k, bool) or not 0 < k <= MAX_BATCH_SIZE:
+        return {'error': f'k must be an integer between 1 and {MAX_BATCH_SIZE}'}, 400
+    if risk_level not in RISK_LEVELS:
+        return {'error': f'riskLevel must be one of {list(RISK_LEVELS)}'}, 400
+    if user_ids is not None and not isinstance(user_ids, list):
+        return {'error': 'userIds must be a list'}, 400
+    patients = service.risk_index.top(k, risk_level, user_ids)
+    for patient in patients:
+        patient['date'] = patient['date'].isoformat() if patient['date'] else None
+        patient['updatedAt'] = patient['updatedAt'].isoformat() if patient['updatedAt'] else None
+    return {'count': len(patients), 'patients': patients}, 200
+
+
+def validate_predict_payload(health_data):
+    """Returns an error message for an unusable /predict payload, else None."""
+    user_id = health_data.get('userId')
+
+    if not user_id:
+        return 'Missing required field: userId'
+
+    if not ObjectId.is_valid(user_id):
+        return 'Invalid userId format'
+    return None
+
+
+def batch_items(payload):
+    """Returns (items, error message) for a /predict/batch payload."""
+    items = payload.get('readings') if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return None, 'Expected a non-empty list of readings'
+    if len(items) > MAX_BATCH_SIZE:
+        return None, f'Batch too large: at most {MAX_BATCH_SIZE} readings per request'
+    return items, None
+
+
+def batch_response(results):
+    return {
+        'results': results,
+        'count': len(results),
+        'failed': sum(1 for r in results if 'error' in r),
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        record_request(request.path, response.status_code, perf_counter() - started, request.content_length)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    body, status = health_status(prediction_service)
+    return jsonify(body), status
+
+
+@app.route('/admin/reload-model', methods=['POST'])
+def reload_model():
+    payload = request.get_json(silent=True) or {}
+    body, status = reload_model_request(startup.wait(), request.headers.get('X-Admin-Token'),
+                                        force=bool(payload.get('force')))
+    return jsonify(body), status
+
+
+@app.route('/risk/top', methods=['POST'])
+def top_risk():
+    body, status = top_risk_request(startup.wait(), request.get_json(silent=True) or {})
+    return jsonify(body), status
 
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if prediction_service is None:
+    service = startup.wait()
+    if service is None:
         return jsonify({'error': 'Prediction service is offline.'}), 503
 
     try:
@@ -331,18 +949,12 @@ def predict():
 
         health_data = request.json
 
-        # Debug incoming data
-        print(f"Incoming health data: {health_data}")
-
-        user_id = health_data.get('userId')
-
-        if not user_id:
-            return jsonify({'error': 'Missing required field: userId'}), 400
+        error = validate_predict_payload(health_data)
+        if error:
+            return jsonify({'error': error}), 400
 
-        if not ObjectId.is_valid(user_id):
-            return jsonify({'error': 'Invalid userId format'}), 400
-
-        result = prediction_service.predict_risk(health_data, user_id)
+        user_id = health_data['userId']
+        result = service.predict_risk(health_data, user_id)
 
         if 'error' in result:
             return jsonify(result), 400
@@ -352,6 +964,32 @@ def predict():
 
     except Exception as e:
         logger.error(f"Prediction error: {e}")
+        ERRORS.labels('predict').inc()
+        return jsonify({'error': f'Internal server error: {e}'}), 500
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    service = startup.wait()
+    if service is None:
+        return jsonify({'error': 'Prediction service is offline.'}), 503
+
+    try:
+        payload = request.get_json(silent=True)
+        if payload is None:
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        items, error = batch_items(payload)
+        if error:
+            return jsonify({'error': error}), 400
+
+        response = batch_response(service.predict_risk_batch(items))
+        logger.info(f"Batch prediction made for {response['count']} readings ({response['failed']} failed)")
+        return jsonify(response), 200
+
+    except Exception as e:
+        logger.error(f"Batch prediction error: {e}")
+        ERRORS.labels('predict_batch').inc()
         return jsonify({'error': f'Internal server error: {e}'}), 500
 
 
@@ -366,7 +1004,11 @@ def home():
         'message': 'CareOClock Predictive Engine is running.',
         'endpoints': {
             '/health': 'GET - Check service health',
-            '/predict': 'POST - Get risk prediction'
+            '/predict': 'POST - Get risk prediction',
+            '/predict/batch': 'POST - Get risk predictions for many users',
+            '/risk/top': 'POST - Highest-risk users from the latest risk index',
+            '/metrics': 'GET - Prometheus metrics',
+            '/admin/reload-model': 'POST - Load newly published model artifacts (X-Admin-Token)'
         }
     }), 200
 
@@ -0,0 +1,94 @@
+"""
+CareOClock Predictive Engine - Prediction Response Cache
+Description: Remembers the last /predict response per user so a retried
+             request (the Node backend retries on timeouts) is answered from
+             memory instead of repeating the history read and the three
+             analysis stages. An entry only matches the same reading (a
+             canonical hash of the flattened vitals and its date) scored
+             against the same history and model: once a newer reading is
+             recorded for the user, or a new model is loaded, the history
+             marker no longer matches and the entry is replaced on the next
+             miss.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-entry cost for the memory cap; the response is counted at a
+# multiple of its JSON size (CPython dicts, lists and strings)
+_ENTRY_OVERHEAD_BYTES = 512
+_RESPONSE_SIZE_FACTOR = 4
+
+
+def reading_hash(new_data_flat, date=None):
+    """Canonical hash of a flattened reading and the date it was sent with."""
+    canonical = json.dumps([sorted(new_data_flat.items()), date], default=str, separators=(',', ':'))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU map of user id -> (reading hash, history marker, response), one entry
+    per user, bounded by an approximate memory cap and a TTL. Only the newest
+    reading of a user can still match its history, so older entries are never
+    worth keeping.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl_seconds=300):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, key, marker):
+        """The cached response for `key` computed at history `marker`, or None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != key or entry[1] != marker:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry[2] > self.ttl_seconds:
+                self._drop(user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, user_id, key, marker, response):
+        nbytes = _ENTRY_OVERHEAD_BYTES + _RESPONSE_SIZE_FACTOR * len(json.dumps(response, default=str))
+        with self._lock:
+            if user_id in self._entries:
+                self._drop(user_id)
+            self._entries[user_id] = (key, marker, time.monotonic(), response, nbytes)
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if user_id in self._entries:
+                self._drop(user_id)
+
+    def info(self):
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _drop(self, user_id):
+        self._total_bytes -= self._entries.pop(user_id)[4]
@@ -0,0 +1,313 @@
+"""
+CareOClock Predictive Engine - Latest Risk Index
+Description: The latest risk of every scored user, kept in memory in
+             (risk level, confidence) order and mirrored to a compact
+             latest_risk collection with one document per user. "Top-K
+             high-risk patients" becomes a walk over the first K entries (or
+             a selection among a caregiver's own patients) instead of a scan
+             of the unbounded Prediction history.
+
+In memory, each risk level has a list of (-confidence, user id) kept sorted
+with bisect, plus a user id -> entry map. Loading the whole collection fills
+the map first and sorts each list once; bisect only handles later updates. Scoring marks users dirty and a
+background thread writes them with an unordered bulk_write; the same thread
+pulls entries other workers wrote, so every process converges on the
+collection within a flush interval or two. A reading older than the user's
+current entry never replaces it.
+"""
+
+import bisect
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+LATEST_RISK_COLLECTION = 'latest_risk'
+# Seconds between writes of changed entries (and pulls of other workers'); 0 disables the thread
+RISK_INDEX_FLUSH_SECONDS = float(os.environ.get('RISK_INDEX_FLUSH_SECONDS', 5))
+RISK_LEVELS = ('Low', 'Medium', 'High')
+RISK_RANK = {level: rank for rank, level in enumerate(RISK_LEVELS)}
+_DUPLICATE_KEY = 11000
+# Entry fields, stored as a tuple per user to keep a million users in a few hundred MB
+_ENTRY_FIELDS = ('riskLevel', 'confidence', 'date', 'modelVersion', 'updatedAt')
+
+
+def _supersedes(date, current_date):
+    """Whether an entry for a reading at `date` replaces one at `current_date`; older readings never do."""
+    return date is None or current_date is None or date >= current_date
+
+
+def latest_risk_document(user_id, date, risk_level, confidence, model_version=None, updated_at=None):
+    """One latest_risk document; _id is the user's ObjectId."""
+    return {
+        '_id': ObjectId(user_id),
+        'riskLevel': risk_level,
+        'riskRank': RISK_RANK[risk_level],
+        'confidence': float(confidence),
+        'date': date,
+        'modelVersion': model_version,
+        'updatedAt': updated_at or datetime.utcnow(),
+    }
+
+
+def write_latest_risk(collection, documents):
+    """
+    Unordered bulk upsert of latest_risk documents that only replaces older
+    entries. The filter requires an older date, so a user whose stored entry
+    is newer fails the upsert with a duplicate key error, which is expected
+    and not counted. Returns (documents written, write errors).
+    """
+    if not documents:
+        return 0, 0
+    requests = [UpdateOne({'_id': doc['_id'], 'date': {'$lte': doc['date']}}, {'$set': doc}, upsert=True)
+                for doc in documents]
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        return result.upserted_count + result.matched_count, 0
+    except BulkWriteError as e:
+        details = e.details
+        errors = [error for error in details['writeErrors'] if error['code'] != _DUPLICATE_KEY]
+        if errors:
+            logger.error(f"{len(errors)} latest risk writes failed, first: {errors[0]['errmsg']}")
+        return details['nUpserted'] + details['nMatched'], len(errors)
+
+
+def ensure_indexes(collection):
+    collection.create_index([('riskRank', DESCENDING), ('confidence', DESCENDING)])
+    collection.create_index([('updatedAt', ASCENDING)])
+
+
+class LatestRiskIndex:
+    """
+    user id -> latest {'userId', 'riskLevel', 'confidence', 'date',
+    'modelVersion', 'updatedAt'}, ordered by risk level then confidence.
+    `collection` (optional) is the latest_risk collection behind it.
+    """
+
+    def __init__(self, collection=None, flush_interval=RISK_INDEX_FLUSH_SECONDS):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self._entries = {}
+        self._order = {level: [] for level in RISK_LEVELS}
+        self._dirty = {}
+        self._pulled_until = None
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.updates = 0
+        self.stale = 0
+        self.written = 0
+        self.write_errors = 0
+        self.last_error = None
+
+    # --- Updates ---
+
+    def update(self, user_id, date, risk_level, confidence, model_version=None):
+        """Records a scored reading; returns False if the user already has a newer one."""
+        document = latest_risk_document(user_id, date, risk_level, confidence, model_version)
+        with self._lock:
+            if not self._apply(str(user_id), document):
+                self.stale += 1
+                return False
+            if self.collection is not None:
+                self._dirty[str(user_id)] = document
+            self.updates += 1
+            return True
+
+    def record(self, user_id, date, result):
+        """update() from a /predict response."""
+        ml_prediction = result.get('ml_prediction') or {}
+        return self.update(user_id, date, result['risk_level'], result['confidence'],
+                           ml_prediction.get('model_version'))
+
+    def _apply(self, user_id, document):
+        current = self._entries.get(user_id)
+        if current is not None:
+            level, confidence, date = current[:3]
+            if not _supersedes(document['date'], date):
+                return False
+            order = self._order[level]
+            del order[bisect.bisect_left(order, (-confidence, user_id))]
+        entry = tuple(document[field] for field in _ENTRY_FIELDS)
+        self._entries[user_id] = entry
+        bisect.insort(self._order[entry[0]], (-entry[1], user_id))
+        return True
+
+    def _as_dict(self, user_id):
+        return dict(zip(_ENTRY_FIELDS, self._entries[user_id]), userId=user_id)
+
+    # --- Queries ---
+
+    def get(self, user_id):
+        with self._lock:
+            return self._as_dict(str(user_id)) if str(user_id) in self._entries else None
+
+    def top(self, k=100, risk_level='High', user_ids=None):
+        """
+        The k highest-risk users at or above `risk_level`, highest level and
+        confidence first. Over all users this walks the first k entries;
+        with `user_ids` (e.g. a caregiver's assigned patients) it selects
+        among those users only, in O(len(user_ids) log k).
+        """
+        min_rank = RISK_RANK[risk_level]
+        with self._lock:
+            if user_ids is None:
+                keys = []
+                for level in reversed(RISK_LEVELS[min_rank:]):
+                    keys.extend(self._order[level][:k - len(keys)])
+                    if len(keys) >= k:
+                        break
+                return [self._as_dict(user_id) for _, user_id in keys]
+            candidates = [(RISK_RANK[entry[0]], entry[1], user_id) for user_id, entry in
+                          ((str(user_id), self._entries.get(str(user_id))) for user_id in user_ids)
+                          if entry is not None and RISK_RANK[entry[0]] >= min_rank]
+            return [self._as_dict(user_id) for _, _, user_id in heapq.nlargest(k, candidates)]
+
+    def counts(self):
+        with self._lock:
+            return {level: len(order) for level, order in self._order.items()}
+
+    # --- Persistence ---
+
+    def load(self):
+        """Fills the index from the collection (at startup); returns the number of entries."""
+        if self.collection is None:
+            return 0
+        ensure_indexes(self.collection)
+        pulled = self._pull()
+        self.loaded = True
+        return pulled
+
+    def _pull(self):
+        if self._pulled_until is None:
+            return self._pull_all()
+        # Workers stamp and write independently, so re-read a margin behind the
+        # newest stamp seen; re-applying an entry is harmless
+        margin = timedelta(seconds=2 * max(self.flush_interval, 1))
+        query = {'updatedAt': {'$gt': self._pulled_until - margin}}
+        pulled = 0
+        for document in self.collection.find(query):
+            with self._lock:
+                self._apply(str(document['_id']), document)
+            if self._pulled_until is None or document['updatedAt'] > self._pulled_until:
+                self._pulled_until = document['updatedAt']
+            pulled += 1
+        return pulled
+
+    def _pull_all(self):
+        # One insort per document is quadratic in the number of users; read
+        # everything into a map and sort each level's list once instead
+        entries = {}
+        pulled_until = None
+        for document in self.collection.find({}):
+            entries[str(document['_id'])] = tuple(document[field] for field in _ENTRY_FIELDS)
+            if pulled_until is None or document['updatedAt'] > pulled_until:
+                pulled_until = document['updatedAt']
+        with self._lock:
+            # Readings scored while the collection was being read
+            for user_id, entry in self._entries.items():
+                stored = entries.get(user_id)
+                if stored is None or _supersedes(entry[2], stored[2]):
+                    entries[user_id] = entry
+            order = {level: [] for level in RISK_LEVELS}
+            for user_id, entry in entries.items():
+                order[entry[0]].append((-entry[1], user_id))
+            for keys in order.values():
+                keys.sort()
+            self._entries, self._order = entries, order
+        self._pulled_until = pulled_until
+        return len(entries)
+
+    def flush(self):
+        """Writes entries changed since the last flush, then pulls other workers' changes."""
+        if self.collection is None:
+            return 0
+        with self._lock:
+            documents, self._dirty = list(self._dirty.values()), {}
+        now = datetime.utcnow()
+        for document in documents:
+            document['updatedAt'] = now
+        try:
+            written, errors = write_latest_risk(self.collection, documents)
+        except Exception:
+            # Keep them for the next flush unless the user was scored again meanwhile
+            with self._lock:
+                for document in documents:
+                    self._dirty.setdefault(str(document['_id']), document)
+            raise
+        self.written += written
+        self.write_errors += errors
+        self._pull()
+        return written
+
+    def start(self):
+        """
+        Loads the index and starts the flush thread (no-op without a
+        collection or when running). The thread does the loading, so startup
+        neither waits for MongoDB nor connects to it before a pre-fork server
+        forks its workers; with interval 0 the index is loaded here and only
+        written by stop().
+        """
+        if self.collection is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        if self.flush_interval <= 0:
+            self._load()
+            return
+        if self._thread is None:
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='risk-index-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _load(self):
+        try:
+            logger.info(f"Loaded {self.load()} latest risk entries.")
+        except Exception as e:
+            # The next flush pulls the whole collection instead
+            self.last_error = f'{type(e).__name__}: {e}'
+            logger.error(f"Could not load latest risk entries: {e}")
+
+    def _watch(self):
+        if not self.loaded:
+            self._load()
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f'{type(e).__name__}: {e}'
+                logger.error(f"Latest risk flush error: {e}")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        if self._thread is not None and not self._stop.is_set():
+            self._thread = threading.Thread(target=self._watch, name='risk-index-flush', daemon=True)
+            self._thread.start()
+
+    def info(self):
+        return {
+            'users': len(self._entries),
+            'by_risk_level': self.counts(),
+            'pending_writes': len(self._dirty),
+            'persisted': self.collection is not None,
+            'loaded': self.loaded,
+            'updates': self.updates,
+            'stale': self.stale,
+            'written': self.written,
+            'write_errors': self.write_errors,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,255 @@
+"""
+CareOClock Predictive Engine - Rolling Statistics Cache
+Description: In-process, per-user running statistics for the anomaly and trend
+             stages. Each user's window is seeded once from MongoDB and then
+             updated incrementally as readings are scored, so a warm request
+             never has to fetch history again.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from trend_engine import RunningTrends, TREND_VITALS
+
+
+STAT_FEATURES = ('heart_rate', 'bp_systolic', 'glucose', 'weight', 'oxygen_level')
+_TREND_INDEX = [STAT_FEATURES.index(v) for v in TREND_VITALS]
+TAIL_SIZE = 7
+
+# Rough per-object costs used for the memory cap (CPython, 64-bit)
+_USER_OVERHEAD_BYTES = 1024
+_ROW_OVERHEAD_BYTES = 320
+
+
+class UserRollingStats:
+    """
+    Statistics over one user's history window (oldest to newest):
+      - window counts/sums per feature (the window average),
+      - Welford mean/M2 per feature over the last TAIL_SIZE readings, with
+        removal as readings leave the tail,
+      - running least-squares sums of every trend vital against time.
+    Each row also keeps the history safety-net alerts it produced, so the
+    history stage can be answered without re-reading the records.
+    """
+
+    def __init__(self, window_days=14, tail_size=TAIL_SIZE):
+        self.window = timedelta(days=window_days)
+        self.tail_size = tail_size
+        self.rows = deque()  # (date, values, alerts)
+        self.lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+        # Readings added so far; with loaded_at it identifies the newest history seen
+        self.revision = 0
+
+        n_features = len(STAT_FEATURES)
+        self.win_n = [0] * n_features
+        self.win_sum = [0.0] * n_features
+        self.tail_n = [0] * n_features
+        self.tail_mean = [0.0] * n_features
+        self.tail_m2 = [0.0] * n_features
+
+        self.trends = RunningTrends()
+
+        self.alert_bytes = 0
+
+    @classmethod
+    def from_history(cls, history_df, alert_rows=(), alerts=(), window_days=14):
+        """
+        Seeds the statistics from a fetch_user_history DataFrame. `alert_rows`
+        and `alerts` are the aligned output of safety_net.evaluate_history_rows.
+        """
+        stats = cls(window_days=window_days)
+        if history_df is None or history_df.empty:
+            return stats
+
+        per_row = {}
+        for row, alert in zip(list(alert_rows), alerts):
+            per_row.setdefault(row, []).append(alert)
+
+        dates = history_df['date'].tolist()
+        columns = [history_df[f].to_numpy(dtype=float, na_value=np.nan).tolist() if f in history_df
+                   else [math.nan] * len(dates) for f in STAT_FEATURES]
+        for i, date in enumerate(dates):
+            stats.add(date.to_pydatetime(), [col[i] for col in columns], per_row.get(i, ()))
+        return stats
+
+    # --- Updates ---
+
+    def add(self, date, values, alerts=()):
+        """Appends a reading; `values` follow STAT_FEATURES, NaN when missing."""
+        if len(self.rows) >= self.tail_size:
+            self._tail_remove(self.rows[-self.tail_size][1])
+
+        values = tuple(math.nan if v is None else float(v) for v in values)
+        alerts = tuple(alerts)
+        self.rows.append((date, values, alerts))
+        self.revision += 1
+        self.alert_bytes += sum(len(a) for a in alerts)
+
+        for i, v in enumerate(values):
+            if math.isnan(v):
+                continue
+            self.win_n[i] += 1
+            self.win_sum[i] += v
+            n = self.tail_n[i] + 1
+            delta = v - self.tail_mean[i]
+            self.tail_mean[i] += delta / n
+            self.tail_m2[i] += delta * (v - self.tail_mean[i])
+            self.tail_n[i] = n
+
+        self.trends.update(date, [values[i] for i in _TREND_INDEX], 1)
+
+    def expire(self, now=None):
+        """Drops readings that have slid out of the window."""
+        cutoff = (now or datetime.utcnow()) - self.window
+        while self.rows and self.rows[0][0] < cutoff:
+            if len(self.rows) <= self.tail_size:
+                self._tail_remove(self.rows[0][1])
+            date, values, alerts = self.rows.popleft()
+            self.alert_bytes -= sum(len(a) for a in alerts)
+            for i, v in enumerate(values):
+                if not math.isnan(v):
+                    self.win_n[i] -= 1
+                    self.win_sum[i] -= v
+            self.trends.update(date, [values[i] for i in _TREND_INDEX], -1)
+        self.trends.reset_if_empty(not self.rows)
+
+    def _tail_remove(self, values):
+        for i, v in enumerate(values):
+            if math.isnan(v):
+                continue
+            n = self.tail_n[i] - 1
+            if n <= 0:
+                self.tail_n[i], self.tail_mean[i], self.tail_m2[i] = 0, 0.0, 0.0
+                continue
+            mean = self.tail_mean[i]
+            new_mean = (mean * self.tail_n[i] - v) / n
+            m2 = self.tail_m2[i] - (v - mean) * (v - new_mean)
+            # Removal can leave rounding residue where the true M2 is 0; a
+            # near-zero std would turn that residue into a huge z-score.
+            if m2 <= 1e-9 * n * (new_mean * new_mean + 1.0):
+                m2 = 0.0
+            self.tail_n[i], self.tail_mean[i], self.tail_m2[i] = n, new_mean, m2
+
+    # --- Queries ---
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    @property
+    def last_date(self):
+        return self.rows[-1][0] if self.rows else None
+
+    @property
+    def nbytes(self):
+        return _USER_OVERHEAD_BYTES + len(self.rows) * _ROW_OVERHEAD_BYTES + self.alert_bytes
+
+    def history_alerts(self):
+        return [alert for _, _, alerts in self.rows for alert in alerts]
+
+    def window_count(self, feature):
+        return self.win_n[STAT_FEATURES.index(feature)]
+
+    def window_mean(self, feature):
+        i = STAT_FEATURES.index(feature)
+        return self.win_sum[i] / self.win_n[i] if self.win_n[i] else math.nan
+
+    def tail_moments(self, feature):
+        """(mean, sample std) over the last TAIL_SIZE readings; NaN when undefined."""
+        i = STAT_FEATURES.index(feature)
+        n = self.tail_n[i]
+        if n == 0:
+            return math.nan, math.nan
+        std = math.sqrt(max(self.tail_m2[i], 0.0) / (n - 1)) if n > 1 else math.nan
+        return self.tail_mean[i], std
+
+    def trend_slopes(self):
+        """{vital: (slope_per_day, std_error, points)} for vitals with enough points."""
+        return self.trends.slopes()
+
+
+class RollingStatsCache:
+    """
+    LRU map of user id -> UserRollingStats bounded by an approximate memory cap.
+    Entries older than `ttl_seconds` are dropped and re-seeded from MongoDB, so
+    records written outside the scoring path are picked up eventually.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=3600, window_days=14):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.window_days = window_days
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        with self._lock:
+            stats = self._entries.get(user_id)
+            if stats is not None and time.monotonic() - stats.loaded_at > self.ttl_seconds:
+                self._drop(user_id)
+                stats = None
+            if stats is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return stats
+
+    def put(self, user_id, stats):
+        with self._lock:
+            if user_id in self._entries:
+                self._drop(user_id)
+            self._entries[user_id] = stats
+            self._sizes[user_id] = stats.nbytes
+            self._total_bytes += stats.nbytes
+            self._evict()
+
+    def resize(self, user_id):
+        """Re-accounts an entry after its stats were updated in place."""
+        with self._lock:
+            stats = self._entries.get(user_id)
+            if stats is None:
+                return
+            self._total_bytes += stats.nbytes - self._sizes[user_id]
+            self._sizes[user_id] = stats.nbytes
+            self._evict()
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if user_id in self._entries:
+                self._drop(user_id)
+
+    def new_stats(self, history_df, alert_rows=(), alerts=()):
+        return UserRollingStats.from_history(history_df, alert_rows, alerts, window_days=self.window_days)
+
+    def info(self):
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _drop(self, user_id):
+        self._entries.pop(user_id)
+        self._total_bytes -= self._sizes.pop(user_id)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            user_id = next(iter(self._entries))
+            self._drop(user_id)
+            self.evictions += 1
@@ -0,0 +1,161 @@
+"""
+CareOClock Predictive Engine - Columnar Safety Net
+Description: Evaluates the safety-net thresholds over a whole history window at
+             once. Every rule is a NumPy mask over a vital column, so the cost is
+             a handful of array comparisons instead of a Python if-chain per record.
+"""
+
+import math
+
+import numpy as np
+
+
+RULE_COLUMNS = ('bp_systolic', 'bp_diastolic', 'oxygen_level', 'glucose', 'heart_rate', 'temperature')
+
+
+def _bp_message(label):
+    return lambda date, v, i: f"{label} at {date}: BP {v['bp_systolic'][i]}/{v['bp_diastolic'][i]}"
+
+
+def _value_message(label, column, suffix=''):
+    return lambda date, v, i: f"{label} at {date}: {v[column][i]}{suffix}"
+
+
+# Each rule: (column(s) the mask reads, mask builder, message builder).
+# Rules are listed in the same order the per-record if-chain used to emit them,
+# so alerts for a single record keep their original ordering.
+HISTORY_RULES = [
+    # Blood Pressure
+    (('bp_systolic', 'bp_diastolic'),
+     lambda c: (c['bp_systolic'] > 180) | (c['bp_diastolic'] > 120),
+     _bp_message("Hypertensive Crisis")),
+    (('bp_systolic', 'bp_diastolic'),
+     lambda c: (c['bp_systolic'] < 90) | (c['bp_diastolic'] < 60),
+     _bp_message("Hypotensive Crisis")),
+    (('bp_systolic', 'bp_diastolic'),
+     lambda c: ((c['bp_systolic'] > 140) & (c['bp_systolic'] <= 180)) |
+               ((c['bp_diastolic'] > 90) & (c['bp_diastolic'] <= 120)),
+     _bp_message("High Blood Pressure (Stage 2)")),
+    (('bp_systolic', 'bp_diastolic'),
+     lambda c: ((c['bp_systolic'] > 130) & (c['bp_systolic'] <= 140)) |
+               ((c['bp_diastolic'] > 80) & (c['bp_diastolic'] <= 90)),
+     _bp_message("High Blood Pressure (Stage 1)")),
+
+    # Oxygen Level
+    (('oxygen_level',),
+     lambda c: c['oxygen_level'] < 92,
+     _value_message("Very Low Oxygen", 'oxygen_level', '%')),
+    (('oxygen_level',),
+     lambda c: (c['oxygen_level'] >= 92) & (c['oxygen_level'] < 95),
+     _value_message("Low Oxygen", 'oxygen_level', '%')),
+
+    # Blood Sugar
+    (('glucose',),
+     lambda c: c['glucose'] > 250,
+     _value_message("Very High Blood Sugar", 'glucose')),
+    (('glucose',),
+     lambda c: c['glucose'] < 70,
+     _value_message("Low Blood Sugar", 'glucose')),
+
+    # Heart Rate
+    (('heart_rate',),
+     lambda c: c['heart_rate'] > 120,
+     _value_message("Very High Heart Rate", 'heart_rate')),
+    (('heart_rate',),
+     lambda c: c['heart_rate'] < 50,
+     _value_message("Very Low Heart Rate", 'heart_rate')),
+
+    # Temperature
+    (('temperature',),
+     lambda c: c['temperature'] > 103,
+     _value_message("High Fever", 'temperature')),
+    (('temperature',),
+     lambda c: (c['temperature'] > 100.4) & (c['temperature'] <= 103),
+     _value_message("Fever", 'temperature')),
+    (('temperature',),
+     lambda c: c['temperature'] < 95,
+     _value_message("Low Body Temperature", 'temperature')),
+]
+
+
+def evaluate_history(history_df):
+    """
+    Applies every history safety-net rule to the whole DataFrame in one pass.
+    Missing values (NaN) never satisfy a threshold, matching the row-wise checks.
+    Returns the alerts ordered by record, then by rule.
+    """
+    _, alerts = evaluate_history_rows(history_df)
+    return alerts
+
+
+def evaluate_history_rows(history_df):
+    """
+    Same as evaluate_history, but also returns the positional row of every alert
+    so a frame holding several users' histories can be split back per user.
+    """
+    if history_df is None or history_df.empty:
+        return np.empty(0, dtype=np.intp), []
+
+    columns = {}
+    for col in RULE_COLUMNS:
+        if col in history_df:
+            columns[col] = history_df[col].to_numpy(dtype=float, na_value=np.nan)
+
+    hit_rows = []
+    hit_rules = []
+    for rule_id, (needs, mask_fn, _) in enumerate(HISTORY_RULES):
+        if not all(col in columns for col in needs):
+            continue
+        rows = np.flatnonzero(mask_fn(columns))
+        if rows.size:
+            hit_rows.append(rows)
+            hit_rules.append(np.full(rows.size, rule_id))
+
+    if not hit_rows:
+        return np.empty(0, dtype=np.intp), []
+
+    rows = np.concatenate(hit_rows)
+    rules = np.concatenate(hit_rules)
+    order = np.lexsort((rules, rows))
+    rows = rows[order]
+
+    # Only the rows that fired are formatted; values come from plain lists so
+    # they print exactly as the row-wise loop printed them.
+    dates = history_df['date'].tolist()
+    values = {col: history_df[col].tolist() for col in columns}
+    alerts = [HISTORY_RULES[rule_id][2](dates[row], values, row)
+              for row, rule_id in zip(rows.tolist(), rules[order].tolist())]
+    return rows, alerts
+
+
+def evaluate_record(date, record):
+    """
+    Evaluates a single flattened reading, formatted exactly as it will be once
+    it is stored and read back as history (missing values print as nan).
+    """
+    values = {col: [math.nan if record.get(col) is None else float(record[col])] for col in RULE_COLUMNS}
+    columns = {col: np.array(v) for col, v in values.items()}
+    return [message_fn(date, values, 0)
+            for _, mask_fn, message_fn in HISTORY_RULES if mask_fn(columns)[0]]
+
+
+# MongoDB filter matching every record that can fire at least one HISTORY_RULES
+# entry. It must stay a superset of the rules above: records it drops are
+# guaranteed to produce no alerts, so history alerts can be evaluated on the
+# server-side filtered rows only.
+HISTORY_ALERT_FILTER = {'$or': [
+    {'bloodPressure.systolic': {'$gt': 130}},
+    {'bloodPressure.systolic': {'$lt': 90}},
+    {'bloodPressure.diastolic': {'$gt': 80}},
+    {'bloodPressure.diastolic': {'$lt': 60}},
+    {'bloodSugar.value': {'$gt': 250}},
+    {'bloodSugar.value': {'$lt': 70}},
+    {'heartRate.value': {'$gt': 120}},
+    {'heartRate.value': {'$lt': 50}},
+    {'oxygenLevel.value': {'$lt': 95}},
+    {'oxygenLevel': {'$lt': 95}},
+    {'temperature.value': {'$gt': 100.4}},
+    {'temperature.value': {'$lt': 95}},
+    {'temperature': {'$gt': 100.4}},
+    {'temperature': {'$lt': 95}},
+]}
@@ -0,0 +1,111 @@
+"""
+CareOClock Predictive Engine - Synthetic Histories
+Description: Generates reproducible per-user vital histories for benchmarks and
+             load tests, in the same flattened shape fetch_user_history returns,
+             or as healthrecords documents for an in-memory collection, and
+             labelled training samples of any size as NumPy columns.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from datetime import datetime, timedelta
+
+from feature_transformer import risk_label_codes
+from history_query import HISTORY_FIELDS
+
+
+VITAL_COLUMNS = ['bp_systolic', 'bp_diastolic', 'glucose', 'heart_rate', 'weight',
+                 'sleep_hours', 'temperature', 'oxygen_level']
+
+# (column, mean, std) of HealthRiskPredictor's sample training data, in draw order;
+# age follows, uniform over [20, 90)
+TRAINING_SAMPLE_VITALS = [
+    ('heart_rate', 75, 15),
+    ('bp_systolic', 120, 20),
+    ('bp_diastolic', 80, 10),
+    ('glucose', 100, 25),
+    ('sleep_hours', 7, 1.5),
+    ('temperature', 98.6, 0.8),
+    ('oxygen_level', 98, 2),
+]
+
+
+def generate_history_df(n_records, days=14, seed=42, missing_rate=0.05):
+    """
+    Builds a history DataFrame of n_records readings spread evenly over the last
+    `days` days, sorted oldest to newest. Distributions are wide enough that
+    every safety-net rule fires somewhere in a large window.
+    """
+    rng = np.random.default_rng(seed)
+    end = datetime.utcnow()
+    if n_records == 0:
+        return pd.DataFrame(columns=['date'] + VITAL_COLUMNS)
+
+    offsets = np.sort(rng.uniform(0, days * 24 * 3600, n_records))[::-1]
+    dates = [end - timedelta(seconds=float(s)) for s in offsets]
+
+    df = pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'bp_systolic': rng.normal(135, 25, n_records).round(),
+        'bp_diastolic': rng.normal(85, 15, n_records).round(),
+        'glucose': rng.normal(140, 60, n_records).round(1),
+        'heart_rate': rng.normal(80, 20, n_records).round(),
+        'weight': rng.normal(72, 3, n_records).round(1),
+        'sleep_hours': rng.normal(7, 1.5, n_records).round(1),
+        'temperature': rng.normal(98.8, 1.6, n_records).round(1),
+        'oxygen_level': rng.normal(96, 2.5, n_records).round(),
+    })
+
+    if missing_rate:
+        for col in VITAL_COLUMNS:
+            df.loc[rng.random(n_records) < missing_rate, col] = np.nan
+    return df
+
+
+def generate_training_sample(n_samples, seed=42, rng=None):
+    """
+    Labelled training rows as NumPy columns (risk_level as uint8 codes into
+    RISK_LEVELS), drawn column by column from RandomState(seed) or `rng`
+    (anything with normal/randint, e.g. the np.random module). Age over 65
+    counts half a risk factor here, and Medium starts at 1.5.
+    """
+    rng = np.random.RandomState(seed) if rng is None else rng
+    columns = {name: rng.normal(mean, std, n_samples) for name, mean, std in TRAINING_SAMPLE_VITALS}
+    columns['age'] = rng.randint(20, 90, n_samples)
+    columns['risk_level'] = risk_label_codes(columns['heart_rate'], columns['bp_systolic'], columns['bp_diastolic'],
+                                             columns['glucose'], columns['sleep_hours'], columns['age'],
+                                             age_weight=0.5, medium_at=1.5)
+    return columns
+
+
+def history_documents(user_id, history_df):
+    """
+    Converts a history DataFrame into healthrecords documents shaped like the
+    backend's HealthRecord model: nested {value} objects, missing vitals left
+    out, dates at MongoDB's millisecond precision.
+    """
+    user_oid = ObjectId(user_id)
+    columns = {name: history_df[name].tolist() for name, _, _ in HISTORY_FIELDS if name in history_df}
+    docs = []
+    for i, date in enumerate(history_df['date'].tolist()):
+        date = date.to_pydatetime()
+        doc = {'_id': ObjectId(), 'userId': user_oid,
+               'date': date.replace(microsecond=date.microsecond // 1000 * 1000)}
+        for name, field, key in HISTORY_FIELDS:
+            value = columns[name][i] if name in columns else math.nan
+            if not math.isnan(value):
+                doc.setdefault(field, {})[key] = float(value)
+        docs.append(doc)
+    return docs
+
+
+def generate_user_documents(user_ids, records_per_user, days=14, seed=42, missing_rate=0.05):
+    """healthrecords documents for every user, each with its own reproducible history."""
+    docs = []
+    for i, user_id in enumerate(user_ids):
+        history_df = generate_history_df(records_per_user, days=days, seed=seed + i, missing_rate=missing_rate)
+        docs.extend(history_documents(user_id, history_df))
+    return docs
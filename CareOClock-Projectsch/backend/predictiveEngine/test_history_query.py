@@ -0,0 +1,87 @@
+"""
+CareOClock Predictive Engine - History Query Tests
+Description: Checks that summary_pipeline produces the facets WindowSummary
+             reads. mongomock does not implement $stdDevSamp, so the pipeline
+             is checked by shape and the summary against a hand-built result
+             in the shape MongoDB returns.
+
+    python -m pytest test_history_query.py
+"""
+
+import math
+import unittest
+from datetime import datetime
+
+from bson import ObjectId
+
+from history_query import HISTORY_PROJECTION, WindowSummary, summary_pipeline
+from trend_engine import SUM_KEYS, TREND_VITALS
+
+USER_OID = ObjectId('65a1b2c3d4e5f6a7b8c9d0e1')
+START_DATE = datetime(2026, 1, 1)
+FEATURES = ('heart_rate', 'bp_systolic', 'glucose', 'weight', 'oxygen_level')
+
+
+class SummaryPipelineShapeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pipeline = summary_pipeline(USER_OID, START_DATE, tail_size=5)
+        self.facets = self.pipeline[2]['$facet']
+
+    def test_stages(self):
+        self.assertEqual([next(iter(stage)) for stage in self.pipeline], ['$match', '$sort', '$facet'])
+        match = self.pipeline[0]['$match']
+        self.assertEqual(match['userId'], USER_OID)
+        self.assertEqual(match['date'], {'$gte': START_DATE})
+        self.assertIn('$or', match)
+        self.assertEqual(self.pipeline[1]['$sort'], {'date': -1})
+
+    def test_facets(self):
+        self.assertEqual(set(self.facets), {'window', 'tail', 'trend', 'alerts'})
+        self.assertEqual(self.facets['tail'][0], {'$limit': 5})
+        self.assertEqual(self.facets['alerts'][-1], {'$project': HISTORY_PROJECTION})
+
+    def test_group_keys_cover_window_summary(self):
+        window = self.facets['window'][0]['$group']
+        tail = self.facets['tail'][1]['$group']
+        trend = self.facets['trend'][1]['$group']
+        for group in (window, tail, trend):
+            self.assertIsNone(group['_id'])
+        self.assertIn('rows', window)
+        for name in FEATURES:
+            self.assertIn(f'{name}_n', window)
+            self.assertIn(f'{name}_sum', window)
+            self.assertIn(f'{name}_mean', tail)
+            self.assertIn(f'{name}_std', tail)
+        self.assertEqual(set(trend) - {'_id'}, {f'{name}_{key}' for name in TREND_VITALS for key in SUM_KEYS})
+
+
+class WindowSummaryTest(unittest.TestCase):
+
+    def test_reads_facets(self):
+        facets = {
+            'window': [{'_id': None, 'rows': 4, 'heart_rate_n': 4, 'heart_rate_sum': 320}],
+            'tail': [{'_id': None, 'heart_rate_mean': 81.0, 'heart_rate_std': None}],
+            'trend': [],
+            'alerts': [],
+        }
+        summary = WindowSummary(facets, ['alert'])
+        self.assertTrue(summary.available)
+        self.assertEqual(summary.row_count, 4)
+        self.assertEqual(summary.window_mean('heart_rate'), 80.0)
+        self.assertTrue(math.isnan(summary.window_mean('glucose')))
+        mean, std = summary.tail_moments('heart_rate')
+        self.assertEqual(mean, 81.0)
+        self.assertTrue(math.isnan(std))
+        self.assertEqual(summary.history_alerts(), ['alert'])
+
+    def test_unavailable(self):
+        summary = WindowSummary.unavailable()
+        self.assertFalse(summary.available)
+        self.assertEqual(summary.row_count, 0)
+        self.assertEqual(summary.history_alerts(), [])
+        self.assertEqual(summary.window_count('heart_rate'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+CareOClock Predictive Engine - Incremental Model Update Tests
+Description: Checks that moving split thresholds to a refitted scaler leaves
+             predict_proba unchanged, and that a row lying exactly on a
+             moved RandomForest threshold still takes the left branch despite
+             float32 rounding.
+
+    python -m pytest test_model_update.py
+"""
+
+import unittest
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from model_update import rescale_thresholds
+
+try:
+    from xgboost import XGBClassifier
+except ImportError:
+    XGBClassifier = None
+
+
+def vitals(rng, n):
+    """Integer-valued readings, like the stored vitals, so many rows repeat a training value."""
+    return np.column_stack([
+        rng.integers(90, 190, n),   # systolic
+        rng.integers(60, 120, n),   # diastolic
+        rng.integers(70, 300, n),   # glucose
+        rng.integers(45, 140, n),   # heart rate
+        rng.integers(88, 101, n),   # oxygen
+    ]).astype(float)
+
+
+def labels(X):
+    return (X[:, 0] >= 140).astype(int) + (X[:, 2] >= 200).astype(int)
+
+
+class RescaleThresholdsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.X_old = vitals(rng, 600)
+        self.y_old = labels(self.X_old)
+        # The refitted scaler sees a shifted population, so every scaled value moves
+        X_new = vitals(rng, 400) + np.array([12.0, 5.0, 40.0, -8.0, -2.0])
+        self.old_scaler = StandardScaler().fit(self.X_old)
+        self.new_scaler = StandardScaler().fit(np.vstack([self.X_old, X_new]))
+        # Forest thresholds are midpoints of the integer readings in each
+        # bootstrap sample, so they can fall on any integer or half-integer (the
+        # midpoint of 91 and 95 is 93, even if 93 is out of bag), where the old
+        # model's branch is decided by float32 rounding. Compare predictions off
+        # those points; test_forest_ties_go_left covers the rows on them.
+        self.X_eval = vitals(rng, 2000) + 0.25
+
+    def fit_and_rescale(self, model):
+        model.fit(self.old_scaler.transform(self.X_old), self.y_old)
+        before = model.predict_proba(self.old_scaler.transform(self.X_eval))
+        rescale_thresholds(model, self.old_scaler.mean_, self.old_scaler.scale_,
+                           self.new_scaler.mean_, self.new_scaler.scale_)
+        return before, model.predict_proba(self.new_scaler.transform(self.X_eval))
+
+    def test_random_forest_probabilities_unchanged(self):
+        before, after = self.fit_and_rescale(RandomForestClassifier(n_estimators=30, random_state=0))
+        np.testing.assert_array_equal(after, before)
+
+    @unittest.skipIf(XGBClassifier is None, "xgboost is not installed")
+    def test_xgboost_probabilities_unchanged(self):
+        before, after = self.fit_and_rescale(
+            XGBClassifier(n_estimators=30, max_depth=4, random_state=0, eval_metric='mlogloss'))
+        np.testing.assert_allclose(after, before, rtol=0, atol=1e-6)
+
+    def test_forest_ties_go_left(self):
+        forest = RandomForestClassifier(n_estimators=30, random_state=0)
+        forest.fit(self.old_scaler.transform(self.X_old), self.y_old)
+        old_trees = [(e.tree_.feature.copy(), e.tree_.threshold.copy()) for e in forest.estimators_]
+        rescale_thresholds(forest, self.old_scaler.mean_, self.old_scaler.scale_,
+                           self.new_scaler.mean_, self.new_scaler.scale_)
+        for estimator, (features, thresholds) in zip(forest.estimators_, old_trees):
+            split = features >= 0
+            # The raw value of every split, scaled the way new rows will be
+            raw = thresholds[split] * self.old_scaler.scale_[features[split]] + self.old_scaler.mean_[features[split]]
+            scaled = ((raw - self.new_scaler.mean_[features[split]]) /
+                      self.new_scaler.scale_[features[split]]).astype(np.float32)
+            self.assertTrue(np.all(scaled <= estimator.tree_.threshold[split]))
+
+    def test_unsupported_model(self):
+        with self.assertRaises(TypeError):
+            rescale_thresholds(object(), [0.0], [1.0], [0.0], [1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,85 +1,292 @@
 #!/usr/bin/env python3
 """
 CareOClock System Performance Testing
-Tests API response times, alert generation, etc.
+Load-tests the prediction API with concurrent clients against an in-memory
+healthrecords collection seeded with synthetic per-user histories, and reports
+latency percentiles, throughput and error rates.
+
+Closed loop, N clients back to back:  python test_system_performance.py --clients 32 --duration 20
+Open loop at a fixed arrival rate:    python test_system_performance.py --rps 200 --duration 20
+Asyncio front end instead of Flask:   python test_system_performance.py --app async
+Against an already running server:    python test_system_performance.py --url http://localhost:5001
 """
 
-import time
+import argparse
+import http.client
 import json
-import requests
-import random
+import logging
+import threading
+import time
+from collections import Counter
 from datetime import datetime
+from urllib.parse import urlsplit
+
 import numpy as np
+from bson import ObjectId
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CareOClock prediction API load test")
+    parser.add_argument('--app', choices=('flask', 'async'), default='flask',
+                        help="in-process front end to start (ignored with --url)")
+    parser.add_argument('--url', help="base URL of a running server instead of an in-process one")
+    parser.add_argument('--clients', type=int, default=16,
+                        help="concurrent clients (closed loop) or max outstanding requests (open loop)")
+    parser.add_argument('--rps', type=float, help="target arrival rate; omit for closed loop")
+    parser.add_argument('--duration', type=float, default=10.0, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=2.0, help="seconds discarded before measuring")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--records-per-user', type=int, default=30)
+    parser.add_argument('--mongo-latency-ms', type=float, default=1.0,
+                        help="simulated MongoDB round trip per history query")
+    parser.add_argument('--stats-cache-mb', type=float, default=64.0, help="0 disables the rolling-stats cache")
+    parser.add_argument('--history-mode', choices=('projected', 'documents'), default='projected')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='performance_results.json')
+    return parser.parse_args()
+
+
+# --- Test fixture ---
+
+def make_user_ids(n_users, seed):
+    rng = np.random.default_rng(seed)
+    return [str(ObjectId(rng.bytes(12))) for _ in range(n_users)]
+
+
+def build_service(args, user_ids):
+    from memory_store import InMemoryHealthRecords
+    from predictive_service import PredictionService
+    from synthetic_data import generate_user_documents
+
+    docs = generate_user_documents(user_ids, args.records_per_user, seed=args.seed)
+    collection = InMemoryHealthRecords(docs, latency_ms=args.mongo_latency_ms)
+    service = PredictionService(stats_cache_max_bytes=int(args.stats_cache_mb * 1024 * 1024),
+                                history_mode=args.history_mode, records_collection=collection)
+    return service, len(docs)
+
+
+def start_flask_server(service):
+    from werkzeug.serving import make_server
+    import predictive_service
+
+    predictive_service.prediction_service = service
+    server = make_server('127.0.0.1', 0, predictive_service.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def start_async_server(service):
+    import asyncio
+    from aiohttp import web
+    import async_service
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(async_service.create_app(service), access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = runner.addresses[0][1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    return f"http://127.0.0.1:{port}", stop
+
+
+def make_reading(rng, user_id):
+    return {
+        'userId': user_id,
+        'bloodPressure': {'systolic': int(rng.normal(130, 18)), 'diastolic': int(rng.normal(84, 10))},
+        'bloodSugar': {'value': round(float(rng.normal(130, 35)), 1), 'testType': 'random'},
+        'heartRate': {'value': int(rng.normal(78, 12))},
+        'weight': {'value': round(float(rng.normal(72, 3)), 1)},
+        'oxygenLevel': int(rng.normal(96, 2)),
+        'temperature': round(float(rng.normal(98.6, 0.8)), 1),
+        'sleepHours': round(float(rng.normal(7, 1.2)), 1),
+    }
+
+
+# --- Load generation ---
+
+class LoadGenerator:
+    """
+    Closed loop: every client sends its next request as soon as the previous
+    one returns. Open loop: request i is due at start + i / rps and its latency
+    is measured from that due time, so queueing behind a slow server counts
+    against it instead of silently lowering the offered load.
+    """
+
+    def __init__(self, base_url, user_ids, args):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.path = url.path.rstrip('/') + '/predict'
+        self.user_ids = user_ids
+        self.args = args
+        self.samples = []  # (scheduled start, latency seconds, status or None, error name or None)
+        self._lock = threading.Lock()
+        self._next_slot = 0
+
+    def run(self):
+        start = time.perf_counter() + 0.05
+        self.started_at = start
+        self.stop_at = start + self.args.warmup + self.args.duration
+        threads = [threading.Thread(target=self._client, args=(i, start)) for i in range(self.args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _client(self, client_id, start):
+        rng = np.random.default_rng(self.args.seed * 1000 + client_id)
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        samples = []
+        while True:
+            if self.args.rps:
+                with self._lock:
+                    slot = self._next_slot
+                    self._next_slot += 1
+                scheduled = start + slot / self.args.rps
+                if scheduled >= self.stop_at:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= self.stop_at:
+                    break
+
+            body = json.dumps(make_reading(rng, self.user_ids[rng.integers(len(self.user_ids))]))
+            status, error = None, None
+            try:
+                conn.request('POST', self.path, body=body, headers={'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except Exception as e:
+                error = type(e).__name__
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            samples.append((scheduled, time.perf_counter() - scheduled, status, error))
+        conn.close()
+        with self._lock:
+            self.samples.extend(samples)
+
+    def summary(self):
+        measure_from = self.started_at + self.args.warmup
+        measured = [s for s in self.samples if s[0] >= measure_from]
+        if not measured:
+            return {'requests': 0}
+
+        latencies = np.array([s[1] for s in measured]) * 1000
+        statuses = Counter(str(s[2]) for s in measured if s[2] is not None)
+        errors = Counter(s[3] for s in measured if s[3] is not None)
+        succeeded = statuses.get('200', 0)
+        elapsed = max(s[0] + s[1] for s in measured) - measure_from
+        percentiles = np.percentile(latencies, [50, 90, 95, 99])
+        return {
+            'requests': len(measured),
+            'succeeded': succeeded,
+            'failed': len(measured) - succeeded,
+            'error_rate': (len(measured) - succeeded) / len(measured),
+            'status_counts': dict(statuses),
+            'transport_errors': dict(errors),
+            'throughput_rps': len(measured) / elapsed,
+            'offered_rps': self.args.rps,
+            'latency_ms': {
+                'mean': float(latencies.mean()),
+                'min': float(latencies.min()),
+                'p50': float(percentiles[0]),
+                'p90': float(percentiles[1]),
+                'p95': float(percentiles[2]),
+                'p99': float(percentiles[3]),
+                'max': float(latencies.max()),
+                'std': float(latencies.std()),
+            },
+        }
+
 
-print("=" * 60)
-print("CAREOCLOCK SYSTEM PERFORMANCE TEST")
-print(f"Timestamp: {datetime.now()}")
-print("=" * 60)
-
-# Test data
-test_health_records = [
-    {
-        "heart_rate": random.randint(60, 100),
-        "bp_systolic": random.randint(110, 160),
-        "bp_diastolic": random.randint(70, 100),
-        "glucose": random.randint(80, 200),
-        "temperature": random.uniform(36.5, 37.5),
-        "oxygen_level": random.randint(94, 99),
-        "age": random.randint(60, 85),
-        "sleep_hours": random.randint(4, 9),
-        "adherence_rate": random.randint(50, 100)
+def main():
+    args = parse_args()
+    logging.disable(logging.INFO)
+
+    print("=" * 60)
+    print("CAREOCLOCK SYSTEM PERFORMANCE TEST")
+    print(f"Timestamp: {datetime.now()}")
+    print("=" * 60)
+
+    user_ids = make_user_ids(args.users, args.seed)
+    stop_server = None
+    if args.url:
+        base_url, target = args.url, args.url
+        print(f"\nTarget: {base_url} (userIds without stored history score against an empty window)")
+    else:
+        service, n_docs = build_service(args, user_ids)
+        start_server = start_flask_server if args.app == 'flask' else start_async_server
+        base_url, stop_server = start_server(service)
+        target = f"in-process {args.app} app"
+        print(f"\nTarget: {target} at {base_url}")
+        print(f"Seeded {n_docs} health records for {len(user_ids)} users "
+              f"({args.mongo_latency_ms} ms simulated MongoDB round trip)")
+
+    mode = f"open loop at {args.rps:g} req/s" if args.rps else "closed loop"
+    print(f"Load: {mode}, {args.clients} clients, {args.warmup:g}s warm-up + {args.duration:g}s measured\n")
+
+    generator = LoadGenerator(base_url, user_ids, args)
+    generator.run()
+    if stop_server:
+        stop_server()
+    results = generator.summary()
+    if not results['requests']:
+        print("No requests completed in the measured window.")
+        return
+
+    latency = results['latency_ms']
+    print("=" * 60)
+    print("PERFORMANCE METRICS")
+    print("=" * 60)
+    print(f"\nRequests:      {results['requests']} ({results['failed']} failed, "
+          f"error rate {results['error_rate'] * 100:.2f}%)")
+    print(f"Throughput:    {results['throughput_rps']:.1f} req/s")
+    print(f"Latency p50:   {latency['p50']:.2f} ms")
+    print(f"Latency p95:   {latency['p95']:.2f} ms")
+    print(f"Latency p99:   {latency['p99']:.2f} ms")
+    print(f"Latency max:   {latency['max']:.2f} ms")
+    if results['status_counts'] or results['transport_errors']:
+        print(f"Statuses:      {results['status_counts']} {results['transport_errors'] or ''}")
+
+    perf_results = {
+        # Summary fields kept from the original sequential test
+        "test_count": results['requests'],
+        "avg_response_time_ms": latency['mean'],
+        "min_response_time_ms": latency['min'],
+        "max_response_time_ms": latency['max'],
+        "std_dev_ms": latency['std'],
+        "results": results,
+        "config": {
+            'target': target,
+            'mode': 'open' if args.rps else 'closed',
+            'clients': args.clients,
+            'rps': args.rps,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'users': args.users,
+            'records_per_user': args.records_per_user,
+            'mongo_latency_ms': args.mongo_latency_ms,
+            'stats_cache_mb': args.stats_cache_mb,
+            'history_mode': args.history_mode,
+            'seed': args.seed,
+        },
+        "timestamp": str(datetime.now())
     }
-    for _ in range(10)
-]
-
-# Prediction service endpoint
-PREDICT_URL = "http://localhost:5001/predict"
-
-print(f"\nTesting Prediction Service...")
-print(f"Endpoint: {PREDICT_URL}\n")
-
-response_times = []
-predictions = []
-
-for i, record in enumerate(test_health_records):
-    try:
-        start_time = time.time()
-        response = requests.post(PREDICT_URL, json=record, timeout=5)
-        end_time = time.time()
-        
-        response_time = (end_time - start_time) * 1000  # ms
-        response_times.append(response_time)
-        
-        if response.status_code == 200:
-            pred_data = response.json()
-            predictions.append(pred_data)
-            print(f"Request {i+1}: {response_time:.2f}ms | Risk: {pred_data.get('risk_level')} | Confidence: {pred_data.get('confidence'):.4f}")
-        else:
-            print(f"Request {i+1}: ERROR - Status {response.status_code}")
-    except Exception as e:
-        print(f"Request {i+1}: FAILED - {str(e)}")
-
-# Calculate performance metrics
-print("\n" + "=" * 60)
-print("PERFORMANCE METRICS")
-print("=" * 60)
-print(f"\nAverage Response Time: {np.mean(response_times):.2f} ms")
-print(f"Min Response Time:     {np.min(response_times):.2f} ms")
-print(f"Max Response Time:     {np.max(response_times):.2f} ms")
-print(f"Std Dev:               {np.std(response_times):.2f} ms")
-
-# Save to file
-perf_results = {
-    "test_count": len(response_times),
-    "avg_response_time_ms": float(np.mean(response_times)),
-    "min_response_time_ms": float(np.min(response_times)),
-    "max_response_time_ms": float(np.max(response_times)),
-    "std_dev_ms": float(np.std(response_times)),
-    "timestamp": str(datetime.now())
-}
-
-with open('performance_results.json', 'w') as f:
-    json.dump(perf_results, f, indent=2)
-
-print("\n✓ Performance results saved to: performance_results.json")
-print("=" * 60)
+
+    with open(args.output, 'w') as f:
+        json.dump(perf_results, f, indent=2)
+
+    print(f"\n✓ Performance results saved to: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
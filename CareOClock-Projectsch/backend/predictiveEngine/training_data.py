@@ -0,0 +1,275 @@
+"""
+CareOClock Predictive Engine - Training Data Loader
+Description: Reads the healthrecords collection for model training in cursor
+             batches, with a projection, into preallocated typed NumPy columns
+             instead of one Python dict per document. The columns are kept as
+             a local .npy snapshot; later runs fetch only the records whose
+             _id is past the snapshot's high-water mark and append them.
+
+Snapshot layout (one directory):
+    manifest.json       rows, columns, high-water mark, timestamps
+    _id.npy             ObjectId bytes (S12), ascending
+    <column>.npy        float64 feature columns (NaN = missing)
+    risk_level.npy      uint8 index into feature_transformer.RISK_LEVELS
+
+Records edited after they were snapshotted are not re-read; pass full=True
+(or delete the directory) to rebuild from scratch.
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+from feature_transformer import risk_label_codes, risk_labels
+
+logger = logging.getLogger(__name__)
+
+# (column, document field, sub-document key, value when the field is absent),
+# matching HealthRiskPredictor.load_data_from_mongodb
+TRAINING_FIELDS = [
+    ('heart_rate', 'heartRate', 'value', None),
+    ('bp_systolic', 'bloodPressure', 'systolic', None),
+    ('bp_diastolic', 'bloodPressure', 'diastolic', None),
+    ('glucose', 'bloodSugar', 'value', None),
+    ('sleep_hours', 'sleepHours', 'value', 7),
+    ('temperature', 'temperature', 'value', 98.6),
+    ('oxygen_level', 'oxygenLevel', 'value', 98),
+    ('weight', 'weight', 'value', 70),
+    ('activity_level', 'activityLevel', None, 5),
+    ('stress_level', 'stressLevel', None, 5),
+    ('mood_rating', 'moodRating', None, 5),
+    ('energy_level', 'energyLevel', None, 5),
+    ('pain_level', 'painLevel', None, 0),
+]
+TRAINING_COLUMNS = [name for name, _, _, _ in TRAINING_FIELDS]
+# Records without all of these are not used for training
+REQUIRED_COLUMNS = ('heart_rate', 'bp_systolic', 'bp_diastolic', 'glucose')
+# Age is not recorded per reading; the training frame uses this placeholder
+PLACEHOLDER_AGE = 65
+
+TRAINING_PROJECTION = {field: 1 for _, field, _, _ in TRAINING_FIELDS}
+TRAINING_PROJECTION['age'] = 1
+
+CHUNK_ROWS = int(os.environ.get('TRAINING_CHUNK_ROWS', 50000))
+# ObjectIds are only roughly ordered across writers; incremental reads start
+# this far before the high-water mark and drop the ids already read from it
+HWM_OVERLAP = timedelta(minutes=5)
+SNAPSHOT_VERSION = 1
+
+
+def _read_chunk(docs, size):
+    """
+    Fills up to `size` rows from the document iterator. Returns (columns,
+    number of documents read, last _id read); records missing a required
+    vital are dropped from the columns but still count towards the mark.
+    """
+    nan = np.nan
+    ids = np.empty(size, dtype='S12')
+    columns = {name: np.empty(size) for name in TRAINING_COLUMNS}
+    age = np.empty(size)
+    fields = [(columns[name], field, key, nan if default is None else default)
+              for name, field, key, default in TRAINING_FIELDS]
+
+    n = 0
+    last_id = None
+    for doc in islice(docs, size):
+        last_id = doc['_id']
+        ids[n] = last_id.binary
+        for values, field, key, default in fields:
+            v = doc.get(field)
+            if key is not None:
+                v = v.get(key, default) if isinstance(v, dict) else default
+            elif v is None:
+                v = nan if field in doc else default
+            values[n] = nan if v is None else v
+        v = doc.get('age')
+        age[n] = PLACEHOLDER_AGE if v is None else v
+        n += 1
+
+    keep = np.ones(n, dtype=bool)
+    for name in REQUIRED_COLUMNS:
+        keep &= ~np.isnan(columns[name][:n])
+    chunk = {name: values[:n][keep] for name, values in columns.items()}
+    chunk['risk_level'] = risk_label_codes(chunk['heart_rate'], chunk['bp_systolic'], chunk['bp_diastolic'],
+                                           chunk['glucose'], chunk['sleep_hours'], age[:n][keep])
+    chunk['_id'] = ids[:n][keep]
+    return chunk, n, last_id
+
+
+def _empty_columns():
+    columns = {name: np.empty(0) for name in TRAINING_COLUMNS}
+    columns['risk_level'] = np.empty(0, dtype=np.uint8)
+    columns['_id'] = np.empty(0, dtype='S12')
+    return columns
+
+
+def _concat(parts):
+    parts = [part for part in parts if len(part['_id'])]
+    if not parts:
+        return _empty_columns()
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def read_columns(cursor, chunk_rows=CHUNK_ROWS):
+    """
+    Drains a healthrecords cursor, sorted by _id, into training columns.
+    Returns (columns, last _id read or None).
+    """
+    docs = iter(cursor.batch_size(min(chunk_rows, 10000)))
+    chunks = []
+    last_id = None
+    while True:
+        chunk, n, chunk_last = _read_chunk(docs, chunk_rows)
+        if n:
+            chunks.append(chunk)
+            last_id = chunk_last
+        if n < chunk_rows:
+            break
+    return _concat(chunks), last_id
+
+
+def load_snapshot(snapshot_dir):
+    """(columns, manifest) from a snapshot directory, or (None, None) if there is none."""
+    manifest_path = os.path.join(snapshot_dir, 'manifest.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        logger.info(f"Ignoring snapshot {snapshot_dir} with format version {manifest.get('version')}")
+        return None, None
+    columns = {name: np.load(os.path.join(snapshot_dir, f'{name}.npy'), mmap_mode='r')
+               for name in manifest['columns']}
+    return columns, manifest
+
+
+def save_snapshot(snapshot_dir, columns, high_water_mark, created_at=None):
+    """Writes the columns to a sibling directory and swaps it into place."""
+    snapshot_dir = os.path.abspath(snapshot_dir)
+    staging = f'{snapshot_dir}.tmp-{os.getpid()}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, values in columns.items():
+        np.save(os.path.join(staging, f'{name}.npy'), values)
+    now = datetime.utcnow().isoformat()
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'rows': len(columns['_id']),
+        'columns': list(columns),
+        'high_water_mark': str(high_water_mark) if high_water_mark else None,
+        'created_at': created_at or now,
+        'updated_at': now,
+    }
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    previous = f'{snapshot_dir}.old-{os.getpid()}'
+    if os.path.exists(snapshot_dir):
+        os.rename(snapshot_dir, previous)
+    os.rename(staging, snapshot_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def load_training_columns(collection, snapshot_dir=None, full=False, chunk_rows=CHUNK_ROWS):
+    """
+    Training columns for every usable healthrecords document. With a
+    `snapshot_dir`, only records past the stored high-water mark are read from
+    MongoDB, and the snapshot is extended with them.
+    Returns (columns, stats dict).
+    """
+    snapshot, manifest = (None, None) if full or not snapshot_dir else load_snapshot(snapshot_dir)
+    query = {}
+    if manifest and manifest['high_water_mark']:
+        mark = ObjectId(manifest['high_water_mark'])
+        query = {'_id': {'$gte': ObjectId.from_datetime(mark.generation_time - HWM_OVERLAP)}}
+
+    cursor = collection.find(query, TRAINING_PROJECTION).sort('_id', 1)
+    fetched, last_id = read_columns(cursor, chunk_rows)
+    stats = {'snapshot_rows': 0, 'fetched_rows': len(fetched['_id']), 'new_rows': len(fetched['_id'])}
+    if snapshot is None:
+        columns, high_water_mark = fetched, last_id
+    else:
+        stats['snapshot_rows'] = len(snapshot['_id'])
+        if stats['fetched_rows']:
+            # Drop the overlap window's records that the snapshot already holds
+            snapshot_ids = snapshot['_id']
+            recent = snapshot_ids[np.searchsorted(snapshot_ids, query['_id']['$gte'].binary):]
+            new = ~np.isin(fetched['_id'], recent)
+            fetched = {name: values[new] for name, values in fetched.items()}
+            stats['new_rows'] = int(new.sum())
+        mark = ObjectId(manifest['high_water_mark'])
+        high_water_mark = max(last_id, mark) if last_id else mark
+        columns = _concat([snapshot, fetched]) if stats['new_rows'] else snapshot
+        if stats['new_rows']:
+            # Keep _id ascending so the overlap lookup above stays a binary search
+            ids = columns['_id']
+            if np.any(ids[1:] < ids[:-1]):
+                order = np.argsort(ids, kind='stable')
+                columns = {name: values[order] for name, values in columns.items()}
+
+    if snapshot_dir and (snapshot is None or stats['new_rows'] or str(high_water_mark) != manifest['high_water_mark']):
+        save_snapshot(snapshot_dir, columns, high_water_mark,
+                      created_at=manifest['created_at'] if snapshot is not None else None)
+    return columns, stats
+
+
+def _id_array(ids):
+    """ObjectId strings as an S12 array, the form of the `_id` column."""
+    return np.frombuffer(b''.join(ObjectId(i).binary for i in ids), dtype='S12')
+
+
+def recent_ids(ids, high_water_mark, seen_ids=()):
+    """
+    The ids (an `_id` column, plus any `seen_ids` strings) in the HWM_OVERLAP
+    window before `high_water_mark`, as strings: what read_records_after from
+    that mark must not return again.
+    """
+    if high_water_mark is None:
+        return []
+    ids = np.concatenate([_id_array(seen_ids), np.asarray(ids, dtype='S12')]) if seen_ids else np.asarray(ids)
+    recent = np.unique(ids[ids >= ObjectId.from_datetime(high_water_mark.generation_time - HWM_OVERLAP).binary])
+    data = recent.tobytes()
+    return [str(ObjectId(data[i:i + 12])) for i in range(0, len(data), 12)]
+
+
+def ids_up_to(collection, high_water_mark):
+    """
+    The ids in the HWM_OVERLAP window up to `high_water_mark`, as strings: the
+    recent_ids of a mark saved without them, taking every record up to it as read.
+    """
+    start = ObjectId.from_datetime(high_water_mark.generation_time - HWM_OVERLAP)
+    return [str(doc['_id']) for doc in collection.find({'_id': {'$gte': start, '$lte': high_water_mark}}, {'_id': 1})]
+
+
+def read_records_after(collection, after_id=None, seen_ids=(), chunk_rows=CHUNK_ROWS):
+    """
+    Training columns for the documents past `after_id` (all of them for None).
+    As in load_training_columns, the read starts HWM_OVERLAP before the mark
+    and drops `seen_ids`, the ids already read from that window (see recent_ids).
+    Returns (columns, last _id read or None).
+    """
+    query = {'_id': {'$gte': ObjectId.from_datetime(after_id.generation_time - HWM_OVERLAP)}} if after_id else {}
+    columns, last_id = read_columns(collection.find(query, TRAINING_PROJECTION).sort('_id', 1), chunk_rows)
+    if seen_ids and len(columns['_id']):
+        new = ~np.isin(columns['_id'], _id_array(seen_ids))
+        columns = {name: values[new] for name, values in columns.items()}
+    return columns, last_id
+
+
+def training_frame(columns):
+    """The DataFrame load_data_from_mongodb has always returned, built from training columns."""
+    df = pd.DataFrame({name: np.asarray(columns[name]) for name in TRAINING_COLUMNS})
+    df['age'] = PLACEHOLDER_AGE
+    df['risk_level'] = risk_labels(columns['risk_level'])
+    return df
@@ -0,0 +1,111 @@
+"""
+CareOClock Predictive Engine - Trend Engine
+Description: Closed-form least-squares trends for every vital at once. Slopes
+             (units per day) and their standard errors come straight from the
+             sufficient statistics n, Σt, Σt², Σy, Σty, Σy², either computed in
+             one NumPy pass over a history window or kept as running sums that
+             are updated in O(1) as readings arrive and expire.
+"""
+
+import math
+
+import numpy as np
+
+
+TREND_VITALS = ('bp_systolic', 'weight', 'glucose', 'heart_rate', 'oxygen_level')
+
+# A vital needs more than this many points before its slope is reported
+MIN_TREND_POINTS = 7
+
+SUM_KEYS = ('n', 't', 'tt', 'y', 'ty', 'yy')
+
+
+def slopes_from_sums(n, t, tt, y, ty, yy):
+    """
+    Vectorized slope and standard error from raw sums (arrays, one entry per
+    vital). Entries with too few points, or no spread in time, give NaN.
+    """
+    n = np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = tt - t * t / n
+        sxy = ty - t * y / n
+        syy = yy - y * y / n
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        ssr = np.maximum(syy - slope * sxy, 0.0)
+        se = np.where((n > 2) & (sxx > 0), np.sqrt(ssr / (n - 2) / sxx), np.nan)
+    enough = n > MIN_TREND_POINTS
+    return np.where(enough, slope, np.nan), np.where(enough, se, np.nan)
+
+
+def fit_trends(history_df, vitals=TREND_VITALS):
+    """
+    Fits every vital against time in one pass over a history DataFrame and
+    returns {vital: (slope_per_day, std_error, points)} for vitals with enough
+    points. Missing values are skipped per vital.
+    """
+    present = [v for v in vitals if v in history_df]
+    if history_df.empty or not present:
+        return {}
+
+    dates = history_df['date'].to_numpy(dtype='datetime64[ns]')
+    t = (dates - dates.min()).astype(np.float64) / 86400e9
+    Y = history_df[present].to_numpy(dtype=float, na_value=np.nan)
+    mask = ~np.isnan(Y)
+    n = mask.sum(axis=0)
+
+    # Centered sums (two passes over a small matrix) keep the fit well
+    # conditioned regardless of where the window starts.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        T = np.where(mask, t[:, None], 0.0)
+        Yz = np.where(mask, Y, 0.0)
+        t_mean = T.sum(axis=0) / n
+        y_mean = Yz.sum(axis=0) / n
+        dt = np.where(mask, T - t_mean, 0.0)
+        dy = np.where(mask, Yz - y_mean, 0.0)
+        sxx = (dt * dt).sum(axis=0)
+        sxy = (dt * dy).sum(axis=0)
+        syy = (dy * dy).sum(axis=0)
+    slope, se = slopes_from_sums(n, 0.0, sxx, 0.0, sxy, syy)
+    return as_trend_dict(present, slope, se, n)
+
+
+class RunningTrends:
+    """
+    Running least-squares sums per vital with O(1) add/remove. Time is in days
+    from the first reading seen, and is re-based whenever the window empties.
+    """
+
+    def __init__(self, vitals=TREND_VITALS):
+        self.vitals = tuple(vitals)
+        self.origin = None
+        self.sums = np.zeros((len(SUM_KEYS), len(self.vitals)))
+
+    def update(self, date, values, sign=1):
+        """Adds (sign=1) or removes (sign=-1) one reading; `values` follow self.vitals."""
+        if self.origin is None:
+            self.origin = date
+        t = (date - self.origin).total_seconds() / 86400.0
+        y = np.array([math.nan if v is None else v for v in values], dtype=float)
+        mask = ~np.isnan(y)
+        if not mask.any():
+            return
+        y = np.where(mask, y, 0.0)
+        m = mask * float(sign)
+        self.sums += np.stack([m, m * t, m * t * t, m * y, m * t * y, m * y * y])
+
+    def reset_if_empty(self, empty):
+        if empty:
+            self.origin = None
+            self.sums[:] = 0.0
+
+    def slopes(self):
+        slope, se = slopes_from_sums(*self.sums)
+        return as_trend_dict(self.vitals, slope, se, self.sums[0])
+
+
+def as_trend_dict(vitals, slope, se, n):
+    trends = {}
+    for vital, b, s, count in zip(vitals, slope.tolist(), se.tolist(), np.asarray(n).tolist()):
+        if not math.isnan(b):
+            trends[vital] = (b, None if math.isnan(s) else s, int(round(count)))
+    return trends